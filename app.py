@@ -1,15 +1,33 @@
 # app.py (partial) – Admin rev 3 (XML‑load + tweaks) up to Properties tab
 # -----------------------------------------------------------------------------
 # Imports (include every lib used elsewhere so later tabs keep working)
-import re, math, uuid, base64, functools, traceback, io
-from datetime import date
+import re, os, math, uuid, base64, functools, traceback, io, tempfile, contextlib, time
+from datetime import date, datetime
 from xml.dom import minidom
 import xml.etree.ElementTree as ET
 
 import pandas as pd
 import streamlit as st
-import xmlschema
-from rdflib import Graph, Namespace
+
+from drmd.blobstore import BlobStore
+from drmd.signing import Signer, verify_cached
+from drmd.drafts import DraftStore
+from drmd.history import History
+from drmd.workspace import Workspace, document_label
+from drmd.mapping import NAMESPACES, export_document, export_section
+from drmd.model import ALLOWED_TITLES, INIT_ID, SCHEMA_VERSION, parse_drmd
+from drmd.package import is_package, load_package, pack
+from drmd.library import Library
+from drmd.units import unit_choices
+from drmd.identifiers import IdentifierIndex, describe
+from drmd.rules import RuleSet, describe as describe_finding
+from drmd.preview import HtmlPreview, PagedText, stylesheet
+from drmd.uncertainty import expand_uncertainty, undetermined_rows
+from drmd.certification import certify, read_replicates, to_quantities
+from drmd.streaming import StreamingWriter
+from drmd.schema_model import field_model
+from drmd.validation import DEFAULT_VALIDATION_ENGINE, ENGINES, validate
+from drmd.profiling import MODES as PROFILE_MODES, RerunProfiler, state_summary
 
 # pretty‑print / XSLT (used in Export tab later)
 try:
@@ -21,6 +39,11 @@ except ImportError:
 # Page config & global CSS tweaks (consistent typography)
 st.set_page_config(layout="wide")
 
+# Developer mode: profile this rerun when the sidebar profiler has reruns left
+profiler = st.session_state.get("profiler")
+if profiler is not None:
+    profiler.start()
+
 
 
 
@@ -31,9 +54,9 @@ st.set_page_config(layout="wide")
 # Helpers & constants
 DEFAULT_XSD_PATH = "./drmd.xsd"
 DEFAULT_XSL_PATH = "./drmd.xsl"
+DEFAULT_EXPORT_DIR = os.environ.get("DRMD_EXPORT_DIR", tempfile.gettempdir())
+EXPORT_MAX_AGE_HOURS = float(os.environ.get("DRMD_EXPORT_MAX_AGE_HOURS", "24"))
 DS_NS = "http://www.w3.org/2000/09/xmldsig#"
-ALLOWED_TITLES = ["referenceMaterialCertificate", "productInformationSheet"]  # default first
-INIT_ID = {"scheme": "", "value": "", "link": ""}
 DEFAULT_PRODUCER = {
     "producerName": "",
     "producerStreet": "",
@@ -67,12 +90,59 @@ OFFICIAL_STMPL = {
 # -----------------------------------------------------------------------------
 # Misc helpers
 
+NAVIGATION_MODES = ["Tabs", "Sections"]
+
 @st.cache_resource
 def get_default_ui_settings():
     return {
         "font_scale": 0.85,
+        "navigation": os.environ.get("DRMD_NAVIGATION", "Tabs"),
     }
 
+# Attachments live in a content-addressed store shared by all sessions;
+# session state only keeps name, MIME type and digest of each file.
+@st.cache_resource
+def get_blob_store():
+    return BlobStore(os.environ.get("DRMD_BLOB_DIR", "./.drmd_blobs"))
+
+@st.cache_resource
+def get_draft_store():
+    return DraftStore(os.environ.get("DRMD_DRAFTS_DB", "./.drmd_drafts.sqlite"))
+
+@st.cache_resource
+def get_library():
+    return Library(os.environ.get("DRMD_LIBRARY_DB", "./.drmd_library.sqlite"))
+
+# Streamed exports of abandoned sessions are never replaced, so old ones are
+# deleted at startup and before each new streaming export.
+def prune_exports(max_age_hours: float = EXPORT_MAX_AGE_HOURS):
+    cutoff = time.time() - max_age_hours * 3600
+    with os.scandir(DEFAULT_EXPORT_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith("drmd_export_") and entry.name.endswith(".xml"):
+                with contextlib.suppress(OSError):
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+
+@st.cache_resource
+def prune_exports_at_startup():
+    with contextlib.suppress(OSError):
+        prune_exports()
+    return True
+
+prune_exports_at_startup()
+
+# Business rules are compiled once per process
+@st.cache_resource
+def get_rules():
+    return RuleSet()
+
+# One signer per key/certificate pair; its digest cache survives reruns so
+# re-signing only re-canonicalizes sections that changed.
+@st.cache_resource(max_entries=8)
+def get_signer(key_data: bytes, cert_data: bytes, password: str):
+    return Signer.from_pem(key_data, cert_data, password.encode() if password else None)
+
 
 def render_ui_settings_panel():
     st.sidebar.markdown("---")
@@ -85,12 +155,60 @@ def render_ui_settings_panel():
         st.session_state.ui_font_scale = font_scale
         st.rerun()
 
+    navigation = st.sidebar.radio(
+        "🧭 Navigation", NAVIGATION_MODES, NAVIGATION_MODES.index(st.session_state.ui_navigation), horizontal=True,
+        help="Tabs: every section runs on each interaction. Sections: only the section shown runs, "
+             "which keeps interactions fast for large certificates."
+    )
+    if navigation != st.session_state.ui_navigation:
+        st.session_state.ui_navigation = navigation
+        st.rerun()
+
     if st.sidebar.button("Reset UI Settings"):
         st.session_state.ui_font_scale = get_default_ui_settings()["font_scale"]
+        st.session_state.ui_navigation = get_default_ui_settings()["navigation"]
         st.rerun()
 
+def profile_block(name):
+    """Time the enclosed tab as ``name`` while the profiler records this rerun."""
+    profiler = st.session_state.get("profiler")
+    return profiler.block(name) if profiler is not None else contextlib.nullcontext()
+
+def render_profiler_panel():
+    if not st.sidebar.toggle("Developer mode", key="developer_mode"):
+        return
+    st.sidebar.markdown("### Profiler")
+    profiler = st.session_state.get("profiler")
+    reruns = st.sidebar.number_input("Reruns to profile", 1, 20, 3, key="profile_reruns")
+    mode = st.sidebar.radio("Capture", PROFILE_MODES, key="profile_mode", horizontal=True,
+                            help="cprofile: every call, for snakeviz/pstats. sample: stacks every 5 ms, "
+                                 "for flamegraph.pl or speedscope; less overhead.")
+    col1, col2 = st.sidebar.columns(2)
+    if col1.button("Profile next reruns", key="profile_start"):
+        st.session_state.profiler = RerunProfiler(int(reruns), mode)
+        st.rerun()
+    if profiler is not None and col2.button("Clear", key="profile_clear"):
+        st.session_state.pop("profiler")
+        st.rerun()
+    if profiler is None:
+        return
+    if not profiler.done:
+        st.sidebar.info(f"Profiling: {profiler.remaining} of {profiler.reruns} reruns left. Use the app as usual.")
+    if not profiler.runs:
+        return
+    st.sidebar.caption("Seconds per tab and rerun")
+    st.sidebar.dataframe(profiler.block_table(), use_container_width=True)
+    st.sidebar.caption("Top functions")
+    st.sidebar.dataframe(profiler.top_functions(10), use_container_width=True, hide_index=True)
+    st.sidebar.download_button("Download profile (.zip)", functools.partial(profiler.archive, state_summary(st.session_state)),
+                               file_name=f"drmd-profile-{datetime.now():%Y%m%d-%H%M%S}.zip",
+                               mime="application/zip", key="profile_download",
+                               help="Profile, tab timings and a summary of the session's sizes (no content).")
+
 if "ui_font_scale" not in st.session_state:
     st.session_state.ui_font_scale = get_default_ui_settings()["font_scale"]
+if "ui_navigation" not in st.session_state:
+    st.session_state.ui_navigation = get_default_ui_settings()["navigation"]
 
 fs = st.session_state["ui_font_scale"]
 pad = round(fs * 0.6, 2)
@@ -169,12 +287,25 @@ st.markdown(
 )
 
 
-def clean_text(txt: str) -> str:
-    return re.sub(r"\s+", " ", txt or "").strip()
-
 def xs_duration_hint() -> str:
     return "Enter a valid xs:duration – e.g. P1Y6M means 1 year 6 months"
 
+# drmd.xsd field paths (see drmd.schema_model) of inputs checked while they are typed
+DOC_ID_PATH = "administrativeData/coreData/documentIdentifiers/documentIdentifier"
+ORG_ID_PATH = "administrativeData/referenceMaterialProducer/organizationIdentifiers/organizationIdentifier"
+MAT_ID_PATH = "materials/material/materialIdentifiers/materialIdentifier"
+PROP_ID_PATH = "materialPropertiesList/materialProperties/results/result/data/list/quantity/propertyIdentifiers/propertyIdentifier"
+
+def field_hint(path: str, value, container=st):
+    """Show the schema constraint ``value`` violates, if any, under its input."""
+    error = field_model(os.path.abspath(DEFAULT_XSD_PATH)).check(path, value)
+    if error:
+        container.caption(f":red[{error[0].upper()}{error[1:]}]")
+
+def identifier_hints(cols, path: str, ident: dict):
+    for col, part in zip(cols, ("scheme", "value", "link")):
+        field_hint(f"{path}/{part}", ident.get(part, ""), col)
+
 # Data‑editor wrapper
 
 def data_editor_df(df: pd.DataFrame, key: str, **kwargs) -> pd.DataFrame:
@@ -188,18 +319,18 @@ def data_editor_df(df: pd.DataFrame, key: str, **kwargs) -> pd.DataFrame:
                 updated.at[int(row_idx), col] = new_val
     return updated
 
-# QUDT cache (Properties tab later)
-@st.cache_data
+# QUDT cache (Properties tab later); a read-only view of a file shared by all
+# app processes (drmd.refdata), so it is neither copied per rerun nor per worker
+@st.cache_resource
 def load_qudt():
-    g = Graph(); g.parse("qudt.ttl", format="turtle")
-    Q = Namespace("http://qudt.org/schema/qudt/")
-    res = {}
-    for s in g.subjects(None, Q.QuantityKind):
-        qn = s.split("/")[-1]
-        res[qn] = [u.split("/")[-1] for u in g.objects(s, Q.applicableUnit)] or ["Custom"]
-    return res
+    return unit_choices()
 qudt_quantities = load_qudt()
 
+# Uncertainty budgets of uploaded replicate files, keyed by content (Properties tab)
+@st.cache_data(max_entries=8)
+def certify_replicates(data: bytes, name: str, shelf_life: float, probability: float):
+    return certify(read_replicates(io.BytesIO(data), name), shelf_life, probability)
+
 # Factories used later (Properties tab)
 
 def create_empty_materialProperties():
@@ -227,347 +358,20 @@ def create_empty_result():
 # -----------------------------------------------------------------------------
 # XML → session‑state loader (comprehensive - loads all tabs and fields)
 
+def read_document(xml_bytes: bytes) -> dict:
+    """Session-state values of an XML file or package, with its signature check (cached by document hash)."""
+    if is_package(xml_bytes):
+        state, xml_bytes = load_package(io.BytesIO(xml_bytes), get_blob_store())
+    else:
+        state = parse_drmd(xml_bytes, get_blob_store())
+    state["template_loaded"] = True
+    state["signature_status"] = verify_cached(xml_bytes)
+    return state
+
 def load_xml_into_state(xml_bytes: bytes):
     try:
-        tree = ET.parse(io.BytesIO(xml_bytes))
-        root = tree.getroot()
-
-        # Define namespaces
-        ns = {
-            "drmd": "https://example.org/drmd",
-            "dcc": "https://ptb.de/dcc",
-            "si": "https://ptb.de/si",
-            "ds": "http://www.w3.org/2000/09/xmldsig#"
-        }
-
-        # Try to extract namespace from root tag if possible
-        ns_match = re.match(r'\{(.*?)\}', root.tag)
-        if ns_match:
-            ns["drmd"] = ns_match.group(1)
-
-        # Load title and unique identifier
-        title_elem = root.find(".//drmd:titleOfTheDocument", ns)
-        if title_elem is not None and title_elem.text:
-            st.session_state.title_option = title_elem.text.strip() if title_elem.text.strip() in ALLOWED_TITLES else ALLOWED_TITLES[0]
-
-        uid_elem = root.find(".//drmd:uniqueIdentifier", ns)
-        if uid_elem is not None and uid_elem.text:
-            st.session_state.persistent_id = uid_elem.text.strip()
-            st.session_state.persistent_id_value = uid_elem.text.strip()
-
-        # Load validity
-        validity_elem = root.find(".//drmd:validity", ns)
-        if validity_elem is not None:
-            if validity_elem.find("drmd:untilRevoked", ns) is not None:
-                st.session_state.validity_type = "Until Revoked"
-            elif validity_elem.find("drmd:timeAfterDispatch", ns) is not None:
-                st.session_state.validity_type = "Time After Dispatch"
-                period_elem = validity_elem.find("drmd:timeAfterDispatch/drmd:period", ns)
-                if period_elem is not None and period_elem.text:
-                    st.session_state.raw_validity_period = period_elem.text.strip()
-                dd_elem = validity_elem.find("drmd:timeAfterDispatch/drmd:dispatchDate", ns)
-                if dd_elem is not None and dd_elem.text:
-                    try:
-                        st.session_state.date_of_issue = date.fromisoformat(dd_elem.text.strip())
-                    except ValueError:
-                        st.session_state.date_of_issue = date.today()
-            elif validity_elem.find("drmd:specificTime", ns) is not None:
-                st.session_state.validity_type = "Specific Time"
-                spec_elem = validity_elem.find("drmd:specificTime", ns)
-                if spec_elem is not None and spec_elem.text:
-                    try:
-                        st.session_state.specific_time = date.fromisoformat(spec_elem.text.strip())
-                    except ValueError:
-                        st.session_state.specific_time = date.today()
-
-        # Load document identifiers (new style)
-        dids = []
-        for did in root.findall(".//drmd:documentIdentifiers/drmd:documentIdentifier", ns):
-            scheme = did.find("drmd:scheme", ns)
-            value = did.find("drmd:value", ns)
-            link_elem = did.find("drmd:link", ns)
-            dids.append({
-                "scheme": scheme.text.strip() if scheme is not None and scheme.text else "",
-                "value": value.text.strip() if value is not None and value.text else "",
-                "link": link_elem.text.strip() if link_elem is not None and link_elem.text else ""
-            })
-        if not dids:
-            legacy_ident = root.find(".//drmd:identifications/drmd:identification", ns)
-            if legacy_ident is not None:
-                issuer = legacy_ident.find("drmd:issuer", ns)
-                val_elem = legacy_ident.find("drmd:value", ns)
-                dids = [{
-                    "scheme": issuer.text.strip() if issuer is not None and issuer.text else "",
-                    "value": val_elem.text.strip() if val_elem is not None and val_elem.text else "",
-                    "link": ""
-                }]
-            else:
-                dids = [INIT_ID.copy()]
-        st.session_state.documentIdentifiers = dids
-
-        # Load Producers
-        prods = []
-        for prod_elem in root.findall(".//drmd:referenceMaterialProducer", ns):
-            name_elem = prod_elem.find("drmd:name/dcc:content", ns)
-            contact_elem = prod_elem.find("drmd:contact", ns)
-            street = streetNo = postCode = city = country = phone = fax = email = ""
-            if contact_elem is not None:
-                # Get location information
-                loc = contact_elem.find("dcc:location", ns)
-                if loc is not None:
-                    street = loc.find("dcc:street", ns).text.strip() if loc.find("dcc:street", ns) is not None and loc.find("dcc:street", ns).text else ""
-                    streetNo = loc.find("dcc:streetNo", ns).text.strip() if loc.find("dcc:streetNo", ns) is not None and loc.find("dcc:streetNo", ns).text else ""
-                    postCode = loc.find("dcc:postCode", ns).text.strip() if loc.find("dcc:postCode", ns) is not None and loc.find("dcc:postCode", ns).text else ""
-                    city = loc.find("dcc:city", ns).text.strip() if loc.find("dcc:city", ns) is not None and loc.find("dcc:city", ns).text else ""
-                    country = loc.find("dcc:countryCode", ns).text.strip() if loc.find("dcc:countryCode", ns) is not None and loc.find("dcc:countryCode", ns).text else ""
-                phone = contact_elem.find("dcc:phone", ns).text.strip() if contact_elem.find("dcc:phone", ns) is not None and contact_elem.find("dcc:phone", ns).text else ""
-                fax = contact_elem.find("dcc:fax", ns).text.strip() if contact_elem.find("dcc:fax", ns) is not None and contact_elem.find("dcc:fax", ns).text else ""
-                email = contact_elem.find("dcc:eMail", ns).text.strip() if contact_elem.find("dcc:eMail", ns) is not None and contact_elem.find("dcc:eMail", ns).text else ""
-            org_ids = []
-            for oid in prod_elem.findall("drmd:organizationIdentifiers/drmd:organizationIdentifier", ns):
-                sch = oid.find("drmd:scheme", ns)
-                val = oid.find("drmd:value", ns)
-                link = oid.find("drmd:link", ns)
-                org_ids.append({
-                    "scheme": sch.text.strip() if sch is not None and sch.text else "",
-                    "value": val.text.strip() if val is not None and val.text else "",
-                    "link": link.text.strip() if link is not None and link.text else ""
-                })
-            prods.append({
-                "producerName": name_elem.text.strip() if name_elem is not None and name_elem.text else "",
-                "producerStreet": street,
-                "producerStreetNo": streetNo,
-                "producerPostCode": postCode,
-                "producerCity": city,
-                "producerCountryCode": country,
-                "producerPhone": phone,
-                "producerFax": fax,
-                "producerEmail": email,
-                "organizationIdentifiers": org_ids or [INIT_ID.copy()]
-            })
-        if prods:
-            st.session_state.producers = prods
-
-        # Load Responsible Persons
-        rps = []
-        for rp_elem in root.findall(".//drmd:respPersons/dcc:respPerson", ns):
-            person_elem = rp_elem.find("dcc:person/dcc:name/dcc:content", ns)
-            name = person_elem.text.strip() if person_elem is not None and person_elem.text else ""
-            desc_elems = rp_elem.findall("dcc:description/dcc:content", ns)
-            description = " ".join([d.text.strip() for d in desc_elems if d is not None and d.text]) if desc_elems else ""
-            role_elem = rp_elem.find("dcc:role", ns)
-            role = role_elem.text.strip() if role_elem is not None and role_elem.text else ""
-            mainSigner_elem = rp_elem.find("dcc:mainSigner", ns)
-            mainSigner = (mainSigner_elem.text.strip().lower() == "true") if mainSigner_elem is not None and mainSigner_elem.text else False
-            cryptElectronicSeal_elem = rp_elem.find("dcc:cryptElectronicSeal", ns)
-            cryptElectronicSeal = (cryptElectronicSeal_elem.text.strip().lower() == "true") if cryptElectronicSeal_elem is not None and cryptElectronicSeal_elem.text else False
-            cryptElectronicSignature_elem = rp_elem.find("dcc:cryptElectronicSignature", ns)
-            cryptElectronicSignature = (cryptElectronicSignature_elem.text.strip().lower() == "true") if cryptElectronicSignature_elem is not None and cryptElectronicSignature_elem.text else False
-            cryptElectronicTimeStamp_elem = rp_elem.find("dcc:cryptElectronicTimeStamp", ns)
-            cryptElectronicTimeStamp = (cryptElectronicTimeStamp_elem.text.strip().lower() == "true") if cryptElectronicTimeStamp_elem is not None and cryptElectronicTimeStamp_elem.text else False
-            rps.append({
-                "personName": name,
-                "description": description,
-                "role": role,
-                "mainSigner": mainSigner,
-                "cryptElectronicSeal": cryptElectronicSeal,
-                "cryptElectronicSignature": cryptElectronicSignature,
-                "cryptElectronicTimeStamp": cryptElectronicTimeStamp
-            })
-        if rps:
-            st.session_state.responsible_persons = rps
-
-        # Load Materials
-        mats = []
-        for mat_elem in root.findall(".//drmd:materials/drmd:material", ns):
-            name_elem = mat_elem.find("drmd:name/dcc:content", ns)
-            desc_elem = mat_elem.find("drmd:description/dcc:content", ns)
-            sample_elem = mat_elem.find("drmd:minimumSampleSize/dcc:itemQuantity/si:realListXMLList/si:valueXMLList", ns)
-
-            # Build material dictionary with all required keys
-            mat = {
-                "uuid": str(uuid.uuid4()),
-                "name": name_elem.text.strip() if name_elem is not None and name_elem.text else "",
-                "description": " ".join(desc_elem.text.split()) if desc_elem is not None and desc_elem.text else "",
-                "materialClass": "",
-                "minimumSampleSize": sample_elem.text.strip() if sample_elem is not None and sample_elem.text else "",
-                "itemQuantities": "",
-                "isCertified": mat_elem.get("isCertified", "false").lower() == "true",
-                "materialIdentifiers": []
-            }
-
-            # Load material identifiers
-            for mid in mat_elem.findall("drmd:materialIdentifiers/drmd:materialIdentifier", ns):
-                sch = mid.find("drmd:scheme", ns)
-                val = mid.find("drmd:value", ns)
-                link_elem = mid.find("drmd:link", ns)
-                mat["materialIdentifiers"].append({
-                    "scheme": sch.text.strip() if sch is not None and sch.text else "",
-                    "value": val.text.strip() if val is not None and val.text else "",
-                    "link": link_elem.text.strip() if link_elem is not None and link_elem.text else ""
-                })
-
-            if not mat["materialIdentifiers"]:
-                mat["materialIdentifiers"].append(INIT_ID.copy())
-
-            mats.append(mat)
-
-        if mats:
-            st.session_state.materials = mats
-        else:
-            st.session_state.materials = [{"uuid": str(uuid.uuid4()), "name": "", "description": "", "materialClass": "",
-                                          "minimumSampleSize": "", "itemQuantities": "", "isCertified": False,
-                                          "materialIdentifiers": [INIT_ID.copy()]}]
-
-        # Load Statements
-        official_keys = ["intendedUse", "commutability", "storageInformation",
-                        "instructionsForHandlingAndUse", "metrologicalTraceability",
-                        "healthAndSafetyInformation", "subcontractors",
-                        "legalNotice", "referenceToCertificationReport"]
-        official_statements = {key: {"name": "", "content": ""} for key in official_keys}
-        custom_statements = []
-
-        statements_elem = root.find(".//drmd:statements", ns)
-        if statements_elem is not None:
-            for child in statements_elem:
-                # Get the local tag name
-                tag = child.tag.split("}")[1] if "}" in child.tag else child.tag
-                # Extract the optional name
-                name_elem = child.find("dcc:name/dcc:content", ns)
-                name_text = clean_text(name_elem.text) if name_elem is not None and name_elem.text else ""
-                # Extract all direct dcc:content children (excluding the one inside dcc:name)
-                contents = []
-                for elem in child.findall("dcc:content", ns):
-                    if elem.text:
-                        contents.append(clean_text(elem.text))
-                content_text = "\n".join(contents)
-
-                if tag in official_keys:
-                    official_statements[tag] = {"name": name_text, "content": content_text}
-                elif tag == "statement":
-                    custom_statements.append({"name": name_text, "content": content_text})
-
-        st.session_state.official_statements = official_statements
-        st.session_state.custom_statements = custom_statements
-
-        # Load Material Properties
-        mps = []
-        mp_list_elem = root.find("drmd:materialPropertiesList", ns)
-        if mp_list_elem is not None:
-            for mp_elem in mp_list_elem.findall("drmd:materialProperties", ns):
-                mp_dict = {}
-                # isCertified attribute
-                mp_dict["isCertified"] = True if mp_elem.attrib.get("isCertified", "false").lower() == "true" else False
-                # Optional attribute id
-                mp_dict["id"] = mp_elem.attrib.get("id", "").strip()
-                # Name (required)
-                name_elem = mp_elem.find("drmd:name/dcc:content", ns)
-                mp_dict["name"] = clean_text(name_elem.text) if name_elem is not None and name_elem.text else ""
-                # Description (optional)
-                desc_elem = mp_elem.find("drmd:description/dcc:content", ns)
-                mp_dict["description"] = clean_text(desc_elem.text) if desc_elem is not None and desc_elem.text else ""
-                # Procedures (optional)
-                proc_elem = mp_elem.find("drmd:procedures/dcc:content", ns)
-                mp_dict["procedures"] = clean_text(proc_elem.text) if proc_elem is not None and proc_elem.text else ""
-
-                # Results (required)
-                results = []
-                results_elem = mp_elem.find("drmd:results", ns)
-                if results_elem is not None:
-                    for res_elem in results_elem.findall("dcc:result", ns):
-                        res_dict = {}
-                        res_name_elem = res_elem.find("dcc:name/dcc:content", ns)
-                        res_dict["result_name"] = clean_text(res_name_elem.text) if res_name_elem is not None and res_name_elem.text else ""
-                        res_desc_elem = res_elem.find("dcc:description/dcc:content", ns)
-                        res_dict["description"] = clean_text(res_desc_elem.text) if res_desc_elem is not None and res_desc_elem.text else ""
-                        # Quantities
-                        quantities = []
-                        row_ids = []
-                        data_elem = res_elem.find("dcc:data", ns)
-                        if data_elem is not None:
-                            list_elem = data_elem.find("dcc:list", ns)
-                            if list_elem is not None:
-                                for quant_elem in list_elem.findall("dcc:quantity", ns):
-                                    quant = {}
-                                    q_ids = []
-                                    # Get quantity name
-                                    qname_elem = quant_elem.find("dcc:name/dcc:content", ns)
-                                    quant["Name"] = clean_text(qname_elem.text) if qname_elem is not None and qname_elem.text else ""
-                                    # We'll leave Label and Quantity Type as empty for now
-                                    quant["Label"] = ""
-                                    quant["Quantity Type"] = ""
-                                    # Get real value
-                                    real_elem = quant_elem.find("si:real", ns)
-                                    if real_elem is not None:
-                                        value_elem = real_elem.find("si:value", ns)
-                                        quant["Value"] = float(value_elem.text.strip()) if value_elem is not None and value_elem.text and value_elem.text.strip().replace('.', '', 1).isdigit() else None
-                                        unit_elem = real_elem.find("si:unit", ns)
-                                        quant["Unit"] = unit_elem.text.strip() if unit_elem is not None and unit_elem.text else ""
-                                        # Measurement uncertainty
-                                        mu_elem = real_elem.find("si:measurementUncertaintyUnivariate/si:expandedMU", ns)
-                                        if mu_elem is not None:
-                                            val_mu = mu_elem.find("si:valueExpandedMU", ns)
-                                            quant["Uncertainty"] = float(val_mu.text.strip()) if val_mu is not None and val_mu.text and val_mu.text.strip().replace('.', '', 1).isdigit() else None
-                                            cf_elem = mu_elem.find("si:coverageFactor", ns)
-                                            quant["Coverage Factor"] = float(cf_elem.text.strip()) if cf_elem is not None and cf_elem.text and cf_elem.text.strip().replace('.', '', 1).isdigit() else None
-                                            cp_elem = mu_elem.find("si:coverageProbability", ns)
-                                            quant["Coverage Probability"] = float(cp_elem.text.strip()) if cp_elem is not None and cp_elem.text and cp_elem.text.strip().replace('.', '', 1).isdigit() else None
-                                            dist_elem = mu_elem.find("si:distribution", ns)
-                                            quant["Distribution"] = dist_elem.text.strip() if dist_elem is not None and dist_elem.text else ""
-                                    # property identifiers
-                                    for pid in quant_elem.findall("drmd:propertyIdentifiers/drmd:propertyIdentifier", ns):
-                                        s = pid.find("drmd:scheme", ns)
-                                        v = pid.find("drmd:value", ns)
-                                        l = pid.find("drmd:link", ns)
-                                        q_ids.append({
-                                            "scheme": s.text.strip() if s is not None and s.text else "",
-                                            "value": v.text.strip() if v is not None and v.text else "",
-                                            "link": l.text.strip() if l is not None and l.text else ""
-                                        })
-                                    quantities.append(quant)
-                                    row_ids.append(q_ids or [ ])
-                        # Convert list of quantities to a DataFrame
-                        df_quant = pd.DataFrame(quantities, columns=["Name", "Label", "Value", "Quantity Type", "Unit", "Uncertainty", "Coverage Factor", "Coverage Probability", "Distribution", "Identifier"])
-                        for i, ids in enumerate(row_ids):
-                            df_quant.loc[i, "Identifier"] = ids[0]["value"] if ids else ""
-                        res_dict["quantities"] = df_quant
-                        res_dict["identifiers"] = row_ids
-                        results.append(res_dict)
-                mp_dict["results"] = results
-                # Assign a new UUID for internal use
-                mp_dict["uuid"] = str(uuid.uuid4())
-                mps.append(mp_dict)
-        if mps:
-            st.session_state.materialProperties = mps
-
-        # Extract all <comment> elements separately
-        comments = []
-        for comment_elem in root.findall(".//drmd:comment", ns):
-            if comment_elem.text:
-                comments.append(comment_elem.text.strip())
-        st.session_state.comment = "\n".join(comments) if comments else ""
-
-        # Extract all <document> elements with metadata
-        embedded_files = []
-        for doc_elem in root.findall(".//drmd:document", ns):
-            file_name = doc_elem.find("dcc:fileName", ns).text if doc_elem.find("dcc:fileName", ns) is not None else "unknown"
-            mime_type = doc_elem.find("dcc:mimeType", ns).text if doc_elem.find("dcc:mimeType", ns) is not None else "application/octet-stream"
-            base64_data = doc_elem.find("dcc:dataBase64", ns).text if doc_elem.find("dcc:dataBase64", ns) is not None else ""
-
-            # Convert base64 data to bytes for download
-            file_bytes = base64.b64decode(base64_data) if base64_data else b""
-
-            embedded_files.append({
-                "name": file_name,
-                "mimeType": mime_type,
-                "data": file_bytes  # Store file as bytes
-            })
-
-        # Store extracted files
-        if embedded_files:
-            st.session_state.embedded_files = embedded_files
-
-        st.session_state.template_loaded = True
+        st.session_state.update(read_document(xml_bytes))
+        st.session_state.pop("identifier_index", None)
         st.sidebar.success("XML template loaded ✔")
 
     except Exception as e:
@@ -605,352 +409,717 @@ SESSION_DEFAULTS = {
     "validity_type": "Until Revoked", "raw_validity_period": "",
     "date_of_issue": date.today(), "specific_time": date.today(),
     "template_loaded": False,
+    "embedded_files": [],
+    "ingested_uploads": set(),
 }
+# -----------------------------------------------------------------------------
+# Drafts: resume from the on-disk store (no XML parsing) and autosave per section
+
+def draft_owner() -> str:
+    """Drafts belong to the signed-in user, or else to this browser's key in the ``?owner=`` URL parameter."""
+    with contextlib.suppress(Exception):
+        if st.user.is_logged_in and st.user.email:
+            return f"user:{st.user.email}"
+    if "draft_owner" not in st.session_state:
+        st.session_state.draft_owner = st.query_params.get("owner") or uuid.uuid4().hex
+    if st.query_params.get("owner") != st.session_state.draft_owner:
+        st.query_params["owner"] = st.session_state.draft_owner
+    return f"key:{st.session_state.draft_owner}"
+
+def clear_query_params():
+    """Drop the URL parameters of the current certificate; the draft owner key stays."""
+    owner = st.query_params.get("owner")
+    st.query_params.clear()
+    if owner:
+        st.query_params["owner"] = owner
+
+def resume_draft(draft_id, version=None):
+    state, hashes = get_draft_store().load(draft_id, draft_owner(), version)
+    if state is None:
+        return False
+    st.session_state.update(state)
+    st.session_state.pop("identifier_index", None)
+    st.session_state.draft_id = draft_id
+    # Restoring an older version makes it the new head on the next autosave.
+    st.session_state.draft_hashes = hashes if version is None else None
+    st.session_state.template_loaded = True
+    return True
+
+def keep_workspace_clear():
+    """Clear the session state except for the workspace of other open certificates."""
+    workspace = st.session_state.get("workspace")
+    st.session_state.clear()
+    if workspace is not None:
+        st.session_state.workspace = workspace
+
+def open_draft(draft_id, version=None):
+    keep_workspace_clear()
+    st.query_params["draft"] = draft_id
+    if version is not None:
+        st.session_state.draft_restore_version = version
+    st.rerun()
+
+def autosave_draft(changed: bool):
+    """Save the open draft when the document changed; reruns that change nothing pickle nothing."""
+    if changed:
+        st.session_state.draft_dirty = True
+    if not st.session_state.get("draft_id") or not st.session_state.get("draft_autosave", True):
+        return
+    if st.session_state.get("draft_dirty") or st.session_state.get("draft_hashes") is None:
+        hashes = get_draft_store().save(st.session_state.draft_id, st.session_state, st.session_state.get("draft_hashes"))
+        if hashes is not None:
+            st.session_state.draft_hashes = hashes
+        st.session_state.draft_dirty = False
+
+requested_draft = st.query_params.get("draft")
+if requested_draft and st.session_state.get("draft_id") != requested_draft:
+    if not resume_draft(requested_draft, st.session_state.pop("draft_restore_version", None)):
+        del st.query_params["draft"]
+
 for k, v in SESSION_DEFAULTS.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
+# -----------------------------------------------------------------------------
+# Identifier index: built once per loaded document, then updated list by list
+# as the editors below render.  Structural removals drop it for a rebuild.
+
+def identifier_index() -> IdentifierIndex:
+    if "identifier_index" not in st.session_state:
+        st.session_state.identifier_index = IdentifierIndex.from_state(st.session_state)
+    return st.session_state.identifier_index
+
+# -----------------------------------------------------------------------------
+# Undo/redo history of the document: one step per rerun that changed it, holding
+# only the changed table cells/rows and the changed sections (drmd.history).
+
+def get_history() -> History:
+    if "history" not in st.session_state:
+        st.session_state.history = History()
+    return st.session_state.history
+
+# Inputs that show a value of the document (value=..., key=...) keep their own
+# widget state; after undo/redo it is dropped so they show the restored value.
+DOCUMENT_INPUT_KEY = re.compile(r"(doc|org|mat|mp|res|prop|cs|rp|producer[A-Za-z]+|official_content|quantities)_")
+
+def undo_redo(action):
+    if action(st.session_state):
+        st.session_state.draft_dirty = True
+        for key in [k for k in st.session_state if DOCUMENT_INPUT_KEY.match(k)]:
+            del st.session_state[key]
+        st.session_state.persistent_id = st.session_state.get("persistent_id_value", "")
+        st.session_state.pop("identifier_index", None)
+
+# -----------------------------------------------------------------------------
+# Workspace: the other open certificates of this session, kept as parsed models
+# in a memory-bounded LRU that spills to disk (drmd.workspace).  Switching swaps
+# them with the one in the session state, edits and undo history included.
+
+def get_workspace() -> Workspace:
+    if "workspace" not in st.session_state:
+        st.session_state.workspace = Workspace()
+    return st.session_state.workspace
+
+def switch_document(doc_id):
+    get_workspace().swap(st.session_state, doc_id)
+    for key in [k for k in st.session_state if DOCUMENT_INPUT_KEY.match(k)]:
+        del st.session_state[key]
+    st.session_state.pop("identifier_index", None)
+    # Autosave follows the draft of the certificate now shown
+    if st.session_state.get("draft_id"):
+        st.query_params["draft"] = st.session_state.draft_id
+    elif "draft" in st.query_params:
+        del st.query_params["draft"]
+
+def render_history_panel(container):
+    history = get_history()
+    col1, col2 = container.columns(2)
+    col1.button("↶ Undo", key="history_undo", disabled=not history.can_undo, on_click=undo_redo,
+                args=(history.undo,), use_container_width=True)
+    col2.button("↷ Redo", key="history_redo", disabled=not history.can_redo, on_click=undo_redo,
+                args=(history.redo,), use_container_width=True)
+    container.caption(f"{len(history.undo_steps)} step(s) to undo, {len(history.redo_steps)} to redo "
+                      f"({history.nbytes() / 1024:,.0f} KB)")
+
+def render_rule_panel(limit=20):
+    findings = get_rules().check(st.session_state)
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Rule Check")
+    if not len(findings):
+        st.sidebar.caption("No business rule findings.")
+        return
+    for _, finding in findings.head(limit).iterrows():
+        show = st.sidebar.error if finding["severity"] == "error" else st.sidebar.warning
+        show(f"**{finding['message']}**  \n{describe_finding(finding, st.session_state)}")
+    if len(findings) > limit:
+        st.sidebar.caption(f"{len(findings) - limit} more findings not shown.")
+
+def render_identifier_panel(limit=20):
+    findings = identifier_index().findings()
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Identifier Check")
+    if not findings:
+        st.sidebar.caption(f"{len(identifier_index())} identifiers, no duplicates or dangling references.")
+        return
+    for finding in findings[:limit]:
+        places = "; ".join(describe(loc, st.session_state) for loc in finding.locations[:5])
+        more = f" (+{len(finding.locations) - 5} more)" if len(finding.locations) > 5 else ""
+        st.sidebar.warning(f"**{finding.kind}** `{finding.subject}`  \n{places}{more}")
+    if len(findings) > limit:
+        st.sidebar.caption(f"{len(findings) - limit} more findings not shown.")
+
 # -----------------------------------------------------------------------------
 # Sidebar utilities
 st.sidebar.header("DRMD Generator")
-xml_template = st.sidebar.file_uploader("Load XML file", type=["xml"])
+xml_template = st.sidebar.file_uploader("Load XML file or package", type=["xml", "drmdz"], key="xml_template")
 if xml_template and not st.session_state.template_loaded:
     load_xml_into_state(xml_template.getvalue())
+    if st.session_state.template_loaded:
+        st.session_state.workspace_label = xml_template.name
+
+def render_signature_status():
+    status = st.session_state.get("signature_status")
+    if status is None:
+        return
+    if status.status == "valid" and status.trusted:
+        st.sidebar.success(f"Signature valid ✔ — {status.signer}")
+    elif status.status == "valid":
+        st.sidebar.warning(f"Signature intact, but the certificate is not trusted — {status.signer}  \n"
+                           "Add its issuer to the DRMD_TRUST_STORE bundle to trust it.")
+    elif status.status == "invalid":
+        st.sidebar.error(f"Signature INVALID: {status.message}")
+    elif status.status == "error":
+        st.sidebar.warning(f"Signature could not be verified: {status.message}")
+    else:
+        st.sidebar.info("Document is not signed")
+
+render_signature_status()
 
 if st.sidebar.button("Reset All"):
-    st.session_state.clear(); st.rerun()
+    st.session_state.clear(); clear_query_params(); st.rerun()
+
+# Undo/redo; filled in at the end of the script, once this rerun's edits are recorded
+history_panel = st.sidebar.container()
+
+def render_drafts_panel():
+    store = get_draft_store()
+    owner = draft_owner()
+    drafts = store.list(owner)
+    names = {d[0]: d[1] for d in drafts}
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Drafts")
+    draft_id = st.session_state.get("draft_id")
+    if draft_id:
+        st.sidebar.caption(f"Editing draft **{names.get(draft_id, draft_id)}**")
+        st.sidebar.checkbox("Autosave", value=True, key="draft_autosave")
+        versions = dict(store.versions(draft_id, owner))
+        if len(versions) > 1:
+            version = st.sidebar.selectbox(
+                "Version history", list(versions),
+                format_func=lambda v: f"v{v} – {datetime.fromtimestamp(versions[v]):%Y-%m-%d %H:%M:%S}",
+                key="draft_version")
+            if st.sidebar.button("Restore Version", key="draft_restore", disabled=version == max(versions)):
+                open_draft(draft_id, version)
+    else:
+        name = st.sidebar.text_input("Draft name", key="draft_name", placeholder="e.g. BAM-M123 draft")
+        if st.sidebar.button("Save as Draft", key="draft_create"):
+            new_id = store.create(name, owner)
+            st.session_state.draft_hashes = store.save(new_id, st.session_state)
+            st.session_state.draft_id = new_id
+            st.query_params["draft"] = new_id
+            st.rerun()
+    others = [d[0] for d in drafts if d[0] != draft_id]
+    if others:
+        choice = st.sidebar.selectbox("Open draft", others, format_func=lambda i: names[i], key="draft_choice")
+        col1, col2 = st.sidebar.columns(2)
+        if col1.button("Resume", key="draft_resume"):
+            open_draft(choice)
+        if col2.button("Delete", key="draft_delete"):
+            store.delete(choice, owner); st.rerun()
+
+render_drafts_panel()
+
+def render_workspace_panel():
+    workspace = get_workspace()
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Workspace")
+    st.sidebar.caption(f"Editing **{document_label(st.session_state)}**")
+    uploads = st.sidebar.file_uploader("Open more certificates", type=["xml", "drmdz"], accept_multiple_files=True,
+                                       key="workspace_uploads")
+    # Each upload is parsed once; switching to it later only swaps models.
+    for upload in uploads or []:
+        if upload.file_id in workspace.ingested:
+            continue
+        workspace.ingested.add(upload.file_id)
+        try:
+            model = read_document(upload.getvalue())
+        except Exception as e:
+            st.sidebar.error(f"Failed to open {upload.name}: {e}")
+            continue
+        model["workspace_label"] = upload.name
+        workspace.add(upload.name, model)
+    if not len(workspace):
+        return
+    items = {doc_id: (label, on_disk) for doc_id, label, on_disk, _ in workspace.items()}
+    choice = st.sidebar.selectbox("Open certificates", list(items), key="workspace_choice",
+                                  format_func=lambda i: items[i][0] + (" (on disk)" if items[i][1] else ""))
+    col1, col2 = st.sidebar.columns(2)
+    col1.button("Switch", key="workspace_switch", on_click=switch_document, args=(choice,), use_container_width=True)
+    if col2.button("Close", key="workspace_close", use_container_width=True):
+        workspace.close(choice); st.rerun()
+    st.sidebar.caption(f"{len(workspace)} other certificate(s): {workspace.memory_nbytes() / 1024:,.0f} KB in memory, "
+                       f"{workspace.disk_nbytes() / 1024:,.0f} KB on disk")
+
+render_workspace_panel()
+
+def render_library_panel():
+    library = get_library()
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Certificate Library")
+    query = st.sidebar.text_input("Search certificates", key="library_query",
+                                  placeholder="material, property, identifier, producer …")
+    if query:
+        hits = library.search(query)
+        if not hits:
+            st.sidebar.caption("No matching certificates.")
+        for cert_id, path, title, uid, materials, snippet in hits:
+            st.sidebar.markdown(f"**{materials or os.path.basename(path)}**  \n`{uid}` · {os.path.basename(path)}  \n{snippet}")
+            if st.sidebar.button("Open as template", key=f"library_open_{cert_id}"):
+                # Pre-parsed model: no XML parsing when opening a hit.
+                model = library.load_model(cert_id)
+                keep_workspace_clear(); clear_query_params()
+                st.session_state.update(model)
+                st.session_state.template_loaded = True
+                st.rerun()
+    if xml_template is not None and st.sidebar.button("Add loaded file to library", key="library_add"):
+        library.add_bytes(xml_template.name, xml_template.getvalue(), get_blob_store())
+        st.sidebar.success(f"{xml_template.name} added to the library")
+
+render_library_panel()
 
 # -----------------------------------------------------------------------------
-# Main Tabs list
-tabs = st.tabs([
+# Main sections.  As tabs, every section runs on each rerun and the browser
+# only hides the inactive ones; as sections, only the selected one runs.
+SECTIONS = [
     "Administrative Data", "Materials", "Properties", "Statements",
     "Comments & Documents", "Digital Signature", "Validate & Export","Help"
-])
+]
+# Widgets whose value lives only under their key.  Streamlit drops the state
+# of widgets that were not rendered in a run, so the keys of the sections not
+# shown are re-assigned to keep their values.
+SECTION_WIDGET_KEYS = {
+    "Administrative Data": ["title_option", "persistent_id", "validity_type", "raw_validity_period",
+                            "date_of_issue", "specific_time"],
+    "Comments & Documents": ["comment"],
+    "Digital Signature": ["signature_password", "sign_export"],
+    "Validate & Export": ["streaming_export", "preview_section", "xml_page"],
+}
+
+if st.session_state.ui_navigation == "Sections":
+    active_section = st.radio("Section", SECTIONS, key="active_section", horizontal=True, label_visibility="collapsed")
+    for name, keys in SECTION_WIDGET_KEYS.items():
+        if name != active_section:
+            for key in keys:
+                if key in st.session_state:
+                    st.session_state[key] = st.session_state[key]
+    sections = {active_section: st.container()}
+else:
+    sections = dict(zip(SECTIONS, st.tabs(SECTIONS)))
 
 # -----------------------------------------------------------------------------
 # TAB 0 – Administrative Data (unchanged from rev2 except duration help)
 # -----------------------------------------------------------------------------
-with tabs[0]:
-    with st.expander("Basic Information", expanded=True):
-        col1, col2, col3 = st.columns([3, 3, 1])
-        with col1:
-            st.selectbox(
-                "Title of the Document",
-                ALLOWED_TITLES,
-                key="title_option",
-                format_func=lambda x: " ".join(re.findall(r"[A-Z][^A-Z]*", x)).title(),
-            )
-        # Initialize persistent_id_value if it doesn't exist
-        if "persistent_id_value" not in st.session_state:
-            st.session_state.persistent_id_value = ""
-
-        # Define the callback function to generate UUID
-        def generate_uuid():
-            st.session_state.persistent_id_value = str(uuid.uuid4())
+if "Administrative Data" in sections:
+    with sections["Administrative Data"], profile_block("Administrative Data"):
+        with st.expander("Basic Information", expanded=True):
+            col1, col2, col3 = st.columns([3, 3, 1])
+            with col1:
+                st.selectbox(
+                    "Title of the Document",
+                    ALLOWED_TITLES,
+                    key="title_option",
+                    format_func=lambda x: " ".join(re.findall(r"[A-Z][^A-Z]*", x)).title(),
+                )
+            # Initialize persistent_id_value if it doesn't exist
+            if "persistent_id_value" not in st.session_state:
+                st.session_state.persistent_id_value = ""
+
+            # Define the callback function to generate UUID
+            def generate_uuid():
+                st.session_state.persistent_id_value = str(uuid.uuid4())
+
+            with col2:
+                # Use the value parameter to set the text input's value from session state
+                st.text_input(
+                    "Persistent Document Identifier",
+                    value=st.session_state.persistent_id_value,
+                    key="persistent_id",
+                    help="A globally unique, permanent identifier (e.g. UUID).",
+                )
+                # Update the session state when the text input changes
+                if "persistent_id" in st.session_state:
+                    st.session_state.persistent_id_value = st.session_state.persistent_id
+                field_hint("administrativeData/coreData/uniqueIdentifier", st.session_state.persistent_id_value)
+
+            with col3:
+                # Add some vertical spacing
+                st.write("")
+                # Create the button with the callback
+                if st.button("Generate", key="pid_gen", on_click=generate_uuid):
+                    pass
+
+            st.markdown("#### Document Identifiers")
+            for didx, did in enumerate(st.session_state.documentIdentifiers):
+                cols = st.columns([2, 3, 4, 1])
+                did["scheme"] = cols[0].text_input("Scheme", did.get("scheme", ""), key=f"doc_scheme_{didx}")
+                did["value"] = cols[1].text_input("Value", did.get("value", ""), key=f"doc_value_{didx}")
+                did["link"] = cols[2].text_input("Link", did.get("link", ""), key=f"doc_link_{didx}")
+                identifier_hints(cols, DOC_ID_PATH, did)
+                if cols[3].button("🗑️", key=f"del_doc_id_{didx}") and len(st.session_state.documentIdentifiers) > 1:
+                    st.session_state.documentIdentifiers.pop(didx); st.rerun()
+            if st.button("➕ Add Identifier", key="add_doc_id"):
+                st.session_state.documentIdentifiers.append(INIT_ID.copy()); st.rerun()
+            identifier_index().set_identifiers(("document",), st.session_state.documentIdentifiers)
+
+            # Period of Validity row with new help text
+            cols = st.columns([3, 3, 3])
+            with cols[0]:
+                v_type = st.selectbox("Period of Validity", ["Until Revoked", "Time After Dispatch", "Specific Time"], key="validity_type")
+            if v_type == "Time After Dispatch":
+                with cols[1]:
+                    st.text_input("Duration", key="raw_validity_period", placeholder="P1Y6M", help=xs_duration_hint())
+                    field_hint("administrativeData/coreData/validity/timeAfterDispatch/period", st.session_state.raw_validity_period)
+                with cols[2]:
+                    st.date_input("Dispatch Date", key="date_of_issue")
+            elif v_type == "Specific Time":
+                with cols[1]:
+                    st.date_input("Date", key="specific_time")
+                cols[2].markdown(" ")
+            else:
+                cols[1].markdown(" "); cols[2].markdown(" ")
 
-        with col2:
-            # Use the value parameter to set the text input's value from session state
-            st.text_input(
-                "Persistent Document Identifier",
-                value=st.session_state.persistent_id_value,
-                key="persistent_id",
-                help="A globally unique, permanent identifier (e.g. UUID).",
-            )
-            # Update the session state when the text input changes
-            if "persistent_id" in st.session_state:
-                st.session_state.persistent_id_value = st.session_state.persistent_id
-
-        with col3:
-            # Add some vertical spacing
-            st.write("")
-            # Create the button with the callback
-            if st.button("Generate", key="pid_gen", on_click=generate_uuid):
-                pass
-
-        st.markdown("#### Document Identifiers")
-        for didx, did in enumerate(st.session_state.documentIdentifiers):
-            cols = st.columns([2, 3, 4, 1])
-            did["scheme"] = cols[0].text_input("Scheme", did.get("scheme", ""), key=f"doc_scheme_{didx}")
-            did["value"] = cols[1].text_input("Value", did.get("value", ""), key=f"doc_value_{didx}")
-            did["link"] = cols[2].text_input("Link", did.get("link", ""), key=f"doc_link_{didx}")
-            if cols[3].button("🗑️", key=f"del_doc_id_{didx}") and len(st.session_state.documentIdentifiers) > 1:
-                st.session_state.documentIdentifiers.pop(didx); st.rerun()
-        if st.button("➕ Add Identifier", key="add_doc_id"):
-            st.session_state.documentIdentifiers.append(INIT_ID.copy()); st.rerun()
-
-        # Period of Validity row with new help text
-        cols = st.columns([3, 3, 3])
-        with cols[0]:
-            v_type = st.selectbox("Period of Validity", ["Until Revoked", "Time After Dispatch", "Specific Time"], key="validity_type")
-        if v_type == "Time After Dispatch":
-            with cols[1]:
-                st.text_input("Duration", key="raw_validity_period", placeholder="P1Y6M", help=xs_duration_hint())
-            with cols[2]:
-                st.date_input("Dispatch Date", key="date_of_issue")
-        elif v_type == "Specific Time":
-            with cols[1]:
-                st.date_input("Date", key="specific_time")
-            cols[2].markdown(" ")
-        else:
-            cols[1].markdown(" "); cols[2].markdown(" ")
-
-     # Reference Material Producer and Responsible Persons section remains unchanged.
-    with st.expander("Reference Material Producer and Responsible Persons", expanded=True):
-        with st.container():
-            for idx, prod in enumerate(st.session_state.producers):
-                # Use a container with a header instead of an expander
-                st.markdown(f"###### Reference Material Producer")
-                with st.container():
-                    # Name and contact info
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        prod["producerName"] = st.text_input("Name", value=prod.get("producerName", ""), key=f"producerName_{idx}")
-                        prod["producerEmail"] = st.text_input("Email", value=prod.get("producerEmail", ""), key=f"producerEmail_{idx}")
-                        prod["producerPhone"] = st.text_input("Phone", value=prod.get("producerPhone", ""), key=f"producerPhone_{idx}")
-
-                    # Address info in a more compact layout
-                    with col2:
-                        addr_cols = st.columns([3, 1])
-                        with addr_cols[0]:
-                            prod["producerStreet"] = st.text_input("Street", value=prod.get("producerStreet", ""), key=f"producerStreet_{idx}")
-                    with addr_cols[1]:
-                        prod["producerStreetNo"] = st.text_input("No.", value=prod.get("producerStreetNo", ""), key=f"producerStreetNo_{idx}")
-
-                        city_cols = st.columns([1, 2, 1])
-                        with city_cols[0]:
-                            prod["producerPostCode"] = st.text_input("Post Code", value=prod.get("producerPostCode", ""), key=f"producerPostCode_{idx}")
-                        with city_cols[1]:
-                            prod["producerCity"] = st.text_input("City", value=prod.get("producerCity", ""), key=f"producerCity_{idx}")
-                        with city_cols[2]:
-                            prod["producerCountryCode"] = st.text_input("Country", value=prod.get("producerCountryCode", ""), key=f"producerCountryCode_{idx}")
-                        prod["producerFax"] = st.text_input("Fax", value=prod.get("producerFax", ""), key=f"producerFax_{idx}")
-
-                    st.markdown("#### Organization Identifiers")
-                    if not prod.get("organizationIdentifiers"):
-                        prod["organizationIdentifiers"] = [INIT_ID.copy()]
-                    for oid_idx, oid in enumerate(prod["organizationIdentifiers"]):
-                        cols_id = st.columns([2,3,4,1])
-                        oid["scheme"] = cols_id[0].text_input("Scheme", oid.get("scheme", ""), key=f"org_scheme_{idx}_{oid_idx}")
-                        oid["value"] = cols_id[1].text_input("Value", oid.get("value", ""), key=f"org_value_{idx}_{oid_idx}")
-                        oid["link"] = cols_id[2].text_input("Link", oid.get("link", ""), key=f"org_link_{idx}_{oid_idx}")
-                        if cols_id[3].button("🗑️", key=f"del_org_{idx}_{oid_idx}") and len(prod["organizationIdentifiers"])>1:
-                            prod["organizationIdentifiers"].pop(oid_idx); st.rerun()
-                    if st.button("➕ Add Identifier", key=f"add_org_{idx}"):
-                        prod["organizationIdentifiers"].append(INIT_ID.copy()); st.rerun()
-
-                    # if st.button("Remove", key=f"remove_prod_{idx}"):
-                    #     st.session_state.producers.pop(idx)
-                    #     st.rerun()
-
-                # Add a separator between producers
-
-            # if st.button("Add Producer", key="add_prod"):
-            #     st.session_state.producers.append({
-            #         "producerName": "",
-            #         "producerStreet": "",
-            #         "producerStreetNo": "",
-            #         "producerPostCode": "",
-            #         "producerCity": "",
-            #         "producerCountryCode": "",
-            #         "producerPhone": "",
-            #         "producerFax": "",
-            #         "producerEmail": ""
-            #     })
-            #     st.rerun()
-        st.markdown("---")
-
-        with st.container():
-            for idx, rp in enumerate(st.session_state.responsible_persons):
-                # Use a container with a header instead of an expander
-                st.markdown(f"###### Responsible Person {idx+1}")
-                with st.container():
-                    cols = st.columns([2, 2, 2])
-                    with cols[0]:
-                        rp["personName"] = st.text_input("Name", value=rp.get("personName", ""), key=f"rp_name_{idx}")
-                        rp["role"] = st.text_input("Role", value=rp.get("role", ""), key=f"rp_role_{idx}")
-                    with cols[1]:
-                        rp["description"] = st.text_area("Description", value=rp.get("description", ""), height=100, key=f"rp_desc_{idx}")
-                    with cols[2]:
-                        rp["mainSigner"] = st.checkbox("Main Signer", value=rp.get("mainSigner", False), key=f"rp_mainSigner_{idx}")
-                        rp["cryptElectronicSeal"] = st.checkbox("Electronic Seal", value=rp.get("cryptElectronicSeal", False), key=f"rp_cryptSeal_{idx}")
-                        rp["cryptElectronicSignature"] = st.checkbox("Electronic Signature", value=rp.get("cryptElectronicSignature", False), key=f"rp_cryptSig_{idx}")
-                        rp["cryptElectronicTimeStamp"] = st.checkbox("Electronic TimeStamp", value=rp.get("cryptElectronicTimeStamp", False), key=f"rp_cryptTS_{idx}")
-                    if st.button(f"Remove", key=f"remove_rp_{idx}"):
-                        st.session_state.responsible_persons.pop(idx)
-                        st.rerun()
+         # Reference Material Producer and Responsible Persons section remains unchanged.
+        with st.expander("Reference Material Producer and Responsible Persons", expanded=True):
+            with st.container():
+                for idx, prod in enumerate(st.session_state.producers):
+                    # Use a container with a header instead of an expander
+                    st.markdown(f"###### Reference Material Producer")
+                    with st.container():
+                        # Name and contact info
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            prod["producerName"] = st.text_input("Name", value=prod.get("producerName", ""), key=f"producerName_{idx}")
+                            field_hint("administrativeData/referenceMaterialProducer/name", prod["producerName"])
+                            prod["producerEmail"] = st.text_input("Email", value=prod.get("producerEmail", ""), key=f"producerEmail_{idx}")
+                            prod["producerPhone"] = st.text_input("Phone", value=prod.get("producerPhone", ""), key=f"producerPhone_{idx}")
 
-                # Add a separator between responsible persons
-                st.markdown("---")
-            if st.button("Add Responsible Person", key="add_rp"):
-                st.session_state.responsible_persons.append({
-                    "personName": "",
-                    "description": "",
-                    "role": "",
-                    "mainSigner": False,
-                    "cryptElectronicSeal": False,
-                    "cryptElectronicSignature": False,
-                    "cryptElectronicTimeStamp": False
-                })
-                st.rerun()
+                        # Address info in a more compact layout
+                        with col2:
+                            addr_cols = st.columns([3, 1])
+                            with addr_cols[0]:
+                                prod["producerStreet"] = st.text_input("Street", value=prod.get("producerStreet", ""), key=f"producerStreet_{idx}")
+                        with addr_cols[1]:
+                            prod["producerStreetNo"] = st.text_input("No.", value=prod.get("producerStreetNo", ""), key=f"producerStreetNo_{idx}")
+
+                            city_cols = st.columns([1, 2, 1])
+                            with city_cols[0]:
+                                prod["producerPostCode"] = st.text_input("Post Code", value=prod.get("producerPostCode", ""), key=f"producerPostCode_{idx}")
+                            with city_cols[1]:
+                                prod["producerCity"] = st.text_input("City", value=prod.get("producerCity", ""), key=f"producerCity_{idx}")
+                            with city_cols[2]:
+                                prod["producerCountryCode"] = st.text_input("Country", value=prod.get("producerCountryCode", ""), key=f"producerCountryCode_{idx}")
+                            prod["producerFax"] = st.text_input("Fax", value=prod.get("producerFax", ""), key=f"producerFax_{idx}")
+
+                        st.markdown("#### Organization Identifiers")
+                        if not prod.get("organizationIdentifiers"):
+                            prod["organizationIdentifiers"] = [INIT_ID.copy()]
+                        for oid_idx, oid in enumerate(prod["organizationIdentifiers"]):
+                            cols_id = st.columns([2,3,4,1])
+                            oid["scheme"] = cols_id[0].text_input("Scheme", oid.get("scheme", ""), key=f"org_scheme_{idx}_{oid_idx}")
+                            oid["value"] = cols_id[1].text_input("Value", oid.get("value", ""), key=f"org_value_{idx}_{oid_idx}")
+                            oid["link"] = cols_id[2].text_input("Link", oid.get("link", ""), key=f"org_link_{idx}_{oid_idx}")
+                            identifier_hints(cols_id, ORG_ID_PATH, oid)
+                            if cols_id[3].button("🗑️", key=f"del_org_{idx}_{oid_idx}") and len(prod["organizationIdentifiers"])>1:
+                                prod["organizationIdentifiers"].pop(oid_idx); st.rerun()
+                        if st.button("➕ Add Identifier", key=f"add_org_{idx}"):
+                            prod["organizationIdentifiers"].append(INIT_ID.copy()); st.rerun()
+                        identifier_index().set_identifiers(("producer", idx), prod["organizationIdentifiers"])
+
+                        # if st.button("Remove", key=f"remove_prod_{idx}"):
+                        #     st.session_state.producers.pop(idx)
+                        #     st.rerun()
+
+                    # Add a separator between producers
+
+                # if st.button("Add Producer", key="add_prod"):
+                #     st.session_state.producers.append({
+                #         "producerName": "",
+                #         "producerStreet": "",
+                #         "producerStreetNo": "",
+                #         "producerPostCode": "",
+                #         "producerCity": "",
+                #         "producerCountryCode": "",
+                #         "producerPhone": "",
+                #         "producerFax": "",
+                #         "producerEmail": ""
+                #     })
+                #     st.rerun()
+            st.markdown("---")
+
+            with st.container():
+                for idx, rp in enumerate(st.session_state.responsible_persons):
+                    # Use a container with a header instead of an expander
+                    st.markdown(f"###### Responsible Person {idx+1}")
+                    with st.container():
+                        cols = st.columns([2, 2, 2])
+                        with cols[0]:
+                            rp["personName"] = st.text_input("Name", value=rp.get("personName", ""), key=f"rp_name_{idx}")
+                            rp["role"] = st.text_input("Role", value=rp.get("role", ""), key=f"rp_role_{idx}")
+                        with cols[1]:
+                            rp["description"] = st.text_area("Description", value=rp.get("description", ""), height=100, key=f"rp_desc_{idx}")
+                        with cols[2]:
+                            rp["mainSigner"] = st.checkbox("Main Signer", value=rp.get("mainSigner", False), key=f"rp_mainSigner_{idx}")
+                            rp["cryptElectronicSeal"] = st.checkbox("Electronic Seal", value=rp.get("cryptElectronicSeal", False), key=f"rp_cryptSeal_{idx}")
+                            rp["cryptElectronicSignature"] = st.checkbox("Electronic Signature", value=rp.get("cryptElectronicSignature", False), key=f"rp_cryptSig_{idx}")
+                            rp["cryptElectronicTimeStamp"] = st.checkbox("Electronic TimeStamp", value=rp.get("cryptElectronicTimeStamp", False), key=f"rp_cryptTS_{idx}")
+                        if st.button(f"Remove", key=f"remove_rp_{idx}"):
+                            st.session_state.responsible_persons.pop(idx)
+                            st.rerun()
+
+                    # Add a separator between responsible persons
+                    st.markdown("---")
+                if st.button("Add Responsible Person", key="add_rp"):
+                    st.session_state.responsible_persons.append({
+                        "personName": "",
+                        "description": "",
+                        "role": "",
+                        "mainSigner": False,
+                        "cryptElectronicSeal": False,
+                        "cryptElectronicSignature": False,
+                        "cryptElectronicTimeStamp": False
+                    })
+                    st.rerun()
 # -----------------------------------------------------------------------------
 # TAB 1 – Materials (unchanged from rev2)
 # -----------------------------------------------------------------------------
-with tabs[1]:
-    # same content as rev2 for Materials
-    for i, mat in enumerate(st.session_state.materials):
-        with st.expander(f"Material {i+1}", expanded=True):
-            c1, c2 = st.columns(2)
-            with c1:
-                mat["name"] = st.text_input("Material Name", mat["name"], key=f"mat_name_{mat['uuid']}")
-                mat["materialClass"] = st.text_input("Material Class", mat["materialClass"], key=f"mat_class_{mat['uuid']}")
-                mat["itemQuantities"] = st.text_input("Item Quantities", mat["itemQuantities"], key=f"mat_iq_{mat['uuid']}")
-            with c2:
-                mat["description"] = st.text_area("Description", mat["description"], key=f"mat_desc_{mat['uuid']}")
-                mat["minimumSampleSize"] = st.text_input("Minimum Sample Size", mat["minimumSampleSize"], key=f"mat_min_{mat['uuid']}")
-                mat["isCertified"] = st.checkbox("Certified", mat["isCertified"], key=f"mat_cert_{mat['uuid']}")
-
-            st.markdown("#### Material Identifiers")
-            if not mat.get("materialIdentifiers"):
-                mat["materialIdentifiers"] = [INIT_ID.copy()]
-            for midx, mid in enumerate(mat["materialIdentifiers"]):
-                cols_id = st.columns([2,3,4,1])
-                mid["scheme"] = cols_id[0].text_input("Scheme", mid.get("scheme", ""), key=f"mat_scheme_{mat['uuid']}_{midx}")
-                mid["value"] = cols_id[1].text_input("Value", mid.get("value", ""), key=f"mat_value_{mat['uuid']}_{midx}")
-                mid["link"] = cols_id[2].text_input("Link", mid.get("link", ""), key=f"mat_link_{mat['uuid']}_{midx}")
-                if cols_id[3].button("🗑️", key=f"del_mat_id_{mat['uuid']}_{midx}") and len(mat["materialIdentifiers"])>1:
-                    mat["materialIdentifiers"].pop(midx); st.rerun()
-            if st.button("➕ Add Identifier", key=f"add_mat_id_{mat['uuid']}"):
-                mat["materialIdentifiers"].append(INIT_ID.copy()); st.rerun()
-
-            if st.button("Remove Material", key=f"rm_mat_{mat['uuid']}", disabled=len(st.session_state.materials)==1):
-                st.session_state.materials.pop(i); st.rerun()
-
-    if st.button("➕ Add Material", key="add_material"):
-        st.session_state.materials.append({
-            "uuid": str(uuid.uuid4()), "name": "", "description": "", "materialClass": "",
-            "minimumSampleSize": "", "itemQuantities": "", "isCertified": False,
-            "materialIdentifiers": [INIT_ID.copy()],
-        }); st.rerun()
+if "Materials" in sections:
+    with sections["Materials"], profile_block("Materials"):
+        # same content as rev2 for Materials
+        for i, mat in enumerate(st.session_state.materials):
+            with st.expander(f"Material {i+1}", expanded=True):
+                c1, c2 = st.columns(2)
+                with c1:
+                    mat["name"] = st.text_input("Material Name", mat["name"], key=f"mat_name_{mat['uuid']}")
+                    field_hint("materials/material/name", mat["name"])
+                    mat["materialClass"] = st.text_input("Material Class", mat["materialClass"], key=f"mat_class_{mat['uuid']}")
+                    mat["itemQuantities"] = st.text_input("Item Quantities", mat["itemQuantities"], key=f"mat_iq_{mat['uuid']}")
+                with c2:
+                    mat["description"] = st.text_area("Description", mat["description"], key=f"mat_desc_{mat['uuid']}")
+                    mat["minimumSampleSize"] = st.text_input("Minimum Sample Size", mat["minimumSampleSize"], key=f"mat_min_{mat['uuid']}")
+                    mat["isCertified"] = st.checkbox("Certified", mat["isCertified"], key=f"mat_cert_{mat['uuid']}")
+
+                st.markdown("#### Material Identifiers")
+                if not mat.get("materialIdentifiers"):
+                    mat["materialIdentifiers"] = [INIT_ID.copy()]
+                for midx, mid in enumerate(mat["materialIdentifiers"]):
+                    cols_id = st.columns([2,3,4,1])
+                    mid["scheme"] = cols_id[0].text_input("Scheme", mid.get("scheme", ""), key=f"mat_scheme_{mat['uuid']}_{midx}")
+                    mid["value"] = cols_id[1].text_input("Value", mid.get("value", ""), key=f"mat_value_{mat['uuid']}_{midx}")
+                    mid["link"] = cols_id[2].text_input("Link", mid.get("link", ""), key=f"mat_link_{mat['uuid']}_{midx}")
+                    identifier_hints(cols_id, MAT_ID_PATH, mid)
+                    if cols_id[3].button("🗑️", key=f"del_mat_id_{mat['uuid']}_{midx}") and len(mat["materialIdentifiers"])>1:
+                        mat["materialIdentifiers"].pop(midx); st.rerun()
+                if st.button("➕ Add Identifier", key=f"add_mat_id_{mat['uuid']}"):
+                    mat["materialIdentifiers"].append(INIT_ID.copy()); st.rerun()
+                identifier_index().set_identifiers(("material", mat["uuid"]), mat["materialIdentifiers"])
+
+                if st.button("Remove Material", key=f"rm_mat_{mat['uuid']}", disabled=len(st.session_state.materials)==1):
+                    st.session_state.materials.pop(i); st.session_state.pop("identifier_index", None); st.rerun()
+
+        if st.button("➕ Add Material", key="add_material"):
+            st.session_state.materials.append({
+                "uuid": str(uuid.uuid4()), "name": "", "description": "", "materialClass": "",
+                "minimumSampleSize": "", "itemQuantities": "", "isCertified": False,
+                "materialIdentifiers": [INIT_ID.copy()],
+            }); st.rerun()
 
 # -----------------------------------------------------------------------------
 # --- TAB 2 – Properties starts below (placeholder) ---
 # -----------------------------------------------------------------------------
 
 # --- Tab 2: Materials Properties (Editable Material Properties Tables) ---
-with tabs[2]:
+if "Properties" in sections:
+    with sections["Properties"], profile_block("Properties"):
 
-    col_left,  = st.columns([1])
+        col_left,  = st.columns([1])
 
-    with col_left:
-        # material_scroll = st.container(height=1000)
-        # with material_scroll:
+        with col_left:
+            # material_scroll = st.container(height=1000)
+            # with material_scroll:
 
-        #     st.subheader("Properties")
+            #     st.subheader("Properties")
 
 
-            # Loop over each materialProperties entry.
-            for idx, mp in enumerate(st.session_state.materialProperties):
-                # Ensure each entry has a UUID.
-                mp_uuid = mp.get("uuid", str(uuid.uuid4()))
-                mp["uuid"] = mp_uuid
-                with st.expander(f"Properties Set {idx+1}", expanded=True):
-                    # Main Material Properties data (single form)
-                    with st.form(key=f"mp_main_form_{mp_uuid}"):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            mp["id"] = st.text_input("ID (optional)", value=mp.get("id", ""), key=f"mp_id_{mp_uuid}")
-                            mp["name"] = st.text_input("Name", value=mp.get("name", ""), key=f"mp_name_{mp_uuid}")
-                            mp["isCertified"] = st.checkbox("Certified", value=mp.get("isCertified", False), key=f"mp_certified_{mp_uuid}")
-                        with col2:
-                            mp["description"] = st.text_area("Description", value=mp.get("description", ""), key=f"mp_desc_{mp_uuid}")
-                            mp["procedures"] = st.text_area("Procedures", value=mp.get("procedures", ""), key=f"mp_proc_{mp_uuid}")
-
-                        submitted_mp = st.form_submit_button("Save Properties Set")
-                        if submitted_mp:
-                            st.success(f"Properties Set {idx+1} updated!")
+                # Loop over each materialProperties entry.
+                for idx, mp in enumerate(st.session_state.materialProperties):
+                    # Ensure each entry has a UUID.
+                    mp_uuid = mp.get("uuid", str(uuid.uuid4()))
+                    mp["uuid"] = mp_uuid
+                    with st.expander(f"Properties Set {idx+1}", expanded=True):
+                        # Main Material Properties data (single form)
+                        with st.form(key=f"mp_main_form_{mp_uuid}"):
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                mp["id"] = st.text_input("ID (optional)", value=mp.get("id", ""), key=f"mp_id_{mp_uuid}")
+                                mp["name"] = st.text_input("Name", value=mp.get("name", ""), key=f"mp_name_{mp_uuid}")
+                                mp["isCertified"] = st.checkbox("Certified", value=mp.get("isCertified", False), key=f"mp_certified_{mp_uuid}")
+                            with col2:
+                                mp["description"] = st.text_area("Description", value=mp.get("description", ""), key=f"mp_desc_{mp_uuid}")
+                                mp["procedures"] = st.text_area("Procedures", value=mp.get("procedures", ""), key=f"mp_proc_{mp_uuid}")
 
-                    # For each measurement result (non-nested forms)
-                    for res_idx, result in enumerate(mp.get("results", [])):
+                            submitted_mp = st.form_submit_button("Save Properties Set")
+                            if submitted_mp:
+                                st.success(f"Properties Set {idx+1} updated!")
+                        identifier_index().set_element(("propertySet", mp_uuid), mp)
 
-                        col1, col2,  = st.columns([5, 2])
-                        with col1:
-                            st.markdown(f"Table {res_idx+1}")
-                        with col2:
-                            if st.button("Remove Table", disabled=len(mp["results"])==1, key=f"remove_res_{mp_uuid}_{res_idx}"):
-                                mp["results"].pop(res_idx)
-                                st.rerun()
+                        # For each measurement result (non-nested forms)
+                        for res_idx, result in enumerate(mp.get("results", [])):
 
-                        with st.form(key=f"res_form_{mp_uuid}_{res_idx}"):
-                            result["result_name"] = st.text_input("Name", value=result.get("result_name", ""), key=f"res_name_{mp_uuid}_{res_idx}")
-                            result["description"] = st.text_area("Description", value=result.get("description", ""), key=f"res_desc_{mp_uuid}_{res_idx}")
-                            if "identifiers" not in result:
-                                result["identifiers"] = [ [] for _ in range(len(result.get("quantities", pd.DataFrame()))) ]
-                            result["quantities"] = st.data_editor(
-                                result.get("quantities", pd.DataFrame(columns=[
-                                    "Name", "Label", "Value", "Quantity Kind", "Unit",
-                                    "Uncertainty", "Coverage Factor", "Coverage Probability", "Distribution", "Identifier"
-                                ])),
-                                num_rows="dynamic",
-                                disabled=["Identifier"],
-                                key=f"quantities_{mp_uuid}_{res_idx}"
-                            )
-                            # Sync identifier rows with dataframe length
-                            qlen = len(result["quantities"])
-                            if len(result["identifiers"]) < qlen:
-                                result["identifiers"] += [[ ] for _ in range(qlen - len(result["identifiers"]))]
-                            elif len(result["identifiers"]) > qlen:
-                                result["identifiers"] = result["identifiers"][:qlen]
-
-                            sel = st.number_input("Row #", min_value=0, max_value=max(0, qlen-1), key=f"row_sel_{mp_uuid}_{res_idx}", step=1)
-                            current_ids = result["identifiers"][sel]
-                            for pid_idx, pid in enumerate(current_ids):
-                                cols_id = st.columns([2,3,4,1])
-                                pid["scheme"] = cols_id[0].text_input("Scheme", pid.get("scheme", ""), key=f"prop_scheme_{mp_uuid}_{res_idx}_{pid_idx}")
-                                pid["value"] = cols_id[1].text_input("Value", pid.get("value", ""), key=f"prop_value_{mp_uuid}_{res_idx}_{pid_idx}")
-                                pid["link"] = cols_id[2].text_input("Link", pid.get("link", ""), key=f"prop_link_{mp_uuid}_{res_idx}_{pid_idx}")
-                                if cols_id[3].button("🗑️", key=f"del_prop_{mp_uuid}_{res_idx}_{pid_idx}") and len(current_ids)>1:
-                                    current_ids.pop(pid_idx); st.rerun()
-                            if st.button("➕ Add Identifier", key=f"add_prop_{mp_uuid}_{res_idx}"):
-                                current_ids.append(INIT_ID.copy()); st.rerun()
-                            result["identifiers"][sel] = current_ids
-                            result["quantities"].loc[sel, "Identifier"] = current_ids[0]["value"] if current_ids else ""
-
-                            # Default uncertainty controls in one line under the table
-                            st.markdown("**Default Uncertainty Values:**")
-                            col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
+                            col1, col2,  = st.columns([5, 2])
                             with col1:
-                                local_coverage_factor = st.number_input("Coverage Factor", min_value=1.0, max_value=10.0, value=2.0, step=0.1, key=f"local_cf_{mp_uuid}_{res_idx}")
+                                st.markdown(f"Table {res_idx+1}")
                             with col2:
-                                local_coverage_probability = st.number_input("Probability", min_value=0.0, max_value=1.0, value=0.95, step=0.01, key=f"local_cp_{mp_uuid}_{res_idx}")
-                            with col3:
-                                local_distribution = st.selectbox("Distribution", ["normal", "log-normal", "uniform"], index=0, key=f"local_dist_{mp_uuid}_{res_idx}")
-                            with col4:
-                                # Button to apply default uncertainty values to all rows
-                                if st.form_submit_button("Apply to All Rows"):
-                                    # Apply the local values to all rows in the current table
-                                    if not result["quantities"].empty:
-                                        result["quantities"]["Coverage Factor"] = local_coverage_factor
-                                        result["quantities"]["Coverage Probability"] = local_coverage_probability
-                                        result["quantities"]["Distribution"] = local_distribution
+                                if st.button("Remove Table", disabled=len(mp["results"])==1, key=f"remove_res_{mp_uuid}_{res_idx}"):
+                                    mp["results"].pop(res_idx)
+                                    st.session_state.pop("identifier_index", None)
                                     st.rerun()
 
+                            with st.container(border=True):
+                                result["result_name"] = st.text_input("Name", value=result.get("result_name", ""), key=f"res_name_{mp_uuid}_{res_idx}")
+                                result["description"] = st.text_area("Description", value=result.get("description", ""), key=f"res_desc_{mp_uuid}_{res_idx}")
+                                if "identifiers" not in result:
+                                    result["identifiers"] = [ [] for _ in range(len(result.get("quantities", pd.DataFrame()))) ]
+                                result["quantities"] = st.data_editor(
+                                    result.get("quantities", pd.DataFrame(columns=[
+                                        "Name", "Label", "Value", "Quantity Kind", "Unit",
+                                        "Uncertainty", "Coverage Factor", "Coverage Probability", "Distribution", "Identifier"
+                                    ])),
+                                    num_rows="dynamic",
+                                    disabled=["Identifier"],
+                                    key=f"quantities_{mp_uuid}_{res_idx}"
+                                )
+                                # Sync identifier rows with dataframe length
+                                qlen = len(result["quantities"])
+                                if len(result["identifiers"]) < qlen:
+                                    result["identifiers"] += [[ ] for _ in range(qlen - len(result["identifiers"]))]
+                                elif len(result["identifiers"]) > qlen:
+                                    for row in range(qlen, len(result["identifiers"])):
+                                        identifier_index().drop(("property", mp_uuid, res_idx, row))
+                                    result["identifiers"] = result["identifiers"][:qlen]
+
+                                sel = st.number_input("Row #", min_value=0, max_value=max(0, qlen-1), key=f"row_sel_{mp_uuid}_{res_idx}", step=1)
+                                current_ids = result["identifiers"][sel] if qlen else []
+                                for pid_idx, pid in enumerate(current_ids):
+                                    cols_id = st.columns([2,3,4,1])
+                                    pid["scheme"] = cols_id[0].text_input("Scheme", pid.get("scheme", ""), key=f"prop_scheme_{mp_uuid}_{res_idx}_{pid_idx}")
+                                    pid["value"] = cols_id[1].text_input("Value", pid.get("value", ""), key=f"prop_value_{mp_uuid}_{res_idx}_{pid_idx}")
+                                    pid["link"] = cols_id[2].text_input("Link", pid.get("link", ""), key=f"prop_link_{mp_uuid}_{res_idx}_{pid_idx}")
+                                    identifier_hints(cols_id, PROP_ID_PATH, pid)
+                                    if cols_id[3].button("🗑️", key=f"del_prop_{mp_uuid}_{res_idx}_{pid_idx}") and len(current_ids)>1:
+                                        current_ids.pop(pid_idx); st.rerun()
+                                if st.button("➕ Add Identifier", key=f"add_prop_{mp_uuid}_{res_idx}", disabled=not qlen):
+                                    current_ids.append(INIT_ID.copy()); st.rerun()
+                                if qlen:
+                                    result["identifiers"][sel] = current_ids
+                                    identifier_index().set_identifiers(("property", mp_uuid, res_idx, sel), current_ids)
+                                    result["quantities"]["Identifier"] = result["quantities"]["Identifier"].astype(object)
+                                    result["quantities"].loc[sel, "Identifier"] = current_ids[0]["value"] if current_ids else ""
+
+                                # Default uncertainty controls in one line under the table
+                                st.markdown("**Default Uncertainty Values:**")
+                                col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
+                                with col1:
+                                    local_coverage_factor = st.number_input("Coverage Factor", min_value=1.0, max_value=10.0, value=2.0, step=0.1, key=f"local_cf_{mp_uuid}_{res_idx}")
+                                with col2:
+                                    local_coverage_probability = st.number_input("Probability", min_value=0.0, max_value=1.0, value=0.95, step=0.01, key=f"local_cp_{mp_uuid}_{res_idx}")
+                                with col3:
+                                    local_distribution = st.selectbox("Distribution", ["normal", "log-normal", "uniform"], index=0, key=f"local_dist_{mp_uuid}_{res_idx}")
+                                with col4:
+                                    # Button to apply default uncertainty values to all rows
+                                    if st.button("Apply to All Rows", key=f"apply_defaults_{mp_uuid}_{res_idx}"):
+                                        # Apply the local values to all rows in the current table
+                                        if not result["quantities"].empty:
+                                            result["quantities"]["Coverage Factor"] = local_coverage_factor
+                                            result["quantities"]["Coverage Probability"] = local_coverage_probability
+                                            result["quantities"]["Distribution"] = local_distribution
+                                        st.rerun()
+
+                                # Expanded uncertainty from the standard uncertainty, in one pass over the table
+                                col1, col2, col3 = st.columns([2, 3, 3])
+                                with col1:
+                                    local_dof = st.number_input("Degrees of Freedom", min_value=0.0, value=0.0, step=1.0, key=f"local_dof_{mp_uuid}_{res_idx}",
+                                                                help="Effective degrees of freedom of the standard uncertainty; 0 means infinite (normal distribution). A \"Degrees of Freedom\" column overrides it per row.")
+                                with col2:
+                                    derive_from = st.radio("Derive", ["Factor from probability", "Probability from factor"], horizontal=True, key=f"derive_from_{mp_uuid}_{res_idx}")
+                                with col3:
+                                    if st.button("Compute Expanded Uncertainty", key=f"expand_mu_{mp_uuid}_{res_idx}",
+                                                 help="Sets Coverage Factor, Coverage Probability and Uncertainty = k·u for every row, using the defaults above. The standard uncertainty u is taken from a \"Standard Uncertainty\" column, or from the current Uncertainty / Coverage Factor."):
+                                        if not result["quantities"].empty:
+                                            by_factor = derive_from == "Probability from factor"
+                                            result["quantities"] = expand_uncertainty(
+                                                result["quantities"].copy(),
+                                                probability=None if by_factor else local_coverage_probability,
+                                                factor=local_coverage_factor if by_factor else None,
+                                                dof=local_dof or None,
+                                                distribution=local_distribution,
+                                            )
+                                        st.rerun()
+                                undetermined = int(undetermined_rows(result["quantities"]).sum())
+                                if undetermined:
+                                    st.caption(f"⚠️ {undetermined} row(s) have no standard uncertainty and no coverage factor to derive it from; "
+                                               "Compute Expanded Uncertainty leaves them unchanged.")
+                                findings = get_rules().check_table(result["quantities"], mp.get("isCertified", False))
+                                if len(findings):
+                                    with st.expander(f"⚠️ {findings['row'].nunique()} row(s) break business rules"):
+                                        st.dataframe(findings[["row", "severity", "message", "rule"]].rename(columns={"row": "Row #"}),
+                                                     hide_index=True, use_container_width=True)
+
+                                with st.popover("Certify from Replicate Data"):
+                                    replicates = st.file_uploader("Replicate data (CSV or Parquet)", type=["csv", "parquet"], key=f"replicates_{mp_uuid}_{res_idx}",
+                                                                  help="One row per measurement with columns analyte, bottle, value and optionally unit, study (homogeneity, characterization or stability) and time.")
+                                    shelf_life = st.number_input("Shelf Life", min_value=0.0, value=0.0, step=1.0, key=f"shelf_life_{mp_uuid}_{res_idx}",
+                                                                 help="In the unit of the time column; 0 leaves out long-term stability.")
+                                    if replicates is not None:
+                                        try:
+                                            budget = certify_replicates(replicates.getvalue(), replicates.name, shelf_life, local_coverage_probability)
+                                        except Exception as e:
+                                            st.error(f"Could not evaluate replicate data: {e}")
+                                        else:
+                                            st.dataframe(budget, hide_index=True)
+                                            if st.button("Replace Table with Certified Values", key=f"certify_{mp_uuid}_{res_idx}"):
+                                                result["quantities"] = to_quantities(budget, local_coverage_probability)
+                                                result["identifiers"] = [[] for _ in range(len(budget))]
+                                                st.session_state.pop("identifier_index", None)
+                                                st.rerun()
+
+
+                        # Button to add a new measurement result.
 
-                    # Button to add a new measurement result.
-
-                    col1, col2 = st.columns(2)
+                        col1, col2 = st.columns(2)
 
-                    with col1:
-                        if st.button("Add Table", key=f"add_result_{mp_uuid}"):
-                            mp.setdefault("results", []).append(create_empty_result())
-                            st.rerun()
-                    with col2:
-                        if st.button("Remove Properties Set", key=f"remove_mp_{mp_uuid}"):
-                            st.session_state.materialProperties.pop(idx)
-                            st.rerun()
-            # Button to add a new material properties entry.
-            if st.button("Add Properties Set"):
-                st.session_state.materialProperties.append(create_empty_materialProperties())
-                st.rerun()
+                        with col1:
+                            if st.button("Add Table", key=f"add_result_{mp_uuid}"):
+                                mp.setdefault("results", []).append(create_empty_result())
+                                st.rerun()
+                        with col2:
+                            if st.button("Remove Properties Set", key=f"remove_mp_{mp_uuid}"):
+                                st.session_state.materialProperties.pop(idx)
+                                st.session_state.pop("identifier_index", None)
+                                st.rerun()
+                # Button to add a new material properties entry.
+                if st.button("Add Properties Set"):
+                    st.session_state.materialProperties.append(create_empty_materialProperties())
+                    st.rerun()
 
     # with col_right:
     #     # Commented out quantity selection and QUDT selection
@@ -981,17 +1150,6 @@ def add_if_valid(parent, tag, value, ns):
     elem.text = str(value).strip()
     return elem
 
-def export_identifier_list(parent, tag, id_list, ns_drmd):
-    outer = ET.SubElement(parent, f"{{{ns_drmd}}}{tag}")
-    singular = tag[:-1] if tag.endswith('s') else tag
-    for ident in id_list:
-        ident_elem = ET.SubElement(outer, f"{{{ns_drmd}}}{singular}")
-        ET.SubElement(ident_elem, f"{{{ns_drmd}}}scheme").text = ident.get("scheme", "")
-        ET.SubElement(ident_elem, f"{{{ns_drmd}}}value").text = ident.get("value", "")
-        if ident.get("link", "").strip():
-            ET.SubElement(ident_elem, f"{{{ns_drmd}}}link").text = ident.get("link", "")
-    return outer
-
 # def export_materialProperties(ns_drmd, ns_dcc, ns_si):
 #     # Create the wrapping element for materialPropertiesList.
 #     mp_list_elem = ET.Element(f"{{{ns_drmd}}}materialPropertiesList")
@@ -1049,266 +1207,198 @@ def export_identifier_list(parent, tag, id_list, ns_drmd):
 
 import math
 
-def export_materialProperties(ns_drmd, ns_dcc, ns_si):
-    # Create the wrapping element for materialPropertiesList.
-    mp_list_elem = ET.Element(f"{{{ns_drmd}}}materialPropertiesList")
-    for mp in st.session_state.materialProperties:
-        mp_elem = ET.SubElement(mp_list_elem, f"{{{ns_drmd}}}materialProperties", attrib={
-            "isCertified": "true" if mp.get("isCertified", False) else "false"
-        })
-        if mp.get("id", "").strip():
-            mp_elem.set("id", mp.get("id").strip())
-        # Required: name
-        name_elem = ET.SubElement(mp_elem, f"{{{ns_drmd}}}name")
-        ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = mp.get("name", "")
-        # Optional: description
-        if mp.get("description", "").strip():
-            desc_elem = ET.SubElement(mp_elem, f"{{{ns_drmd}}}description")
-            ET.SubElement(desc_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = mp.get("description", "")
-        # Optional: procedures
-        if mp.get("procedures", "").strip():
-            proc_elem = ET.SubElement(mp_elem, f"{{{ns_drmd}}}procedures")
-            ET.SubElement(proc_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = mp.get("procedures", "")
-        # Required: results
-        results_elem = ET.SubElement(mp_elem, f"{{{ns_drmd}}}results")
-        for res in mp.get("results", []):
-            res_elem = ET.SubElement(results_elem, f"{{{ns_dcc}}}result")
-            res_name_elem = ET.SubElement(res_elem, f"{{{ns_dcc}}}name")
-            ET.SubElement(res_name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = res.get("result_name", "")
-            if res.get("description", "").strip():
-                res_desc_elem = ET.SubElement(res_elem, f"{{{ns_dcc}}}description")
-                ET.SubElement(res_desc_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = res.get("description", "")
-            data_elem = ET.SubElement(res_elem, f"{{{ns_dcc}}}data")
-            list_elem = ET.SubElement(data_elem, f"{{{ns_dcc}}}list")
-            for q_idx, row in res.get("quantities", pd.DataFrame()).iterrows():
-                q_wrap = ET.SubElement(list_elem, f"{{{ns_drmd}}}quantity")
-                quantity_elem = ET.SubElement(q_wrap, f"{{{ns_dcc}}}quantity", attrib={"refType": "basic_measuredValue"})
-                qname_elem = ET.SubElement(quantity_elem, f"{{{ns_dcc}}}name")
-                ET.SubElement(qname_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = str(row.get("Name", ""))
-                real_elem = ET.SubElement(quantity_elem, f"{{{ns_si}}}real")
-                ET.SubElement(real_elem, f"{{{ns_si}}}value").text = str(row.get("Value", ""))
-                ET.SubElement(real_elem, f"{{{ns_si}}}unit").text = str(row.get("Unit", ""))
-
-                # Check uncertainty values.
-                expandedMU_vals = {}
-                for subtag, col in [("valueExpandedMU", "Uncertainty"),
-                                    ("coverageFactor", "Coverage Factor"),
-                                    ("coverageProbability", "Coverage Probability"),
-                                    ("distribution", "Distribution")]:
-                    val = row.get(col, "")
-                    if val is None or (isinstance(val, float) and math.isnan(val)) or str(val).strip() == "":
-                        continue
-                    expandedMU_vals[subtag] = val
-                # Only create the measurementUncertaintyUnivariate element if there is valid data.
-                if expandedMU_vals:
-                    mu_elem = ET.SubElement(real_elem, f"{{{ns_si}}}measurementUncertaintyUnivariate")
-                    expMU_elem = ET.SubElement(mu_elem, f"{{{ns_si}}}expandedMU")
-                    for tag, value in expandedMU_vals.items():
-                        ET.SubElement(expMU_elem, f"{{{ns_si}}}{tag}").text = str(value)
-                if res.get("identifiers") and q_idx < len(res["identifiers"]):
-                    export_identifier_list(q_wrap, "propertyIdentifiers", res["identifiers"][q_idx], ns_drmd)
-    return mp_list_elem
-
-
-with tabs[3]:
-
-    # Official Statements (using dcc:richContentType structure)
-    with st.expander("ISO 17034 Statements", expanded=True):
-
-        # Intended Use
-        content_val = st.text_area("Intended Use", value=st.session_state.official_statements.get("intendedUse", {}).get("content", ""), key="official_content_intendedUse")
-        st.session_state.official_statements["intendedUse"] = {"name": "Intended Use", "content": content_val}
-
-        # Commutability
-        content_val = st.text_area("Commutability", value=st.session_state.official_statements.get("commutability", {}).get("content", ""), key="official_content_commutability")
-        st.session_state.official_statements["commutability"] = {"name": "Commutability", "content": content_val}
-
-        # Storage Information
-        content_val = st.text_area("Storage Information", value=st.session_state.official_statements.get("storageInformation", {}).get("content", ""), key="official_content_storageInformation")
-        st.session_state.official_statements["storageInformation"] = {"name": "Storage Information", "content": content_val}
-
-        # Instructions For Handling And Use
-        content_val = st.text_area("Instructions For Handling And Use", value=st.session_state.official_statements.get("instructionsForHandlingAndUse", {}).get("content", ""), key="official_content_instructionsForHandlingAndUse")
-        st.session_state.official_statements["instructionsForHandlingAndUse"] = {"name": "Instructions For Handling And Use", "content": content_val}
-
-        # Metrological Traceability
-        content_val = st.text_area("Metrological Traceability", value=st.session_state.official_statements.get("metrologicalTraceability", {}).get("content", ""), key="official_content_metrologicalTraceability")
-        st.session_state.official_statements["metrologicalTraceability"] = {"name": "Metrological Traceability", "content": content_val}
-
-        # Health And Safety Information
-        content_val = st.text_area("Health And Safety Information", value=st.session_state.official_statements.get("healthAndSafetyInformation", {}).get("content", ""), key="official_content_healthAndSafetyInformation")
-        st.session_state.official_statements["healthAndSafetyInformation"] = {"name": "Health And Safety Information", "content": content_val}
-
-        # Subcontractors
-        content_val = st.text_area("Subcontractors", value=st.session_state.official_statements.get("subcontractors", {}).get("content", ""), key="official_content_subcontractors")
-        st.session_state.official_statements["subcontractors"] = {"name": "Subcontractors", "content": content_val}
-
-        # Legal Notice
-        content_val = st.text_area("Legal Notice", value=st.session_state.official_statements.get("legalNotice", {}).get("content", ""), key="official_content_legalNotice")
-        st.session_state.official_statements["legalNotice"] = {"name": "Legal Notice", "content": content_val}
-
-        # Reference To Certification Report
-        content_val = st.text_area("Reference To Certification Report", value=st.session_state.official_statements.get("referenceToCertificationReport", {}).get("content", ""), key="official_content_referenceToCertificationReport")
-        st.session_state.official_statements["referenceToCertificationReport"] = {"name": "Reference To Certification Report", "content": content_val}
-
-    # Custom Statements (all exported as <drmd:statement>)
-    with st.expander("Other Statements", expanded=True):
-        for idx, cs in enumerate(st.session_state.custom_statements):
-            with st.container():
-                # We ignore any custom tag; the export will use <drmd:statement>
-                cs_name = st.text_input(f" Statement {idx+1} - Name", value=cs.get("name", "").strip(), key=f"cs_name_{idx}")
-                cs_content = st.text_area(f" Statement {idx+1} - Content", value=cs.get("content", "").strip(), key=f"cs_content_{idx}")
-                st.session_state.custom_statements[idx] = {"name": cs_name, "content": cs_content}
-                if st.button(f"Remove", key=f"remove_cs_{idx}"):
-                    st.session_state.custom_statements.pop(idx)
-                    st.rerun()
-        if st.button("Add Statement", key="add_cs"):
-            st.session_state.custom_statements.append({"name": "", "content": ""})
-            st.rerun()
+if "Statements" in sections:
+    with sections["Statements"], profile_block("Statements"):
+
+        # Official Statements (using dcc:richContentType structure)
+        with st.expander("ISO 17034 Statements", expanded=True):
+
+            # Intended Use
+            content_val = st.text_area("Intended Use", value=st.session_state.official_statements.get("intendedUse", {}).get("content", ""), key="official_content_intendedUse")
+            st.session_state.official_statements["intendedUse"] = {"name": "Intended Use", "content": content_val}
+            field_hint("statements/intendedUse", content_val)
+
+            # Commutability
+            content_val = st.text_area("Commutability", value=st.session_state.official_statements.get("commutability", {}).get("content", ""), key="official_content_commutability")
+            st.session_state.official_statements["commutability"] = {"name": "Commutability", "content": content_val}
+
+            # Storage Information
+            content_val = st.text_area("Storage Information", value=st.session_state.official_statements.get("storageInformation", {}).get("content", ""), key="official_content_storageInformation")
+            st.session_state.official_statements["storageInformation"] = {"name": "Storage Information", "content": content_val}
+            field_hint("statements/storageInformation", content_val)
+
+            # Instructions For Handling And Use
+            content_val = st.text_area("Instructions For Handling And Use", value=st.session_state.official_statements.get("instructionsForHandlingAndUse", {}).get("content", ""), key="official_content_instructionsForHandlingAndUse")
+            st.session_state.official_statements["instructionsForHandlingAndUse"] = {"name": "Instructions For Handling And Use", "content": content_val}
+            field_hint("statements/instructionsForHandlingAndUse", content_val)
 
+            # Metrological Traceability
+            content_val = st.text_area("Metrological Traceability", value=st.session_state.official_statements.get("metrologicalTraceability", {}).get("content", ""), key="official_content_metrologicalTraceability")
+            st.session_state.official_statements["metrologicalTraceability"] = {"name": "Metrological Traceability", "content": content_val}
+
+            # Health And Safety Information
+            content_val = st.text_area("Health And Safety Information", value=st.session_state.official_statements.get("healthAndSafetyInformation", {}).get("content", ""), key="official_content_healthAndSafetyInformation")
+            st.session_state.official_statements["healthAndSafetyInformation"] = {"name": "Health And Safety Information", "content": content_val}
+
+            # Subcontractors
+            content_val = st.text_area("Subcontractors", value=st.session_state.official_statements.get("subcontractors", {}).get("content", ""), key="official_content_subcontractors")
+            st.session_state.official_statements["subcontractors"] = {"name": "Subcontractors", "content": content_val}
+
+            # Legal Notice
+            content_val = st.text_area("Legal Notice", value=st.session_state.official_statements.get("legalNotice", {}).get("content", ""), key="official_content_legalNotice")
+            st.session_state.official_statements["legalNotice"] = {"name": "Legal Notice", "content": content_val}
+
+            # Reference To Certification Report
+            content_val = st.text_area("Reference To Certification Report", value=st.session_state.official_statements.get("referenceToCertificationReport", {}).get("content", ""), key="official_content_referenceToCertificationReport")
+            st.session_state.official_statements["referenceToCertificationReport"] = {"name": "Reference To Certification Report", "content": content_val}
+
+        # Custom Statements (all exported as <drmd:statement>)
+        with st.expander("Other Statements", expanded=True):
+            for idx, cs in enumerate(st.session_state.custom_statements):
+                with st.container():
+                    # We ignore any custom tag; the export will use <drmd:statement>
+                    cs_name = st.text_input(f" Statement {idx+1} - Name", value=cs.get("name", "").strip(), key=f"cs_name_{idx}")
+                    cs_content = st.text_area(f" Statement {idx+1} - Content", value=cs.get("content", "").strip(), key=f"cs_content_{idx}")
+                    st.session_state.custom_statements[idx] = {"name": cs_name, "content": cs_content}
+                    if st.button(f"Remove", key=f"remove_cs_{idx}"):
+                        st.session_state.custom_statements.pop(idx)
+                        st.rerun()
+            if st.button("Add Statement", key="add_cs"):
+                st.session_state.custom_statements.append({"name": "", "content": ""})
+                st.rerun()
 
-def export_statements(ns_drmd, ns_dcc):
-    # Create the <drmd:statements> element.
-    statements_elem = ET.Element(f"{{{ns_drmd}}}statements")
-
-    def add_statement(element_name, label, text):
-        """Adds a statement element if text is not empty.
-           element_name should be one of the official ones, e.g. 'intendedUse'.
-        """
-        if text.strip():
-            stmt = ET.SubElement(statements_elem, f"{{{ns_drmd}}}{element_name}")
-            # Only add a dcc:name if a label is provided.
-            if label.strip():
-                name_elem = ET.SubElement(stmt, f"{{{ns_dcc}}}name")
-                ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = label.strip()
-            # Add one or more content elements (one per nonempty line).
-            for line in text.strip().splitlines():
-                if line.strip():
-                    ET.SubElement(stmt, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = line.strip()
-
-    official = st.session_state.official_statements
-    add_statement("intendedUse", "Intended Use", official.get("intendedUse", {}).get("content", ""))
-    add_statement("commutability", "Commutability", official.get("commutability", {}).get("content", ""))
-    add_statement("storageInformation", "Storage Information", official.get("storageInformation", {}).get("content", ""))
-    add_statement("instructionsForHandlingAndUse", "Handling Instructions", official.get("instructionsForHandlingAndUse", {}).get("content", ""))
-    add_statement("metrologicalTraceability", "Metrological Traceability", official.get("metrologicalTraceability", {}).get("content", ""))
-    add_statement("healthAndSafetyInformation", "Health and Safety Information", official.get("healthAndSafetyInformation", {}).get("content", ""))
-    add_statement("subcontractors", "Subcontractors", official.get("subcontractors", {}).get("content", ""))
-    add_statement("legalNotice", "Legal Notice", official.get("legalNotice", {}).get("content", ""))
-    add_statement("referenceToCertificationReport", "Reference to Certification Report", official.get("referenceToCertificationReport", {}).get("content", ""))
-
-    # For custom statements, always export using the element name "statement".
-    for cs in st.session_state.custom_statements:
-        if cs.get("content", "").strip():
-            cs_elem = ET.SubElement(statements_elem, f"{{{ns_drmd}}}statement")
-            if cs.get("name", "").strip():
-                name_elem = ET.SubElement(cs_elem, f"{{{ns_dcc}}}name")
-                ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = cs.get("name", "").strip()
-            for line in cs.get("content", "").strip().splitlines():
-                if line.strip():
-                    ET.SubElement(cs_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = line.strip()
-
-    return statements_elem
 
 import base64
 
 # --- Tab 4: Comments & Documents ---
-with tabs[4]:
-
-    # Single Comment (instead of multiple separate comment elements)
-    st.markdown("###### Comment")
-    comment = st.text_area("Enter your comment", value=st.session_state.get("comment", ""), key="comment")
-
-    # --- Document Upload ---
-    st.markdown("###### Upload Document")
-    # Allow only one file upload (no multiple files)
-    attachment = st.file_uploader("Attach Document", type=["pdf", "doc", "docx", "txt"], key="attachment")
-
-    # Display currently loaded embedded document (if any)
-    if st.session_state.get("embedded_files"):
-        st.subheader("Existing Document from XML")
-        # Only display the first one.
-        file = st.session_state.embedded_files[0]
-        col1, col2, col3 = st.columns([4, 2, 1])
-        col1.markdown(f"📄 **{file['name']}**")
-        col1.text(f"Type: {file['mimeType']}")
-        col2.download_button(
-            label="Download",
-            data=file["data"],
-            file_name=file["name"],
-            mime=file["mimeType"],
-            key="download_embedded"
-        )
-        if col3.button("❌ Remove", key="remove_embedded"):
-            st.session_state.embedded_files.pop(0)
-            st.rerun()
+if "Comments & Documents" in sections:
+    with sections["Comments & Documents"], profile_block("Comments & Documents"):
+
+        # Single Comment (instead of multiple separate comment elements)
+        st.markdown("###### Comment")
+        comment = st.text_area("Enter your comment", value=st.session_state.get("comment", ""), key="comment")
+
+        # --- Document Upload ---
+        st.markdown("###### Upload Documents")
+        attachments = st.file_uploader("Attach Documents", type=["pdf", "doc", "docx", "txt"],
+                                       accept_multiple_files=True, key="attachments")
+        # Move new uploads into the blob store once; identical files are stored only once.
+        blob_store = get_blob_store()
+        for uploaded_file in attachments or []:
+            if uploaded_file.file_id in st.session_state.ingested_uploads:
+                continue
+            st.session_state.ingested_uploads.add(uploaded_file.file_id)
+            digest = blob_store.put(uploaded_file.getvalue())
+            if not any(f["sha256"] == digest and f["name"] == uploaded_file.name for f in st.session_state.embedded_files):
+                st.session_state.embedded_files.append({
+                    "name": uploaded_file.name,
+                    "mimeType": uploaded_file.type or "application/octet-stream",
+                    "sha256": digest,
+                    "size": blob_store.size(digest),
+                })
 
-# --- Export Functions for Comments & Document ---
+        if st.session_state.embedded_files:
+            st.subheader("Attached Documents")
+            for fidx, file in enumerate(st.session_state.embedded_files):
+                col1, col2, col3 = st.columns([4, 2, 1])
+                col1.markdown(f"📄 **{file['name']}**")
+                col1.text(f"Type: {file['mimeType']} · {file['size']:,} bytes")
+                col2.download_button(
+                    label="Download",
+                    data=functools.partial(blob_store.get, file["sha256"]),
+                    file_name=file["name"],
+                    mime=file["mimeType"],
+                    key=f"download_embedded_{fidx}"
+                )
+                if col3.button("❌ Remove", key=f"remove_embedded_{fidx}"):
+                    st.session_state.embedded_files.pop(fidx)
+                    st.rerun()
 
-def export_comment(ns_drmd):
-    """Generate a single <comment> element if a comment is provided."""
-    comment_text = st.session_state.get("comment", "").strip()
-    if comment_text:
-        comment_elem = ET.Element(f"{{{ns_drmd}}}comment")
-        comment_elem.text = comment_text
-        return comment_elem
-    return None
+# --- Export: the tables in drmd.mapping, section by section when streaming ---
 
-def export_document(ns_drmd, ns_dcc):
-    """Generate a single <document> element from the uploaded attachment,
-       or from embedded_files if no attachment is present.
+def write_streaming_export(out):
+    """Write the document to the binary stream ``out`` one section at a time.
+       Each property set is built, written and dropped in turn; attachments are copied from the blob store in base64 chunks.
     """
-    # Prefer the attachment uploaded in the UI.
-    if st.session_state.get("attachment") is not None:
-        uploaded_file = st.session_state.attachment
-        file_content = uploaded_file.getvalue()
-        encoded_content = base64.b64encode(file_content).decode('utf-8')
-        doc_elem = ET.Element(f"{{{ns_drmd}}}document")
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}fileName").text = uploaded_file.name
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}mimeType").text = uploaded_file.type or "application/octet-stream"
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}dataBase64").text = encoded_content
-        return doc_elem
-    # Otherwise, if an embedded file exists, use the first one.
-    if st.session_state.get("embedded_files"):
-        file = st.session_state.embedded_files[0]
-        doc_elem = ET.Element(f"{{{ns_drmd}}}document")
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}fileName").text = file["name"]
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}mimeType").text = file["mimeType"]
-        ET.SubElement(doc_elem, f"{{{ns_dcc}}}dataBase64").text = base64.b64encode(file["data"]).decode('utf-8')
-        return doc_elem
-    return None
-
-    # # Process existing embedded files
-    # if "embedded_files" in st.session_state:
-    #     for file in st.session_state.embedded_files:
-    #         doc_elem = ET.Element(f"{{{ns_drmd}}}document")
-
-    #         ET.SubElement(doc_elem, f"{{{ns_dcc}}}fileName").text = file["name"]
-    #         ET.SubElement(doc_elem, f"{{{ns_dcc}}}mimeType").text = file["mimeType"]
-    #         ET.SubElement(doc_elem, f"{{{ns_dcc}}}dataBase64").text = base64.b64encode(file["data"]).decode('utf-8')
-
-    #         document_elements.append(doc_elem)
-
-    # return document_elements
+    blob_store = get_blob_store()
+    state = st.session_state
+    root_tag = f"{{{NAMESPACES['drmd']}}}digitalReferenceMaterialDocument"
+    with StreamingWriter(out, root_tag, NAMESPACES, attrib={"schemaVersion": SCHEMA_VERSION}) as writer:
+        writer.section(export_section("administrativeData", state))
+        with writer.element(f"{{{NAMESPACES['drmd']}}}materialPropertiesList"):
+            for mp in state.materialProperties:
+                writer.section(export_section("materialProperties", mp))
+        writer.section(export_section("comment", state.get("comment", "")))
+        for file in state.get("embedded_files", []):
+            writer.section(export_section("document", file), payload=blob_store.iter_base64(file["sha256"]))
+    return writer.bytes_written
+
+
+def read_file(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+def read_package(export):
+    """The export as a package (drmd.package): attachments as files instead of base64."""
+    buf = io.BytesIO()
+    if "path" in export:
+        with open(export["path"], "rb") as fh:
+            pack(fh, buf)
+    else:
+        pack(io.BytesIO(export["xml"].encode("utf-8")), buf, html=export["html"] or None)
+    return buf.getvalue()
 
 # --- Tab 5: Digital Signature ---
-with tabs[5]:
-    st.write("Under construction ...")
-
-with tabs[6]:
-
-    # Top row with Generate XML button and validation status
-    col1, col2 = st.columns([2, 3])
-
-    with col1:
-        generate_button = st.button("Generate XML", key="generate_xml", use_container_width=True)
+if "Digital Signature" in sections:
+    with sections["Digital Signature"], profile_block("Digital Signature"):
+        st.markdown("###### Signing Key")
+        st.caption("The exported XML is signed with an enveloped XML signature (XMLDSig, exclusive C14N, SHA-256).")
+        # Uploads are emptied while the section is not shown (section navigation),
+        # so the signer loaded from them is kept until a file is replaced or removed.
+        drop_signer = lambda: st.session_state.pop("signer", None)
+        col1, col2 = st.columns(2)
+        with col1:
+            sig_key = st.file_uploader("Private Key", type=["pem", "key", "der"], key="signature_key", on_change=drop_signer)
+        with col2:
+            sig_cert = st.file_uploader("Certificate", type=["pem", "crt", "cer", "der"], key="signature_cert", on_change=drop_signer)
+        sig_password = st.text_input("Key Password (optional)", type="password", key="signature_password")
+
+        if "signer" not in st.session_state:
+            st.session_state.signer = None
+        if sig_key is not None and sig_cert is not None:
+            st.session_state.signer = None
+            try:
+                st.session_state.signer = get_signer(sig_key.getvalue(), sig_cert.getvalue(), sig_password)
+            except Exception as e:
+                st.error(f"Could not load key and certificate: {e}")
+        if st.session_state.signer is not None:
+            cert = st.session_state.signer.certificate
+            st.success(f"Signing as **{cert.subject.rfc4514_string()}**")
+            st.text(f"Issuer: {cert.issuer.rfc4514_string()}\n"
+                    f"Valid: {cert.not_valid_before_utc:%Y-%m-%d} – {cert.not_valid_after_utc:%Y-%m-%d}")
+            st.checkbox("Sign exported XML", value=True, key="sign_export")
+
+if "Validate & Export" in sections:
+    with sections["Validate & Export"], profile_block("Validate & Export"):
+
+        # Top row with Generate XML button and validation status
+        col1, col2 = st.columns([2, 3])
 
-    # Only show this placeholder initially
-    with col2:
-        if not generate_button:
-            st.write("Click the button to generate XML from your entered data.")
+        with col1:
+            generate_button = st.button("Generate XML", key="generate_xml", use_container_width=True)
+            streaming_export = st.checkbox("Streaming export", key="streaming_export",
+                                           help="Write the XML section by section to a file, with attachments streamed in chunks, so memory stays bounded for very large certificates. No preview, pretty-printing or signing.")
+            engines = list(ENGINES)
+            validation_engine = st.selectbox("Validation engine", engines, index=engines.index(DEFAULT_VALIDATION_ENGINE), key="validation_engine",
+                                             help="lxml (libxml2) is fast; xmlschema explains each error with the schema component and element involved.")
+            max_errors = st.number_input("Stop after errors", min_value=0, value=20, step=1, key="validation_max_errors",
+                                         help="Fail fast after this many errors; 0 collects all of them.")
+
+        # Only show this placeholder initially
+        with col2:
+            if not generate_button:
+                st.write("Click the button to generate XML from your entered data.")
 
-    if generate_button:
         # Define namespaces and register them.
         ns_drmd = "https://example.org/drmd"
         ns_dcc = "https://ptb.de/dcc"
@@ -1319,265 +1409,207 @@ with tabs[6]:
         ET.register_namespace("si", ns_si)
         ET.register_namespace("ds", DS_NS)
 
-        # Create the root element.
-        root = ET.Element(f"{{{ns_drmd}}}digitalReferenceMaterialDocument", attrib={"schemaVersion": "0.2.0"})
-
-        # --- Build administrativeData ---
-        admin_data = ET.SubElement(root, f"{{{ns_drmd}}}administrativeData")
-        # coreData: title, uniqueIdentifier, documentIdentifiers, validity.
-        core_data = ET.SubElement(admin_data, f"{{{ns_drmd}}}coreData")
-        ET.SubElement(core_data, f"{{{ns_drmd}}}titleOfTheDocument").text = st.session_state.title_option
-        ET.SubElement(core_data, f"{{{ns_drmd}}}uniqueIdentifier").text = st.session_state.persistent_id_value
-        if st.session_state.documentIdentifiers:
-            export_identifier_list(core_data, "documentIdentifiers", st.session_state.documentIdentifiers, ns_drmd)
-        # Validity (simplified example)
-        validity_elem = ET.SubElement(core_data, f"{{{ns_drmd}}}validity")
-        if st.session_state.validity_type == "Time After Dispatch":
-            tad = ET.SubElement(validity_elem, f"{{{ns_drmd}}}timeAfterDispatch")
-            ET.SubElement(tad, f"{{{ns_drmd}}}dispatchDate").text = str(st.session_state.date_of_issue)
-            ET.SubElement(tad, f"{{{ns_drmd}}}period").text = st.session_state.raw_validity_period
-        elif st.session_state.validity_type == "Specific Time":
-            ET.SubElement(validity_elem, f"{{{ns_drmd}}}specificTime").text = str(st.session_state.specific_time)
-        else:
-            ET.SubElement(validity_elem, f"{{{ns_drmd}}}untilRevoked").text = "true"
-
-        # Materials: using the list from the Materials form.
-        materials_elem = ET.SubElement(admin_data, f"{{{ns_drmd}}}materials")
-        if not st.session_state.materials:
-            # If no material was entered, add a dummy material.
-            dummy = ET.SubElement(materials_elem, f"{{{ns_drmd}}}material")
-            dummy_name = ET.SubElement(dummy, f"{{{ns_drmd}}}name")
-            ET.SubElement(dummy_name, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = "Dummy Material"
-        else:
-            for material in st.session_state.materials:
-                mat_elem = ET.SubElement(materials_elem, f"{{{ns_drmd}}}material")
-                name_elem = ET.SubElement(mat_elem, f"{{{ns_drmd}}}name")
-                ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = material.get("name", "")
-                if (material.get("description", "") or "").strip():
-                    desc_elem = ET.SubElement(mat_elem, f"{{{ns_drmd}}}description")
-                    ET.SubElement(desc_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = material.get("description", "")
-                # minimumSampleSize (required) – using a default value "0" if empty.
-                min_sample_elem = ET.SubElement(mat_elem, f"{{{ns_drmd}}}minimumSampleSize")
-                iq_elem = ET.SubElement(min_sample_elem, f"{{{ns_dcc}}}itemQuantity")
-                realList_elem = ET.SubElement(iq_elem, f"{{{ns_si}}}realListXMLList")
-                val_elem = ET.Element(f"{{{ns_si}}}valueXMLList")
-                val_elem.text = (material.get("minimumSampleSize", "").strip() or "0")
-                unit_elem = ET.Element(f"{{{ns_si}}}unitXMLList")
-                unit_elem.text = ""
-                realList_elem.append(val_elem)
-                realList_elem.append(unit_elem)
-                # Optional: itemQuantities
-                if (material.get("itemQuantities", "") or "").strip():
-                    itemQuant_elem = ET.SubElement(mat_elem, f"{{{ns_drmd}}}itemQuantities")
-                    dummy_item = ET.SubElement(itemQuant_elem, f"{{{ns_dcc}}}itemQuantity")
-                    dummy_rl = ET.SubElement(dummy_item, f"{{{ns_si}}}realListXMLList")
-                    ET.SubElement(dummy_rl, f"{{{ns_si}}}valueXMLList").text = material.get("itemQuantities", "")
-                    ET.SubElement(dummy_rl, f"{{{ns_si}}}unitXMLList").text = ""
-                if material.get("materialIdentifiers"):
-                    export_identifier_list(mat_elem, "materialIdentifiers", material["materialIdentifiers"], ns_drmd)
-
-        # Reference Material Producer
-        if not st.session_state.producers:
-            prod_elem = ET.SubElement(admin_data, f"{{{ns_drmd}}}referenceMaterialProducer")
-            prod_name_elem = ET.SubElement(prod_elem, f"{{{ns_drmd}}}name")
-            ET.SubElement(prod_name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = "Dummy Producer"
-        else:
-            for prod in st.session_state.producers:
-                prod_elem = ET.SubElement(admin_data, f"{{{ns_drmd}}}referenceMaterialProducer")
-                prod_name_elem = ET.SubElement(prod_elem, f"{{{ns_drmd}}}name")
-                ET.SubElement(prod_name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = prod.get("producerName", "")
-                contact_elem = ET.SubElement(prod_elem, f"{{{ns_drmd}}}contact")
-                contact_name_elem = ET.SubElement(contact_elem, f"{{{ns_dcc}}}name")
-                ET.SubElement(contact_name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = prod.get("contactName", prod.get("producerName", "Contact Name"))
-                if (prod.get("producerEmail", "") or "").strip():
-                    ET.SubElement(contact_elem, f"{{{ns_dcc}}}eMail").text = prod.get("producerEmail", "")
-                if (prod.get("producerPhone", "") or "").strip():
-                    ET.SubElement(contact_elem, f"{{{ns_dcc}}}phone").text = prod.get("producerPhone", "")
-                if (prod.get("producerFax", "") or "").strip():
-                    ET.SubElement(contact_elem, f"{{{ns_dcc}}}fax").text = prod.get("producerFax", "")
-                if (prod.get("producerStreet", "") or prod.get("producerStreetNo", "") or prod.get("producerPostCode", "")
-                    or prod.get("producerCity", "") or prod.get("producerCountryCode", "")):
-                    location_elem = ET.SubElement(contact_elem, f"{{{ns_dcc}}}location")
-                    if (prod.get("producerStreet", "") or "").strip():
-                        ET.SubElement(location_elem, f"{{{ns_dcc}}}street").text = prod.get("producerStreet", "")
-                    if (prod.get("producerStreetNo", "") or "").strip():
-                        ET.SubElement(location_elem, f"{{{ns_dcc}}}streetNo").text = prod.get("producerStreetNo", "")
-                    if (prod.get("producerPostCode", "") or "").strip():
-                        ET.SubElement(location_elem, f"{{{ns_dcc}}}postCode").text = prod.get("producerPostCode", "")
-                    if (prod.get("producerCity", "") or "").strip():
-                        ET.SubElement(location_elem, f"{{{ns_dcc}}}city").text = prod.get("producerCity", "")
-                if (prod.get("producerCountryCode", "") or "").strip():
-                        ET.SubElement(location_elem, f"{{{ns_dcc}}}countryCode").text = prod.get("producerCountryCode", "")
-                if prod.get("organizationIdentifiers"):
-                    export_identifier_list(prod_elem, "organizationIdentifiers", prod["organizationIdentifiers"], ns_drmd)
-
-        # Responsible Persons
-        if not st.session_state.responsible_persons:
-            respPersons_elem = ET.SubElement(admin_data, f"{{{ns_drmd}}}respPersons")
-            rp_elem = ET.SubElement(respPersons_elem, f"{{{ns_dcc}}}respPerson")
-            person_elem = ET.SubElement(rp_elem, f"{{{ns_dcc}}}person")
-            name_elem = ET.SubElement(person_elem, f"{{{ns_dcc}}}name")
-            ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = "Dummy Person"
-            ET.SubElement(rp_elem, f"{{{ns_dcc}}}role").text = "Dummy Role"
-        else:
-            respPersons_elem = ET.SubElement(admin_data, f"{{{ns_drmd}}}respPersons")
-            for rp in st.session_state.responsible_persons:
-                rp_elem = ET.SubElement(respPersons_elem, f"{{{ns_dcc}}}respPerson")
-                person_elem = ET.SubElement(rp_elem, f"{{{ns_dcc}}}person")
-                name_elem = ET.SubElement(person_elem, f"{{{ns_dcc}}}name")
-                ET.SubElement(name_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = rp.get("personName", "")
-                if (rp.get("description", "") or "").strip():
-                    desc_elem = ET.SubElement(rp_elem, f"{{{ns_dcc}}}description")
-                    ET.SubElement(desc_elem, f"{{{ns_dcc}}}content", attrib={"lang": "en"}).text = rp.get("description", "")
-                if (rp.get("role", "") or "").strip():
-                    ET.SubElement(rp_elem, f"{{{ns_dcc}}}role").text = rp.get("role", "")
-                if rp.get("mainSigner", False):
-                    ET.SubElement(rp_elem, f"{{{ns_dcc}}}mainSigner").text = "true"
-                if rp.get("cryptElectronicSeal", False):
-                    ET.SubElement(rp_elem, f"{{{ns_dcc}}}cryptElectronicSeal").text = "true"
-                if rp.get("cryptElectronicSignature", False):
-                    ET.SubElement(rp_elem, f"{{{ns_dcc}}}cryptElectronicSignature").text = "true"
-                if rp.get("cryptElectronicTimeStamp", False):
-                    ET.SubElement(rp_elem, f"{{{ns_dcc}}}cryptElectronicTimeStamp").text = "true"
-
-        # Add the statements section.
-        statements_elem = export_statements(ns_drmd, ns_dcc)
-        admin_data.append(statements_elem)
-
-    # --- Material Properties ---
-         # Next: materialPropertiesList.
-        mp_list_elem = export_materialProperties(ns_drmd, ns_dcc, ns_si)
-        root.append(mp_list_elem)
-
-        # 3️ Add a single <comment> element, if provided.
-        comment_elem = export_comment(ns_drmd)
-        if comment_elem is not None:
-            root.append(comment_elem)
-
-        # 4️ Add a single <document> element, if provided.
-        doc_elem = export_document(ns_drmd, ns_dcc)
-        if doc_elem is not None:
-            root.append(doc_elem)
-
-
-        if st.session_state.get("digital_signature_cert"):
-            ds_elem = ET.SubElement(root, f"{{{DS_NS}}}Signature")
-            ds_elem.text = st.session_state.digital_signature_cert.name
-
-        # Pretty-print XML.
-        xml_str = ET.tostring(root, encoding="utf-8")
-        try:
-            from xml.dom import minidom
-            reparsed = minidom.parseString(xml_str)
-            pretty_xml = reparsed.toprettyxml(indent="  ")
-        except Exception as e:
-            st.error(f"Error during pretty-printing XML: {e}")
-            pretty_xml = xml_str.decode("utf-8")
-
-        # Validate XML against schema
-        is_valid = False
-        validation_message = ""
-        try:
-            schema = xmlschema.XMLSchema(DEFAULT_XSD_PATH)
-            is_valid = schema.is_valid(pretty_xml)
-            if not is_valid:
-                # Get error log details
-                errors = schema.validate(pretty_xml, use_defaults=False)
-                validation_message = str(errors)
-        except Exception as e:
-            validation_message = f"Schema validation failed: {e}"
-
-        # --- XSL Transformation to HTML ---
-        try:
-            # Parse the XSL file
-            xslt_doc = etree.parse(DEFAULT_XSL_PATH)
-            transform = etree.XSLT(xslt_doc)
-            # Parse the generated XML
-            xml_doc = etree.fromstring(pretty_xml.encode("utf-8"))
-            # Transform XML to HTML
-            result_tree = transform(xml_doc)
-            html_output = etree.tostring(result_tree, pretty_print=True, encoding="utf-8").decode("utf-8")
-        except Exception as e:
-            st.error(f"XSL Transformation Error: {e}")
-            html_output = ""
-
-        # Download buttons row
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            st.download_button("Download HTML", data=html_output, file_name="certificate.html", mime="text/html", use_container_width=True)
-        with col2:
-            st.download_button("Download XML", data=pretty_xml, file_name="material_properties.xml", mime="application/xml", use_container_width=True)
-        with col3:
-            if is_valid:
-                st.success("XML is valid against the schema!")
-            else:
-                st.error("XML is NOT valid against the schema!")
-
-        # HTML preview (expanded by default)
-        with st.expander("HTML Preview", expanded=True):
-            st.components.v1.html(html_output, height=600, scrolling=True)
-
-        # XML content (collapsed by default)
-        with st.expander("XML Content", expanded=False):
-            st.text_area("Generated XML", pretty_xml, height=400)
+        if generate_button and streaming_export:
+            previous = st.session_state.get("export_result") or {}
+            if previous.get("path") and os.path.exists(previous["path"]):
+                os.unlink(previous["path"])
+            with contextlib.suppress(OSError):
+                prune_exports()
+            fd, export_path = tempfile.mkstemp(prefix="drmd_export_", suffix=".xml", dir=DEFAULT_EXPORT_DIR)
+            with os.fdopen(fd, "wb") as fh:
+                write_streaming_export(fh)
+
+            # Validate from the file while it is read; the whole tree is never built.
+            is_valid = False
+            validation_message = ""
+            try:
+                report = validate(export_path, validation_engine, max_errors or None, os.path.abspath(DEFAULT_XSD_PATH))
+                is_valid, validation_message = report.valid, report.message
+            except Exception as e:
+                validation_message = f"Schema validation failed: {e}"
+            if st.session_state.get("signer") is not None and st.session_state.get("sign_export", True):
+                st.warning("Streaming exports are not signed; turn off streaming export to sign the document.")
+
+            st.session_state.export_result = {
+                "path": export_path, "size": os.path.getsize(export_path), "valid": is_valid, "message": validation_message,
+                "generated": datetime.now(),
+            }
 
-            # Show validation errors if any
-            if not is_valid and validation_message:
+        elif generate_button:
+            # One pass over the mapping tables; the base64 text comes from the blob store cache,
+            # so unchanged attachments are never re-encoded.
+            blob_store = get_blob_store()
+            root = export_document(st.session_state, payload=lambda file: blob_store.base64(file["sha256"]))
+
+            # Pretty-print XML.
+            xml_str = ET.tostring(root, encoding="utf-8")
+            try:
+                from xml.dom import minidom
+                reparsed = minidom.parseString(xml_str)
+                pretty_xml = reparsed.toprettyxml(indent="  ")
+            except Exception as e:
+                st.error(f"Error during pretty-printing XML: {e}")
+                pretty_xml = xml_str.decode("utf-8")
+
+            # Sign the final serialization so the signature covers exactly what is downloaded.
+            if st.session_state.get("signer") is not None and st.session_state.get("sign_export", True):
+                try:
+                    pretty_xml = st.session_state.signer.sign(pretty_xml.encode("utf-8")).decode("utf-8")
+                except Exception as e:
+                    st.error(f"Signing failed: {e}")
+
+            # Validate XML against schema; one pass collects the errors
+            is_valid = False
+            validation_message = ""
+            try:
+                report = validate(pretty_xml.encode("utf-8"), validation_engine, max_errors or None, os.path.abspath(DEFAULT_XSD_PATH))
+                is_valid, validation_message = report.valid, report.message
+            except Exception as e:
+                validation_message = f"Schema validation failed: {e}"
+
+            # --- XSL Transformation to HTML ---
+            try:
+                # Compiled once per process (and ahead of traffic by drmd.warmup)
+                transform = stylesheet(os.path.abspath(DEFAULT_XSL_PATH))
+                # Parse the generated XML
+                xml_doc = etree.fromstring(pretty_xml.encode("utf-8"))
+                # Transform XML to HTML
+                result_tree = transform(xml_doc)
+                html_output = etree.tostring(result_tree, pretty_print=True, encoding="utf-8").decode("utf-8")
+                html_preview = HtmlPreview(result_tree)
+            except Exception as e:
+                st.error(f"XSL Transformation Error: {e}")
+                html_output = ""
+                html_preview = None
+
+            # Kept across reruns so paging through the preview does not regenerate the export.
+            st.session_state.export_result = {
+                "xml": pretty_xml, "html": html_output, "valid": is_valid, "message": validation_message,
+                "html_preview": html_preview, "xml_pages": PagedText(pretty_xml), "generated": datetime.now(),
+            }
+            for key in [k for k in st.session_state if k.startswith("preview_page_")] + ["xml_page"]:
+                st.session_state.pop(key, None)
+
+        export = st.session_state.get("export_result")
+        if export is not None and "path" in export and not os.path.exists(export["path"]):
+            st.info(f"The streamed export expired after {EXPORT_MAX_AGE_HOURS:g} hours; click Generate XML to write it again.")
+        elif export is not None and "path" in export:
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                st.download_button("Download XML", data=functools.partial(read_file, export["path"]), file_name="material_properties.xml", mime="application/xml", use_container_width=True)
+            with col2:
+                st.download_button("Download package", data=functools.partial(read_package, export), file_name="material_properties.drmdz", mime="application/zip", use_container_width=True)
+            with col3:
+                if export["valid"]:
+                    st.success("XML is valid against the schema!")
+                else:
+                    st.error("XML is NOT valid against the schema!")
+            st.caption(f"Streamed export of {export['size']:,} bytes generated at {export['generated']:%H:%M:%S}.")
+            if not export["valid"] and export["message"]:
                 st.error("Validation Errors:")
-                st.code(validation_message)
+                st.code(export["message"])
+        elif export is not None:
+            # Download buttons row; the data is produced only when a button is clicked.
+            col1, col2, col3, col4 = st.columns([1, 1, 1, 2])
+            with col1:
+                st.download_button("Download HTML", data=functools.partial(export["html"].encode, "utf-8"), file_name="certificate.html", mime="text/html", use_container_width=True)
+            with col2:
+                st.download_button("Download XML", data=functools.partial(export["xml"].encode, "utf-8"), file_name="material_properties.xml", mime="application/xml", use_container_width=True)
+            with col3:
+                st.download_button("Download package", data=functools.partial(read_package, export), file_name="material_properties.drmdz", mime="application/zip", use_container_width=True)
+            with col4:
+                if export["valid"]:
+                    st.success("XML is valid against the schema!")
+                else:
+                    st.error("XML is NOT valid against the schema!")
+            if not generate_button:
+                st.caption(f"Export generated at {export['generated']:%H:%M:%S}; click Generate XML to refresh it.")
+
+            # HTML preview (expanded by default), one section and page at a time
+            with st.expander("HTML Preview", expanded=True):
+                preview = export["html_preview"]
+                if preview is not None and preview.sections:
+                    pcol1, pcol2 = st.columns([3, 1])
+                    section = pcol1.selectbox("Section", range(len(preview.sections)), format_func=lambda i: preview.titles[i], key="preview_section")
+                    pages = preview.page_count(section)
+                    page = pcol2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"preview_page_{section}")
+                    st.iframe(preview.render(section, page - 1), height=600)
+                    st.caption(f"{preview.row_count(section)} table rows in this section, {preview.rows_per_page} per page.")
+
+            # XML content (collapsed by default), paged with long lines shortened
+            with st.expander("XML Content", expanded=False):
+                xml_pages = export["xml_pages"]
+                xcol1, xcol2 = st.columns([1, 3])
+                xml_page = xcol1.number_input(f"Page (of {xml_pages.page_count})", min_value=1, max_value=xml_pages.page_count, step=1, key="xml_page")
+                first, last = xml_pages.line_range(xml_page - 1)
+                xcol2.caption(f"Lines {first}–{last} of {xml_pages.line_count}. Long lines such as attachment payloads are shortened; download the XML for the full document.")
+                st.code(xml_pages.page(xml_page - 1), language="xml")
+
+                # Show validation errors if any
+                if not export["valid"] and export["message"]:
+                    st.error("Validation Errors:")
+                    st.code(export["message"])
 # (after your existing tabs, add “Help”)
 
 
-with tabs[-1]:
-
-    st.markdown("#### Application Overview  \n"
-                "The DRMD Generator is a Streamlit-based tool for creating **Digital Reference Material Documents** "
-                "that conform to the DRMD XML schema. It walks you through each section of a Reference Material "
-                "Certificate—metadata, materials, measurement properties, statements, signatures, and export.")
-
-    st.markdown("#### Main Sections  \n"
-                "- **Administrative Data**: Document title, persistent identifier, document identifiers, validity, "
-                "producer and responsible-person details.  \n"
-                "- **Materials** (formerly “Items”): Define one or more materials, their class, sample size, quantities "
-                "and material identifiers.  \n"
-                "- **Properties**: Specify measurement-property sets, certified values, uncertainties, and units.  \n"
-                "- **Statements**: Capture official statements (intended use, traceability, safety, etc.) and add any custom notes.  \n"
-                "- **Comments & Documents**: Attach external files or free-form remarks.  \n"
-                "- **Digital Signature**: Apply XML Signature, e-seal, and timestamp options.  \n"
-                "- **Validate & Export**: Run schema validation (drmd.xsd) and download your finished XML.  \n"
-                "- **Help**: You’re here — background, schema mapping, dependencies, and version notes.")
-
-    st.markdown("#### Schema Mapping  \n"
-                "All fields map 1:1 to elements in **drmd.xsd** (version in `/drmd.xsd`). "
-                "Key top-level XML elements are:  \n"
-                "- `<digitalReferenceMaterialDocument>` (root)  \n"
-                "- `<administrativeData>`: contains `<titleOfTheDocument>`, `<persistentIdentifier>`, `<documentIdentifiers>`, `<validity>`, `<referenceMaterialProducer>`, `<respPersons>`  \n"
-                "- `<materials>` _(the former `<items>` element)_ with child `<material>` entries: `<name>`, `<description>`, `<materialClass>`, `<minimumSampleSize>`, `<itemQuantities>`, `<materialIdentifiers>`, `<isCertified>`  \n"
-                "- `<measurementResults>`: holds `<materialProperty>` sets, `<result>` elements, and `<quantities>` tables.  \n"
-                "- `<statements>`: wraps official and custom statements.  \n"
-                "- `<ds:Signature>`: optional XML Digital Signature nodes.")
-
-    st.markdown("#### How to Use  \n"
-                "1. **Load** an existing DRMD XML (optional) — fields populate automatically.  \n"
-                "2. Work through each tab, filling in all required fields. Hover over ⓘ icons for inline help.  \n"
-                "3. **Generate** the Persistent Identifier (UUID) or supply your own.  \n"
-                "4. In **Validate & Export**, click “Validate” to catch schema errors, then “Download” to save your XML.")
-
-    st.markdown("#### Dependencies  \n"
-                "- Python 3.8+  \n"
-                "- `streamlit`  \n"
-                "- `pandas`  \n"
-                "- `rdflib`  \n"
-                "- `xmlschema`  \n"
-                "- `lxml`")
-
-    st.markdown("#### External Standards  \n"
-                "- Based on the Digital Calibration Certificate (DCC) schema.  \n"
-                "- Conforms to **ISO 33401** for reference material certificates.")
-
-
-    st.markdown("#### Further Documentation  \n"
-                "- Full DRMD schema and docs: [link-to-drmd-documentation]  \n"
-                "- Original DCC schema: [link-to-dcc-schema]")
-
-render_ui_settings_panel()
\ No newline at end of file
+if "Help" in sections:
+    with sections["Help"], profile_block("Help"):
+
+        st.markdown("#### Application Overview  \n"
+                    "The DRMD Generator is a Streamlit-based tool for creating **Digital Reference Material Documents** "
+                    "that conform to the DRMD XML schema. It walks you through each section of a Reference Material "
+                    "Certificate—metadata, materials, measurement properties, statements, signatures, and export.")
+
+        st.markdown("#### Main Sections  \n"
+                    "- **Administrative Data**: Document title, persistent identifier, document identifiers, validity, "
+                    "producer and responsible-person details.  \n"
+                    "- **Materials** (formerly “Items”): Define one or more materials, their class, sample size, quantities "
+                    "and material identifiers.  \n"
+                    "- **Properties**: Specify measurement-property sets, certified values, uncertainties, and units.  \n"
+                    "- **Statements**: Capture official statements (intended use, traceability, safety, etc.) and add any custom notes.  \n"
+                    "- **Comments & Documents**: Attach one or more external files (stored once, deduplicated) or free-form remarks.  \n"
+                    "- **Digital Signature**: Load a private key and certificate to sign the exported XML (XMLDSig).  \n"
+                    "- **Validate & Export**: Run schema validation (drmd.xsd) and download your finished XML.  \n"
+                    "- **Help**: You’re here — background, schema mapping, dependencies, and version notes.")
+
+        st.markdown("#### Schema Mapping  \n"
+                    "All fields map 1:1 to elements in **drmd.xsd** (version in `/drmd.xsd`). "
+                    "Key top-level XML elements are:  \n"
+                    "- `<digitalReferenceMaterialDocument>` (root)  \n"
+                    "- `<administrativeData>`: contains `<titleOfTheDocument>`, `<persistentIdentifier>`, `<documentIdentifiers>`, `<validity>`, `<referenceMaterialProducer>`, `<respPersons>`  \n"
+                    "- `<materials>` _(the former `<items>` element)_ with child `<material>` entries: `<name>`, `<description>`, `<materialClass>`, `<minimumSampleSize>`, `<itemQuantities>`, `<materialIdentifiers>`, `<isCertified>`  \n"
+                    "- `<measurementResults>`: holds `<materialProperty>` sets, `<result>` elements, and `<quantities>` tables.  \n"
+                    "- `<statements>`: wraps official and custom statements.  \n"
+                    "- `<ds:Signature>`: optional XML Digital Signature nodes.")
+
+        st.markdown("#### How to Use  \n"
+                    "1. **Load** an existing DRMD XML (optional) — fields populate automatically.  \n"
+                    "2. Work through each tab, filling in all required fields. Hover over ⓘ icons for inline help.  \n"
+                    "3. **Generate** the Persistent Identifier (UUID) or supply your own.  \n"
+                    "4. In **Validate & Export**, click “Validate” to catch schema errors, then “Download” to save your XML.")
+
+        st.markdown("#### Dependencies  \n"
+                    "- Python 3.8+  \n"
+                    "- `streamlit`  \n"
+                    "- `pandas`  \n"
+                    "- `rdflib`  \n"
+                    "- `xmlschema`  \n"
+                    "- `lxml`")
+
+        st.markdown("#### External Standards  \n"
+                    "- Based on the Digital Calibration Certificate (DCC) schema.  \n"
+                    "- Conforms to **ISO 33401** for reference material certificates.")
+
+
+        st.markdown("#### Further Documentation  \n"
+                    "- Full DRMD schema and docs: [link-to-drmd-documentation]  \n"
+                    "- Original DCC schema: [link-to-dcc-schema]")
+
+render_identifier_panel()
+render_rule_panel()
+render_ui_settings_panel()
+autosave_draft(get_history().commit(st.session_state))
+if profiler is not None:
+    profiler.stop()
+render_profiler_panel()
+render_history_panel(history_panel)
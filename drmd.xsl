@@ -4,7 +4,8 @@
     xmlns:drmd="https://example.org/drmd"
     xmlns:dcc="https://ptb.de/dcc"
     xmlns:si="https://ptb.de/si"
-    xmlns:ds="http://www.w3.org/2000/09/xmldsig#">
+    xmlns:ds="http://www.w3.org/2000/09/xmldsig#"
+    exclude-result-prefixes="drmd dcc si ds">
 
     <!-- Output as HTML -->
     <xsl:output method="html" indent="yes" />
@@ -195,7 +196,7 @@
                     <th>Property Unit</th>
                     <th>Uncertainty Value</th>
                   </tr>
-                  <xsl:apply-templates select="drmd:results/dcc:result/dcc:data/dcc:list/dcc:quantity" />
+                  <xsl:apply-templates select="drmd:results/dcc:result/dcc:data/dcc:list/dcc:quantity | drmd:results/dcc:result/dcc:data/dcc:list/drmd:quantity/dcc:quantity" />
                 </table>
                 <hr/>
               </xsl:when>
@@ -216,7 +217,7 @@
                     <th>Property Unit</th>
                     <th>Uncertainty Value</th>
                   </tr>
-                  <xsl:apply-templates select="drmd:results/dcc:result/dcc:data/dcc:list/dcc:quantity" />
+                  <xsl:apply-templates select="drmd:results/dcc:result/dcc:data/dcc:list/dcc:quantity | drmd:results/dcc:result/dcc:data/dcc:list/drmd:quantity/dcc:quantity" />
                 </table>
                 <hr/>
               </xsl:when>
@@ -0,0 +1,6 @@
+"""Support code for the DRMD Generator that does not depend on Streamlit.
+
+``app.py`` holds the user interface; the modules in this package hold the
+storage, XML and processing helpers it uses, so they can also be imported by
+command-line tools and worker processes.
+"""
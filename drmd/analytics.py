@@ -0,0 +1,297 @@
+"""Columnar store of certified values across certificates.
+
+Every quantity of every certificate becomes one row: material, property set,
+result, name, value, unit, expanded uncertainty with coverage factor,
+probability and distribution, and the quantity's identifiers.  Rows are
+flattened from the same model ``parse_drmd`` builds for the editor and written
+as one Parquet part per source file; ``manifest.json`` maps each source path
+to its content hash, so re-ingesting a corpus only parses new or changed files.
+Queries scan all parts as one ``pyarrow.dataset`` and push filters on quantity
+kind, unit, name and uncertainty down to the Parquet reader.
+
+    python -m drmd.analytics ingest certificates/
+    python -m drmd.analytics query --kind MassFraction --name Pb --max-uncertainty 1.0
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from drmd.model import parse_drmd
+from drmd.units import dsi_dimension, dsi_to_qudt, quantity_kinds
+
+DEFAULT_ANALYTICS_DIR = os.environ.get("DRMD_ANALYTICS_DIR", "./.drmd_analytics")
+
+IDENTIFIER = pa.struct([("scheme", pa.string()), ("value", pa.string()), ("link", pa.string())])
+
+SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("sha256", pa.string()),
+    ("document_id", pa.string()),
+    ("title", pa.string()),
+    ("material", pa.string()),
+    ("property_set", pa.string()),
+    ("property_id", pa.string()),
+    ("certified", pa.bool_()),
+    ("result", pa.string()),
+    ("name", pa.string()),
+    ("label", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+    ("unit_qudt", pa.string()),
+    ("dimension", pa.string()),
+    ("quantity_kind", pa.string()),
+    ("uncertainty", pa.float64()),
+    ("coverage_factor", pa.float64()),
+    ("coverage_probability", pa.float64()),
+    ("distribution", pa.string()),
+    ("identifiers", pa.list_(IDENTIFIER)),
+])
+
+# flattened column -> column of the result quantities table
+QUANTITY_COLUMNS = {
+    "name": "Name", "label": "Label", "value": "Value", "unit": "Unit", "quantity_kind": "Quantity Kind",
+    "uncertainty": "Uncertainty", "coverage_factor": "Coverage Factor",
+    "coverage_probability": "Coverage Probability", "distribution": "Distribution",
+}
+
+
+def _text(value) -> str:
+    return "" if value is None or (isinstance(value, float) and value != value) else str(value).strip()
+
+
+def flatten(state: dict, source: str = "", sha256: str = "") -> pa.Table:
+    """One row per quantity of a parsed certificate, in ``SCHEMA`` layout."""
+    columns = {field.name: [] for field in SCHEMA}
+    material = "; ".join(m["name"] for m in state.get("materials", []) if m.get("name"))
+    for mp in state.get("materialProperties", []):
+        for res in mp.get("results", []):
+            quantities = res.get("quantities")
+            if quantities is None or quantities.empty:
+                continue
+            quantities = quantities.reindex(columns=list(QUANTITY_COLUMNS.values()))
+            for col in ("Value", "Uncertainty", "Coverage Factor", "Coverage Probability"):
+                quantities[col] = pd.to_numeric(quantities[col], errors="coerce")
+            row_ids = res.get("identifiers", [])
+            for i, row in enumerate(quantities.itertuples(index=False)):
+                values = dict(zip(QUANTITY_COLUMNS, row))
+                unit = _text(values["unit"])
+                columns["source"].append(source)
+                columns["sha256"].append(sha256)
+                columns["document_id"].append(state.get("persistent_id_value", ""))
+                columns["title"].append(state.get("title_option", ""))
+                columns["material"].append(material)
+                columns["property_set"].append(mp.get("name", ""))
+                columns["property_id"].append(mp.get("id", ""))
+                columns["certified"].append(bool(mp.get("isCertified", False)))
+                columns["result"].append(res.get("result_name", ""))
+                for key in ("name", "label", "quantity_kind", "distribution"):
+                    columns[key].append(_text(values[key]))
+                for key in ("value", "uncertainty", "coverage_factor", "coverage_probability"):
+                    columns[key].append(None if pd.isna(values[key]) else float(values[key]))
+                columns["unit"].append(unit)
+                columns["unit_qudt"].append(dsi_to_qudt(unit))
+                columns["dimension"].append(dsi_dimension(unit))
+                columns["identifiers"].append(
+                    [{k: i_.get(k, "") for k in ("scheme", "value", "link")} for i_ in row_ids[i]]
+                    if i < len(row_ids) else [])
+    return pa.Table.from_pydict(columns, schema=SCHEMA)
+
+
+def part_name(path: str) -> str:
+    return hashlib.sha256(path.encode("utf-8")).hexdigest()[:32] + ".parquet"
+
+
+def _ingest_file(job):
+    """Worker: parse one certificate and write its Parquet part."""
+    path, parts_dir = job
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        table = flatten(parse_drmd(data), path, sha256)
+        target = os.path.join(parts_dir, part_name(path))
+        fd, tmp = tempfile.mkstemp(dir=parts_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path, sha256, table.num_rows, None
+    except Exception as e:
+        return path, None, 0, f"{type(e).__name__}: {e}"
+
+
+class AnalyticsStore:
+    def __init__(self, root: str = DEFAULT_ANALYTICS_DIR):
+        self.root = root
+        self.parts_dir = os.path.join(root, "parts")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        self._dataset = None
+        os.makedirs(self.parts_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as fh:
+                self.manifest = json.load(fh)
+        else:
+            self.manifest = {}
+
+    def __len__(self):
+        return sum(entry["rows"] for entry in self.manifest.values())
+
+    def _save_manifest(self):
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def ingest(self, paths, max_workers: int | None = None, prune: bool = False):
+        """Flatten files in parallel, skipping files whose hash is unchanged.
+
+        Yields ``(path, status, error)`` with status "ingested", "unchanged",
+        "failed" or, with ``prune``, "removed" for sources no longer given.
+        """
+        seen, todo = set(), []
+        for path in paths:
+            path = os.path.abspath(path)
+            seen.add(path)
+            with open(path, "rb") as fh:
+                if self.manifest.get(path, {}).get("sha256") == hashlib.sha256(fh.read()).hexdigest():
+                    yield path, "unchanged", None
+                    continue
+            todo.append(path)
+        with self._lock:
+            try:
+                if todo:
+                    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                        jobs = [(path, self.parts_dir) for path in todo]
+                        for path, sha256, rows, error in pool.map(_ingest_file, jobs, chunksize=4):
+                            if error:
+                                yield path, "failed", error
+                            else:
+                                self.manifest[path] = {"sha256": sha256, "part": part_name(path), "rows": rows}
+                                yield path, "ingested", None
+                if prune:
+                    for path in sorted(set(self.manifest) - seen):
+                        self._remove(path)
+                        yield path, "removed", None
+            finally:
+                self._save_manifest()
+                self._dataset = None
+
+    def _remove(self, path: str):
+        entry = self.manifest.pop(path)
+        part = os.path.join(self.parts_dir, entry["part"])
+        if os.path.exists(part):
+            os.unlink(part)
+
+    def remove(self, path: str):
+        with self._lock:
+            self._remove(os.path.abspath(path))
+            self._save_manifest()
+            self._dataset = None
+
+    def dataset(self) -> ds.Dataset:
+        """All parts as one dataset; rebuilt only after an ingest."""
+        if self._dataset is None:
+            parts = [os.path.join(self.parts_dir, e["part"]) for e in self.manifest.values()]
+            self._dataset = ds.dataset(parts, schema=SCHEMA, format="parquet")
+        return self._dataset
+
+    def kind_filter(self, kind: str) -> ds.Expression:
+        """Rows of quantity kind ``kind``.
+
+        Rows tagged with a kind match by name.  Untagged rows match when their
+        unit is one of the kind's QUDT applicable units or, failing that, has
+        the kind's dimension vector.
+        """
+        tagged = pc.field("quantity_kind") == kind
+        qk = quantity_kinds().get(kind)
+        if qk is None:
+            return tagged
+        untagged = pc.field("quantity_kind") == ""
+        by_unit = pc.field("unit_qudt").isin(list(qk.units)) if qk.units else pc.scalar(False)
+        by_dimension = pc.field("dimension") == qk.dimension if qk.dimension else pc.scalar(False)
+        return tagged | (untagged & (by_unit | by_dimension))
+
+    def query(self, kind: str | None = None, unit: str | None = None, name: str | None = None,
+              max_uncertainty: float | None = None, certified: bool | None = None,
+              columns=None) -> pd.DataFrame:
+        """Matching quantities as a DataFrame.
+
+        ``unit`` matches the D-SI unit as written or its QUDT name; ``name``
+        is a case-insensitive substring of the quantity name.
+        """
+        conditions = []
+        if kind:
+            conditions.append(self.kind_filter(kind))
+        if unit:
+            conditions.append((pc.field("unit") == unit) | (pc.field("unit_qudt") == unit))
+        if name:
+            conditions.append(pc.match_substring(pc.field("name"), name, ignore_case=True))
+        if max_uncertainty is not None:
+            conditions.append(pc.field("uncertainty") <= max_uncertainty)
+        if certified is not None:
+            conditions.append(pc.field("certified") == certified)
+        expr = None
+        for condition in conditions:
+            expr = condition if expr is None else expr & condition
+        return self.dataset().to_table(columns=columns, filter=expr).to_pandas()
+
+
+def _xml_files(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for dirpath, _, files in os.walk(target):
+                yield from (os.path.join(dirpath, f) for f in sorted(files) if f.lower().endswith(".xml"))
+        else:
+            yield target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar analytics over a corpus of DRMD certificates.")
+    parser.add_argument("--store", default=DEFAULT_ANALYTICS_DIR, help="store directory (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="flatten XML files or directories into the store")
+    p_ingest.add_argument("paths", nargs="+")
+    p_ingest.add_argument("--workers", type=int, default=None)
+    p_ingest.add_argument("--prune", action="store_true", help="drop sources not listed in this run")
+    p_query = sub.add_parser("query", help="filter quantities")
+    p_query.add_argument("--kind", help="QUDT quantity kind, e.g. MassFraction")
+    p_query.add_argument("--unit", help="D-SI unit or QUDT unit name")
+    p_query.add_argument("--name", help="substring of the quantity name")
+    p_query.add_argument("--max-uncertainty", type=float)
+    p_query.add_argument("--certified", action="store_true", help="only certified property sets")
+    p_query.add_argument("--csv", help="write the result to this CSV file")
+    args = parser.parse_args(argv)
+
+    store = AnalyticsStore(args.store)
+    if args.command == "ingest":
+        failed = 0
+        for path, status, error in store.ingest(_xml_files(args.paths), args.workers, args.prune):
+            failed += status == "failed"
+            print(f"{status:9} {path}" + (f": {error}" if error else ""))
+        return 1 if failed else 0
+    df = store.query(args.kind, args.unit, args.name, args.max_uncertainty, True if args.certified else None)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    else:
+        cols = ["material", "property_set", "name", "value", "unit", "uncertainty", "coverage_factor", "source"]
+        print(df[cols].to_string(index=False) if len(df) else "no matching quantities")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
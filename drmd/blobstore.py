@@ -0,0 +1,163 @@
+"""Content-addressed blob store for document attachments.
+
+Attachments are stored once per SHA-256 digest, so the same PDF attached to
+many certificates (or uploaded again in another session) occupies disk space
+only once.  The base64 encoding used for ``dcc:dataBase64`` is written next to
+the raw bytes the first time it is needed and is kept in a small in-memory
+LRU, so re-exports never re-encode an unchanged file.
+
+Layout on disk::
+
+    <root>/<first two hex chars>/<digest>.bin   raw bytes
+    <root>/<first two hex chars>/<digest>.b64   cached base64 text (ASCII)
+"""
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_BLOB_DIR = os.environ.get("DRMD_BLOB_DIR", "./.drmd_blobs")
+# Upper bound for base64 text kept in memory across all sessions.
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class BlobStore:
+    def __init__(self, root: str = DEFAULT_BLOB_DIR, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self._b64_cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # -- paths ---------------------------------------------------------------
+    def _path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{suffix}")
+
+    def path(self, digest: str) -> str:
+        """Path of the raw bytes for ``digest`` (for streaming readers)."""
+        return self._path(digest, ".bin")
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest, ".bin"))
+
+    def _write_atomic(self, target: str, data: bytes):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    # -- writing -------------------------------------------------------------
+    def put(self, data: bytes) -> str:
+        """Store ``data`` (if not present yet) and return its SHA-256 digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self:
+            self._write_atomic(self.path(digest), data)
+        return digest
+
+    def put_stream(self, stream, chunk_size: int = 1024 * 1024) -> str:
+        """Store the bytes read from ``stream`` and return their digest.
+
+        The bytes are hashed while they are copied to a temporary file in the
+        store, so memory stays bounded for any size.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            sha = hashlib.sha256()
+            with os.fdopen(fd, "wb") as fh:
+                while chunk := stream.read(chunk_size):
+                    sha.update(chunk)
+                    fh.write(chunk)
+            digest = sha.hexdigest()
+            if digest in self:
+                os.unlink(tmp)
+            else:
+                os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+                os.replace(tmp, self.path(digest))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return digest
+
+    def put_base64(self, text: str) -> str:
+        """Store the bytes encoded in ``text`` and return their digest.
+
+        When ``text`` already is the canonical encoding (no line breaks or
+        padding quirks) it is kept as the cached base64 form, so loading an
+        XML file and exporting it again does not encode the payload at all.
+        """
+        compact = "".join((text or "").split())
+        try:
+            data = base64.b64decode(compact, validate=True)
+        except (binascii.Error, ValueError):
+            data = base64.b64decode(compact)
+        digest = self.put(data)
+        if not os.path.exists(self._path(digest, ".b64")) and base64.b64encode(data).decode("ascii") == compact:
+            self._write_atomic(self._path(digest, ".b64"), compact.encode("ascii"))
+        return digest
+
+    # -- reading -------------------------------------------------------------
+    def get(self, digest: str) -> bytes:
+        with open(self.path(digest), "rb") as fh:
+            return fh.read()
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def base64(self, digest: str) -> str:
+        """Base64 text for ``digest``; encoded at most once per blob."""
+        with self._lock:
+            if digest in self._b64_cache:
+                self._b64_cache.move_to_end(digest)
+                return self._b64_cache[digest]
+        b64_path = self._path(digest, ".b64")
+        if os.path.exists(b64_path):
+            with open(b64_path, "rb") as fh:
+                text = fh.read().decode("ascii")
+        else:
+            text = base64.b64encode(self.get(digest)).decode("ascii")
+            self._write_atomic(b64_path, text.encode("ascii"))
+        self._remember(digest, text)
+        return text
+
+    def iter_base64(self, digest: str, chunk_size: int = 3 * 256 * 1024):
+        """Base64 text for ``digest`` in pieces of about ``chunk_size`` bytes.
+
+        Reads the cached encoding when there is one and otherwise encodes the
+        raw bytes chunk by chunk, so memory stays bounded for any blob size.
+        """
+        chunk_size -= chunk_size % 3  # whole groups, so the pieces concatenate to one encoding
+        with self._lock:
+            text = self._b64_cache.get(digest)
+        if text is not None:
+            for start in range(0, len(text), chunk_size):
+                yield text[start:start + chunk_size]
+            return
+        b64_path = self._path(digest, ".b64")
+        encode = not os.path.exists(b64_path)
+        with open(self.path(digest) if encode else b64_path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                yield base64.b64encode(chunk).decode("ascii") if encode else chunk.decode("ascii")
+
+    def _remember(self, digest: str, text: str):
+        if len(text) > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._b64_cache:
+                return
+            self._b64_cache[digest] = text
+            self._cached_bytes += len(text)
+            while self._cached_bytes > self.cache_bytes:
+                _, old = self._b64_cache.popitem(last=False)
+                self._cached_bytes -= len(old)
@@ -0,0 +1,204 @@
+"""Certified values from raw replicate data (ISO 17034 / ISO Guide 35).
+
+Input is one long table, CSV or Parquet, with a row per measurement:
+
+    analyte   bottle   value    [unit]   [study]            [time]
+    Pb        B01      12.48    ...      homogeneity
+    Pb        B01      12.53    ...      homogeneity
+    Pb        L3       12.51    ...      characterization
+    Pb        B07      12.44    ...      stability          6
+
+``bottle`` groups replicates (a bottle, or a laboratory/method in a
+characterization study).  ``study`` defaults to "homogeneity"; ``time`` is
+only used by stability rows.  Every statistic is computed for all analytes
+at once with grouped sums, so campaigns of hundreds of analytes with
+thousands of replicates each take seconds.
+
+Per analyte:
+
+* certified value: mean of the characterization group means, or of the
+  homogeneity bottle means when there is no characterization study;
+  ``u_char`` is the standard error of that mean;
+* between-bottle homogeneity from a one-way ANOVA:
+  ``s_bb = sqrt((MS_between - MS_within) / n0)``, and ``u_bb`` is the larger
+  of ``s_bb`` and ``u*_bb = sqrt(MS_within / n0) * (2 / ν_within) ** 0.25``,
+  the inhomogeneity the study could have hidden;
+* long-term stability from a linear regression of value on time:
+  ``u_lts = s(slope) * shelf_life``;
+* ``u_c`` combines the three, with effective degrees of freedom from the
+  Welch-Satterthwaite formula, and ``U = k * u_c``.
+
+    python -m drmd.certification campaign.parquet --shelf-life 24
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from drmd.uncertainty import coverage_factor
+
+REQUIRED_COLUMNS = ("analyte", "bottle", "value")
+
+SUMMARY_COLUMNS = [
+    "analyte", "unit", "value", "u_char", "u_bb", "s_bb", "u_bb_min", "u_lts", "u_c", "dof", "k", "U",
+    "bottles", "replicates", "ms_between", "ms_within", "slope",
+]
+
+
+def read_replicates(source, name: str = "") -> pd.DataFrame:
+    """Replicate table from a CSV or Parquet path or file object.
+
+    Column names are matched case-insensitively; a missing ``study`` column
+    means all rows are homogeneity data.
+    """
+    name = name or (source if isinstance(source, str) else getattr(source, "name", ""))
+    if str(name).lower().endswith((".parquet", ".pq")):
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_csv(source)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"replicate data lacks column(s): {', '.join(missing)}")
+    df["analyte"] = df["analyte"].astype(str).str.strip()
+    df["bottle"] = df["bottle"].astype(str).str.strip()
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df["study"] = df["study"].astype(str).str.strip().str.lower() if "study" in df else "homogeneity"
+    if "time" in df:
+        df["time"] = pd.to_numeric(df["time"], errors="coerce")
+    return df.dropna(subset=["value"])
+
+
+def _anova(df: pd.DataFrame) -> pd.DataFrame:
+    """One-way ANOVA of value by bottle, for every analyte at once."""
+    groups = df.groupby(["analyte", "bottle"], sort=False)["value"].agg(["count", "mean", "var"])
+    groups["var"] = groups["var"].fillna(0.0)
+    groups["ss_within"] = groups["var"] * (groups["count"] - 1)
+    per = groups.groupby(level="analyte", sort=False)
+    out = pd.DataFrame({
+        "bottles": per.size(),
+        "replicates": per["count"].sum(),
+        "sum_n2": (groups["count"] ** 2).groupby(level="analyte", sort=False).sum(),
+        "ss_within": per["ss_within"].sum(),
+        "mean_of_means": per["mean"].mean(),
+        "sd_of_means": per["mean"].std(ddof=1),
+    })
+    grand = (groups["count"] * groups["mean"]).groupby(level="analyte", sort=False).sum() / out["replicates"]
+    deviation = groups["mean"] - grand.reindex(groups.index.get_level_values("analyte")).to_numpy()
+    out["ss_between"] = (groups["count"] * deviation ** 2).groupby(level="analyte", sort=False).sum()
+    p, n = out["bottles"], out["replicates"]
+    out["dof_between"] = p - 1
+    out["dof_within"] = n - p
+    out["ms_between"] = out["ss_between"] / out["dof_between"].where(p > 1)
+    out["ms_within"] = out["ss_within"] / out["dof_within"].where(n > p)
+    out["n0"] = (n - out["sum_n2"] / n) / out["dof_between"].where(p > 1)
+    return out
+
+
+def _regression(df: pd.DataFrame) -> pd.DataFrame:
+    """Least-squares slope of value on time and its standard error, per analyte (none without a time column)."""
+    if "time" not in df:
+        return pd.DataFrame(columns=["slope", "s_slope", "dof"], dtype=float)
+    df = df.dropna(subset=["time"])
+    t, x = df["time"], df["value"]
+    by = df["analyte"]
+    dt = t - t.groupby(by).transform("mean")
+    dx = x - x.groupby(by).transform("mean")
+    sums = pd.DataFrame({"sxx": dt * dt, "sxy": dt * dx, "syy": dx * dx, "n": 1}).groupby(by).sum()
+    slope = sums["sxy"] / sums["sxx"].where(sums["sxx"] > 0)
+    residual = (sums["syy"] - slope * sums["sxy"]).clip(lower=0) / (sums["n"] - 2).where(sums["n"] > 2)
+    return pd.DataFrame({"slope": slope, "s_slope": np.sqrt(residual / sums["sxx"]), "dof": sums["n"] - 2})
+
+
+def certify(df: pd.DataFrame, shelf_life: float = 0.0, probability: float = 0.95) -> pd.DataFrame:
+    """Certified value and uncertainty budget per analyte, in ``SUMMARY_COLUMNS`` layout.
+
+    ``shelf_life`` is in the unit of the ``time`` column; with 0 (or without
+    stability data) ``u_lts`` is 0.  The coverage factor is the Student t
+    quantile for ``probability`` at the effective degrees of freedom.
+    """
+    study = df["study"]
+    homogeneity = _anova(df[study == "homogeneity"])
+    characterization = _anova(df[study == "characterization"])
+    stability = _regression(df[study == "stability"])
+    analytes = pd.Index(pd.unique(df["analyte"]), name="analyte")
+    homogeneity = homogeneity.reindex(analytes)
+    characterization = characterization.reindex(analytes)
+    stability = stability.reindex(analytes)
+
+    has_char = characterization["bottles"].fillna(0) > 0
+    value = characterization["mean_of_means"].where(has_char, homogeneity["mean_of_means"])
+    # Standard error of the mean of group means; from the homogeneity ANOVA it is sqrt(MS_between / N).
+    u_char = (characterization["sd_of_means"] / np.sqrt(characterization["bottles"])).where(
+        has_char, np.sqrt(homogeneity["ms_between"] / homogeneity["replicates"]))
+    dof_char = characterization["dof_between"].where(has_char, homogeneity["dof_between"])
+
+    ms_b, ms_w, n0 = homogeneity["ms_between"], homogeneity["ms_within"], homogeneity["n0"]
+    s_bb = np.sqrt((ms_b - ms_w).clip(lower=0) / n0)
+    u_bb_min = np.sqrt(ms_w / n0) * (2 / homogeneity["dof_within"]) ** 0.25
+    u_bb = np.fmax(s_bb, u_bb_min).fillna(0.0)
+
+    u_lts = (stability["s_slope"] * shelf_life).fillna(0.0) if shelf_life else pd.Series(0.0, index=analytes)
+
+    u_char = u_char.fillna(0.0)
+    u_c = np.sqrt(u_char ** 2 + u_bb ** 2 + u_lts ** 2)
+    # Welch-Satterthwaite; components without degrees of freedom count as exact.
+    terms = pd.concat([u_char ** 4 / dof_char.where(dof_char > 0),
+                       u_bb ** 4 / homogeneity["dof_between"].where(homogeneity["dof_between"] > 0),
+                       u_lts ** 4 / stability["dof"].where(stability["dof"] > 0)], axis=1)
+    contributions = terms.sum(axis=1, min_count=1)
+    dof = (u_c ** 4 / contributions.where(contributions > 0)).fillna(np.inf)
+    k = coverage_factor(np.full(len(analytes), probability), dof.to_numpy())
+
+    units = df.groupby("analyte", sort=False)["unit"].first().reindex(analytes).fillna("") \
+        if "unit" in df else pd.Series("", index=analytes)
+    summary = pd.DataFrame({
+        "unit": units.astype(str), "value": value, "u_char": u_char, "u_bb": u_bb, "s_bb": s_bb,
+        "u_bb_min": u_bb_min, "u_lts": u_lts, "u_c": u_c, "dof": dof, "k": k, "U": k * u_c,
+        "bottles": homogeneity["bottles"], "replicates": homogeneity["replicates"],
+        "ms_between": ms_b, "ms_within": ms_w, "slope": stability["slope"],
+    }, index=analytes)
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def to_quantities(summary: pd.DataFrame, probability: float = 0.95) -> pd.DataFrame:
+    """A result ``quantities`` table (editor columns) with one certified value per analyte."""
+    dof = summary["dof"].where(np.isfinite(summary["dof"]))
+    return pd.DataFrame({
+        "Name": summary["analyte"],
+        "Label": "",
+        "Value": summary["value"],
+        "Quantity Kind": "",
+        "Unit": summary["unit"],
+        "Standard Uncertainty": summary["u_c"],
+        "Uncertainty": summary["U"],
+        "Coverage Factor": summary["k"],
+        "Coverage Probability": probability,
+        "Distribution": "normal",
+        "Degrees of Freedom": dof,
+        "Identifier": "",
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Certified values from homogeneity, characterization and stability replicate data.")
+    parser.add_argument("data", help="CSV or Parquet file with analyte, bottle, value[, unit, study, time] columns")
+    parser.add_argument("--shelf-life", type=float, default=0.0, help="in the unit of the time column")
+    parser.add_argument("--probability", type=float, default=0.95)
+    parser.add_argument("--csv", help="write the uncertainty budget to this CSV file")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.data):
+        parser.error(f"no such file: {args.data}")
+    summary = certify(read_replicates(args.data), args.shelf_life, args.probability)
+    if args.csv:
+        summary.to_csv(args.csv, index=False)
+    else:
+        cols = ["analyte", "value", "unit", "u_char", "u_bb", "u_lts", "u_c", "k", "U"]
+        print(summary[cols].to_string(index=False) if len(summary) else "no replicate data")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
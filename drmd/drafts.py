@@ -0,0 +1,205 @@
+"""SQLite-backed draft store with per-section autosave and version history.
+
+A draft is the editable part of the session state, split into sections
+(see ``SECTIONS``).  Each section is pickled and addressed by the SHA-256 of
+its payload.  Saving writes payloads only for sections whose hash changed
+since the last save; a version row then points at one payload per section,
+so unchanged sections are shared between versions.  Resuming reads a handful
+of blobs and unpickles them, with no XML parsing involved.
+
+Every draft has an owner (the signed-in user or a per-browser key, see the
+app); listing, loading, renaming and deleting only see the owner's drafts.
+Drafts saved before owners existed have an empty owner and are not listed.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_DRAFTS_DB = os.environ.get("DRMD_DRAFTS_DB", "./.drmd_drafts.sqlite")
+DEFAULT_KEEP_VERSIONS = 20
+
+# Session-state keys that make up a document, grouped by the tab they belong to.
+SECTIONS = {
+    "admin": ["title_option", "persistent_id_value", "documentIdentifiers", "validity_type",
+              "raw_validity_period", "date_of_issue", "specific_time", "producers", "responsible_persons"],
+    "materials": ["materials"],
+    "properties": ["materialProperties"],
+    "statements": ["official_statements", "custom_statements"],
+    "comments": ["comment", "embedded_files"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    owner TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    head INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    draft_id TEXT NOT NULL REFERENCES drafts(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (draft_id, version)
+);
+CREATE TABLE IF NOT EXISTS version_sections (
+    draft_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES payloads(hash),
+    PRIMARY KEY (draft_id, version, section),
+    FOREIGN KEY (draft_id, version) REFERENCES versions(draft_id, version) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS version_sections_hash ON version_sections(hash);
+"""
+
+
+def section_payloads(state) -> dict:
+    """Pickle every section of ``state``; returns ``{section: (hash, payload)}``."""
+    result = {}
+    for section, keys in SECTIONS.items():
+        payload = pickle.dumps({k: state[k] for k in keys if k in state}, protocol=pickle.HIGHEST_PROTOCOL)
+        result[section] = (hashlib.sha256(payload).hexdigest(), payload)
+    return result
+
+
+class DraftStore:
+    def __init__(self, path: str = DEFAULT_DRAFTS_DB, keep_versions: int = DEFAULT_KEEP_VERSIONS):
+        self.path = path
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        if "owner" not in {row[1] for row in self._conn.execute("PRAGMA table_info(drafts)")}:
+            self._conn.execute("ALTER TABLE drafts ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS drafts_owner ON drafts(owner, updated)")
+
+    def create(self, name: str, owner: str) -> str:
+        if not owner:
+            raise ValueError("A draft needs an owner.")
+        draft_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO drafts (id, name, owner, created, updated) VALUES (?, ?, ?, ?, ?)",
+                               (draft_id, name or "Untitled draft", owner, now, now))
+        return draft_id
+
+    def list(self, owner: str, limit: int = 50):
+        """Most recently updated drafts of ``owner`` as ``(id, name, updated, head)`` tuples."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, name, updated, head FROM drafts WHERE owner = ? AND owner != '' "
+                "ORDER BY updated DESC LIMIT ?", (owner, limit)).fetchall()
+
+    def _owns(self, draft_id: str, owner: str) -> bool:
+        return bool(owner) and self._conn.execute(
+            "SELECT 1 FROM drafts WHERE id = ? AND owner = ?", (draft_id, owner)).fetchone() is not None
+
+    def versions(self, draft_id: str, owner: str):
+        with self._lock:
+            if not self._owns(draft_id, owner):
+                return []
+            return self._conn.execute(
+                "SELECT version, created FROM versions WHERE draft_id = ? ORDER BY version DESC", (draft_id,)).fetchall()
+
+    def save(self, draft_id: str, state, last_hashes: dict | None = None) -> dict | None:
+        """Save the sections of ``state`` that changed since ``last_hashes``.
+
+        Returns the new ``{section: hash}`` map, or None when nothing changed.
+        """
+        sections = section_payloads(state)
+        hashes = {name: h for name, (h, _) in sections.items()}
+        if last_hashes == hashes:
+            return None
+        changed = [(h, payload) for name, (h, payload) in sections.items() if (last_hashes or {}).get(name) != h]
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR IGNORE INTO payloads (hash, data) VALUES (?, ?)", changed)
+                (head,) = conn.execute("SELECT head FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+                version = head + 1
+                conn.execute("INSERT INTO versions (draft_id, version, created) VALUES (?, ?, ?)", (draft_id, version, now))
+                conn.executemany("INSERT INTO version_sections (draft_id, version, section, hash) VALUES (?, ?, ?, ?)",
+                                 [(draft_id, version, name, h) for name, h in hashes.items()])
+                conn.execute("UPDATE drafts SET head = ?, updated = ? WHERE id = ?", (version, now, draft_id))
+                self._prune(draft_id, version)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return hashes
+
+    def _prune(self, draft_id: str, head: int):
+        cutoff = head - self.keep_versions
+        if cutoff <= 0:
+            return
+        dropped = [h for (h,) in self._conn.execute(
+            "SELECT DISTINCT hash FROM version_sections WHERE draft_id = ? AND version <= ?", (draft_id, cutoff))]
+        self._conn.execute("DELETE FROM version_sections WHERE draft_id = ? AND version <= ?", (draft_id, cutoff))
+        self._conn.execute("DELETE FROM versions WHERE draft_id = ? AND version <= ?", (draft_id, cutoff))
+        self._drop_unreferenced(dropped)
+
+    def _drop_unreferenced(self, hashes):
+        self._conn.executemany(
+            "DELETE FROM payloads WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM version_sections WHERE hash = ?)",
+            [(h, h) for h in hashes])
+
+    def load(self, draft_id: str, owner: str, version: int | None = None):
+        """Return ``(state, hashes)`` for a draft version (default: latest); ``(None, None)`` unless ``owner`` owns it."""
+        with self._lock:
+            if not self._owns(draft_id, owner):
+                return None, None
+            if version is None:
+                row = self._conn.execute("SELECT head FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+                if row is None or row[0] == 0:
+                    return None, None
+                version = row[0]
+            rows = self._conn.execute(
+                "SELECT vs.section, vs.hash, p.data FROM version_sections vs JOIN payloads p ON p.hash = vs.hash "
+                "WHERE vs.draft_id = ? AND vs.version = ?", (draft_id, version)).fetchall()
+        if not rows:
+            return None, None
+        state, hashes = {}, {}
+        for section, h, data in rows:
+            state.update(pickle.loads(data))
+            hashes[section] = h
+        return state, hashes
+
+    def rename(self, draft_id: str, name: str, owner: str):
+        with self._lock:
+            self._conn.execute("UPDATE drafts SET name = ? WHERE id = ? AND owner = ? AND owner != ''",
+                               (name, draft_id, owner))
+
+    def delete(self, draft_id: str, owner: str):
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._owns(draft_id, owner):
+                    conn.execute("ROLLBACK")
+                    return False
+                dropped = [h for (h,) in conn.execute(
+                    "SELECT DISTINCT hash FROM version_sections WHERE draft_id = ?", (draft_id,))]
+                conn.execute("DELETE FROM version_sections WHERE draft_id = ?", (draft_id,))
+                conn.execute("DELETE FROM versions WHERE draft_id = ?", (draft_id,))
+                conn.execute("DELETE FROM drafts WHERE id = ?", (draft_id,))
+                self._drop_unreferenced(dropped)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return True
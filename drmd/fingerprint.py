@@ -0,0 +1,308 @@
+"""Canonical fingerprints of certificates, duplicate groups and change detection.
+
+Copies of one certificate often differ only in formatting: pretty-printing,
+attribute order, namespace declarations, line-wrapped base64, a signature
+added later.  ``fingerprint`` reduces a document to a canonical form before
+hashing it:
+
+* whitespace between elements, comments and ``ds:Signature`` are dropped,
+  text is stripped and attachment payloads are compacted;
+* every element is serialized with exclusive C14N (attribute order,
+  namespace declarations and empty-element syntax are normalized).
+
+Fingerprints are a two-level hash tree.  Each child of the root and each of
+their children (``administrativeData/coreData``,
+``materialPropertiesList/materialProperties[2]``) is a section hashed over its
+canonical bytes; a parent hashes its canonical start tag, its children's
+hashes and the text between them (mixed content), and the document
+fingerprint is the root's.  Every byte is canonicalized once, and two
+documents with the same fingerprint have the same canonical form.
+
+``FingerprintIndex`` keeps the fingerprints of a corpus in a JSON file.  A
+scan fingerprints new and modified files in parallel (files whose size and
+modification time are unchanged are not read) and reports each as "new",
+"changed" (with the sections that changed), "reformatted" (same canonical
+form) or "unchanged", so incremental jobs can skip all but the changed
+sections.  ``duplicates`` groups whole documents and sections shared between
+files.
+
+    python -m drmd.fingerprint scan certificates/
+    python -m drmd.fingerprint duplicates --min-bytes 512
+    python -m drmd.fingerprint compare a.xml b.xml
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+DEFAULT_FINGERPRINT_INDEX = os.environ.get("DRMD_FINGERPRINT_INDEX", "./.drmd_fingerprints.json")
+DS_SIGNATURE = "{http://www.w3.org/2000/09/xmldsig#}Signature"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _parser():
+    return etree.XMLParser(remove_blank_text=True, remove_comments=True, remove_pis=True,
+                           resolve_entities=False, no_network=True, huge_tree=True)
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def normalize(root):
+    """Normalize the tree of ``root`` in place (see the module docstring); returns whether it was signed."""
+    signed = False
+    for signature in list(root.iter(DS_SIGNATURE)):
+        signature.getparent().remove(signature)
+        signed = True
+    for elem in root.iter():
+        if not isinstance(elem.tag, str):
+            continue
+        if elem.text is not None:
+            if _local(elem.tag) == "dataBase64":
+                elem.text = _WHITESPACE.sub("", elem.text)
+            elif len(elem):
+                elem.text = elem.text.strip() or None
+            else:
+                elem.text = elem.text.strip()
+        if elem.tail is not None and not elem.tail.strip():
+            elem.tail = None
+    return signed
+
+
+def _c14n(elem) -> bytes:
+    return etree.tostring(elem, method="c14n", exclusive=True, with_comments=False)
+
+
+def _shell(elem) -> bytes:
+    """Canonical start and end tag (and text) of ``elem`` without its children."""
+    shell = etree.Element(elem.tag, attrib=dict(elem.attrib), nsmap=elem.nsmap)
+    shell.text = elem.text
+    return _c14n(shell)
+
+
+def _section_names(parent, prefix: str = "") -> list:
+    """``name`` for a child that is the only one with its tag, ``name[i]`` otherwise."""
+    counts = defaultdict(int)
+    for child in parent:
+        counts[_local(child.tag)] += 1
+    seen, names = defaultdict(int), []
+    for child in parent:
+        name = _local(child.tag)
+        seen[name] += 1
+        names.append(prefix + (name if counts[name] == 1 else f"{name}[{seen[name]}]"))
+    return names
+
+
+def fingerprint(xml_bytes: bytes) -> dict:
+    """``{"sha256", "size", "signed", "sections": {name: [sha256, canonical bytes]}}`` of a document."""
+    root = etree.fromstring(xml_bytes, _parser())
+    signed = normalize(root)
+    sections = {}
+
+    def digest(elem, name, depth):
+        if depth == 2 or not len(elem):
+            data = _c14n(elem)
+            h, size = hashlib.sha256(data).hexdigest(), len(data)
+        else:
+            shell = _shell(elem)
+            hashes, size = [], len(shell)
+            for child, child_name in zip(elem, _section_names(elem, f"{name}/" if name else "")):
+                child_hash, child_size = digest(child, child_name, depth + 1)
+                hashes.append(child_hash)
+                size += child_size
+                if child.tail:
+                    # Mixed content: the text after a child is part of the parent's canonical form.
+                    tail = child.tail.encode("utf-8")
+                    hashes.append("t" + hashlib.sha256(tail).hexdigest())
+                    size += len(tail)
+            h = hashlib.sha256(shell + "".join(hashes).encode("ascii")).hexdigest()
+        if name:
+            sections[name] = [h, size]
+        return h, size
+
+    h, size = digest(root, "", 0)
+    return {"sha256": h, "size": size, "signed": signed, "sections": sections}
+
+
+def changed_sections(old: dict, new: dict) -> list:
+    """Names of the sections added, removed or changed from fingerprint ``old`` to ``new``."""
+    a, b = old.get("sections", {}), new.get("sections", {})
+    return sorted(name for name in a.keys() | b.keys()
+                  if a.get(name, [None])[0] != b.get(name, [None])[0])
+
+
+def _fingerprint_file(path):
+    """Worker: raw hash and fingerprint of one file."""
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        return path, hashlib.sha256(data).hexdigest(), fingerprint(data), None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+class FingerprintIndex:
+    def __init__(self, path: str = DEFAULT_FINGERPRINT_INDEX):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                self.entries = json.load(fh)
+        else:
+            self.entries = {}   # path -> {"size", "mtime_ns", "raw", **fingerprint}
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.entries, fh, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def scan(self, paths, max_workers: int | None = None, prune: bool = False):
+        """Fingerprint new and modified files in parallel.
+
+        Yields ``(path, status, detail)``: status "new", "changed" (detail:
+        the changed section names), "reformatted", "unchanged", "failed"
+        (detail: the error) or, with ``prune``, "removed".
+        """
+        seen, todo = set(), []
+        for path in paths:
+            path = os.path.abspath(path)
+            seen.add(path)
+            stat = os.stat(path)
+            entry = self.entries.get(path)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                yield path, "unchanged", None
+            else:
+                todo.append(path)
+        with self._lock:
+            try:
+                if todo:
+                    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                        for path, raw, fp, error in pool.map(_fingerprint_file, todo, chunksize=8):
+                            if error:
+                                yield path, "failed", error
+                                continue
+                            stat = os.stat(path)
+                            old = self.entries.get(path)
+                            self.entries[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "raw": raw, **fp}
+                            if old is None:
+                                yield path, "new", None
+                            elif old["raw"] == raw:
+                                yield path, "unchanged", None
+                            elif old["sha256"] == fp["sha256"]:
+                                yield path, "reformatted", None
+                            else:
+                                yield path, "changed", changed_sections(old, fp)
+                if prune:
+                    for path in sorted(set(self.entries) - seen):
+                        del self.entries[path]
+                        yield path, "removed", None
+            finally:
+                self._save()
+
+    def duplicates(self, min_bytes: int = 256) -> dict:
+        """Groups of files with equal fingerprints.
+
+        ``{"documents": [[path, ...], ...], "sections": [{"sha256", "size",
+        "occurrences": [[path, section], ...]}, ...]}``.  Section groups span
+        at least two files that are not duplicates of each other as a whole,
+        keep the outermost shared section only, and skip sections smaller
+        than ``min_bytes`` canonical bytes.
+        """
+        documents = defaultdict(list)
+        for path, entry in self.entries.items():
+            documents[entry["sha256"]].append(path)
+        groups = [sorted(paths) for paths in documents.values() if len(paths) > 1]
+        # one representative per duplicate document group
+        representatives = sorted(paths[0] for paths in documents.values())
+        sections = defaultdict(list)
+        for path in representatives:
+            for name, (h, size) in self.entries[path]["sections"].items():
+                if size >= min_bytes:
+                    sections[h].append((path, name, size))
+        shared = {h: occ for h, occ in sections.items() if len({p for p, _, _ in occ}) > 1}
+        outer = {(p, n) for occ in shared.values() for p, n, _ in occ}
+        result = []
+        for h, occ in shared.items():
+            # sections inside a shared section are reported with it
+            occ = [(p, n, size) for p, n, size in occ if (p, n.rpartition("/")[0]) not in outer]
+            if len({p for p, _, _ in occ}) > 1:
+                result.append({"sha256": h, "size": occ[0][2], "occurrences": sorted([p, n] for p, n, _ in occ)})
+        result.sort(key=lambda g: (-g["size"] * len(g["occurrences"]), g["sha256"]))
+        return {"documents": sorted(groups), "sections": result}
+
+
+def _xml_files(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for dirpath, _, files in os.walk(target):
+                yield from (os.path.join(dirpath, f) for f in sorted(files) if f.lower().endswith(".xml"))
+        else:
+            yield target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Canonical fingerprints, duplicates and changes in a corpus of DRMD certificates.")
+    parser.add_argument("--index", default=DEFAULT_FINGERPRINT_INDEX, help="index file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_scan = sub.add_parser("scan", help="fingerprint new and modified files")
+    p_scan.add_argument("paths", nargs="+")
+    p_scan.add_argument("--workers", type=int, default=None)
+    p_scan.add_argument("--prune", action="store_true", help="drop files not listed in this run")
+    p_dup = sub.add_parser("duplicates", help="list duplicate documents and shared sections")
+    p_dup.add_argument("--min-bytes", type=int, default=256, help="smallest section to report")
+    p_dup.add_argument("--json", help="write the groups to this JSON file")
+    p_cmp = sub.add_parser("compare", help="compare two files section by section")
+    p_cmp.add_argument("a")
+    p_cmp.add_argument("b")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        fps = []
+        for path in (args.a, args.b):
+            with open(path, "rb") as fh:
+                fps.append(fingerprint(fh.read()))
+        changed = changed_sections(*fps)
+        print("identical" if fps[0]["sha256"] == fps[1]["sha256"] else "different")
+        for name in changed:
+            print(f"  {name}")
+        return 0 if not changed else 1
+
+    index = FingerprintIndex(args.index)
+    if args.command == "scan":
+        counts = defaultdict(int)
+        for path, status, detail in index.scan(_xml_files(args.paths), args.workers, args.prune):
+            counts[status] += 1
+            if status != "unchanged":
+                print(f"{status:11} {path}" + (f": {detail if isinstance(detail, str) else ', '.join(detail)}" if detail else ""))
+        print(", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "no files")
+        return 1 if counts["failed"] else 0
+
+    groups = index.duplicates(args.min_bytes)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(groups, fh, indent=1)
+    for paths in groups["documents"]:
+        print(f"duplicate documents ({len(paths)}):")
+        for path in paths:
+            print(f"  {path}")
+    for group in groups["sections"]:
+        print(f"shared section, {group['size']:,} bytes, {len(group['occurrences'])} occurrences:")
+        for path, name in group["occurrences"]:
+            print(f"  {path}  {name}")
+    print(f"{len(groups['documents'])} duplicate document groups, {len(groups['sections'])} shared sections")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""Undo/redo history of the document in the session state.
+
+``History.commit`` runs at the end of every rerun, compares the document with
+the one recorded last and, if anything changed, records one step:
+
+* Quantities tables are compared by row label.  A step keeps the changed
+  cells (column by column: labels, old and new values), the removed rows and
+  the added rows with their positions, so "Apply to All Rows" costs three
+  columns and deleting a row costs that row, not a copy of the table.  A
+  table whose columns changed, or that was added or removed, is kept whole.
+* The rest of the document is split into chunks: the draft sections
+  (``drmd.drafts.SECTIONS``) and one chunk per property set, with its tables
+  pickled as references.  Chunks are pickled and interned by SHA-256, and a
+  step refers to the hashes before and after, so every snapshot shares the
+  chunks that did not change with the others and only changed chunks take
+  new memory.
+
+``undo`` and ``redo`` write the restored values back into the state; inputs
+that mirror those values keep their own widget state, which the caller drops.
+"""
+import hashlib
+import io
+import pickle
+import warnings
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from drmd.drafts import SECTIONS
+
+DEFAULT_STEPS = 50
+PROPERTIES = "properties"  # the drafts section holding materialProperties
+
+
+@dataclass
+class TableDelta:
+    """Change of one quantities table between two steps."""
+    before: pd.DataFrame | None = None   # whole table, when kept whole
+    after: pd.DataFrame | None = None
+    whole: bool = False
+    cells: dict = field(default_factory=dict)     # column -> (labels, old values, new values)
+    removed: pd.DataFrame | None = None           # rows of the old table, with ...
+    removed_at: np.ndarray | None = None          # ... their positions in it
+    added: pd.DataFrame | None = None
+    added_at: np.ndarray | None = None
+    dtypes: tuple = ({}, {})                      # column -> dtype, before and after
+
+    def apply(self, table: pd.DataFrame | None, backward: bool = False) -> pd.DataFrame | None:
+        """The table after (``backward``: before) this change, given the one before (after) it."""
+        if self.whole:
+            return self.before if backward else self.after
+        drop, insert, insert_at = ((self.added, self.removed, self.removed_at) if backward
+                                   else (self.removed, self.added, self.added_at))
+        out = table.drop(index=drop.index)
+        for col, (labels, old, new) in self.cells.items():
+            values = out[col].astype(object)
+            values.loc[labels] = old if backward else new
+            out[col] = values
+        if len(insert):
+            order = list(out.index)
+            for label, pos in zip(insert.index, insert_at):
+                order.insert(pos, label)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                out = pd.concat([out, insert]).loc[order]
+        for col, dtype in self.dtypes[0 if backward else 1].items():
+            if out[col].dtype != dtype:
+                try:
+                    out[col] = out[col].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return out
+
+    def nbytes(self) -> int:
+        if self.whole:
+            return sum(int(t.memory_usage(deep=True).sum()) for t in (self.before, self.after) if t is not None)
+        size = sum(int(t.memory_usage(deep=True).sum()) for t in (self.removed, self.added))
+        return size + sum(labels.nbytes + old.nbytes + new.nbytes for labels, old, new in self.cells.values())
+
+
+def diff_tables(old: pd.DataFrame | None, new: pd.DataFrame | None) -> TableDelta | None:
+    """Delta from ``old`` to ``new`` (None: table absent), or None when they are equal."""
+    if old is None or new is None:
+        return TableDelta(before=old, after=new, whole=True)
+    if old.equals(new) and old.index.equals(new.index):
+        return None
+    if (list(old.columns) != list(new.columns) or not old.index.is_unique or not new.index.is_unique):
+        return TableDelta(before=old, after=new, whole=True)
+    removed = ~old.index.isin(new.index)
+    added = ~new.index.isin(old.index)
+    kept_old, kept_new = old[~removed], new[~added]
+    if not kept_old.index.equals(kept_new.index):  # rows reordered
+        return TableDelta(before=old, after=new, whole=True)
+    a, b = kept_old.to_numpy(dtype=object), kept_new.to_numpy(dtype=object)
+    changed = ~((a == b) | (pd.isna(a) & pd.isna(b)))
+    cells = {}
+    for j in np.flatnonzero(changed.any(axis=0)):
+        rows = np.flatnonzero(changed[:, j])
+        cells[old.columns[j]] = (kept_old.index[rows].to_numpy(), a[rows, j], b[rows, j])
+    if not cells and not removed.any() and not added.any() and old.dtypes.equals(new.dtypes):
+        return None
+    return TableDelta(cells=cells, removed=old[removed], removed_at=np.flatnonzero(removed),
+                      added=new[added], added_at=np.flatnonzero(added),
+                      dtypes=(old.dtypes.to_dict(), new.dtypes.to_dict()))
+
+
+def _tables(state) -> dict:
+    """``{"<property set uuid>/<result index>": quantities}`` of the document in ``state``."""
+    tables = {}
+    for mp in state.get("materialProperties", []) or []:
+        for res_idx, result in enumerate(mp.get("results", [])):
+            if isinstance(result.get("quantities"), pd.DataFrame):
+                tables[f"{mp.get('uuid')}/{res_idx}"] = result["quantities"]
+    return tables
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, buf, refs):
+        super().__init__(buf, protocol=pickle.HIGHEST_PROTOCOL)
+        self.refs = refs
+
+    def persistent_id(self, obj):
+        return self.refs.get(id(obj)) if isinstance(obj, pd.DataFrame) else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, data, tables):
+        super().__init__(io.BytesIO(data))
+        self.tables = tables
+
+    def persistent_load(self, pid):
+        return self.tables[pid].copy()
+
+
+@dataclass
+class Step:
+    chunks: dict   # chunk -> (hash before, hash after); None where the chunk did not exist
+    tables: dict   # table key -> TableDelta
+
+
+class History:
+    def __init__(self, steps: int = DEFAULT_STEPS):
+        self.steps = steps
+        self.undo_steps = []
+        self.redo_steps = []
+        self._chunks = None   # chunk -> hash of the document recorded last
+        self._tables = {}     # table key -> table of the document recorded last (never mutated)
+        self._blobs = {}      # hash -> [payload, references]
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_steps)
+
+    def nbytes(self) -> int:
+        """Memory held for undo and redo: chunk payloads and table deltas."""
+        return (sum(len(payload) for payload, _ in self._blobs.values())
+                + sum(d.nbytes() for s in self.undo_steps + self.redo_steps for d in s.tables.values()))
+
+    # -- chunks ------------------------------------------------------------------
+    def _payloads(self, state, tables) -> dict:
+        refs = {id(t): key for key, t in tables.items()}
+        chunks = {}
+        for section, keys in SECTIONS.items():
+            if section == PROPERTIES:
+                mps = state.get("materialProperties", []) or []
+                chunks[PROPERTIES] = [mp.get("uuid") for mp in mps]
+                for mp in mps:
+                    chunks[f"{PROPERTIES}/{mp.get('uuid')}"] = mp
+            else:
+                chunks[section] = {k: state[k] for k in keys if k in state}
+        payloads = {}
+        for name, value in chunks.items():
+            buf = io.BytesIO()
+            _Pickler(buf, refs).dump(value)
+            payload = buf.getvalue()
+            payloads[name] = (hashlib.sha256(payload).hexdigest(), payload)
+        return payloads
+
+    def _ref(self, h, payload=None):
+        if h is None:
+            return
+        if h in self._blobs:
+            self._blobs[h][1] += 1
+        else:
+            self._blobs[h] = [payload, 1]
+
+    def _unref(self, h):
+        if h is not None:
+            self._blobs[h][1] -= 1
+            if not self._blobs[h][1]:
+                del self._blobs[h]
+
+    def _release(self, step: Step):
+        for before, after in step.chunks.values():
+            self._unref(before)
+            self._unref(after)
+
+    def _set_chunks(self, chunks: dict, payloads: dict | None = None):
+        """Make ``chunks`` the recorded document; its payloads stay interned while it is."""
+        for name, h in chunks.items():
+            self._ref(h, payloads[name][1] if payloads else None)
+        for h in (self._chunks or {}).values():
+            self._unref(h)
+        self._chunks = chunks
+
+    # -- recording ---------------------------------------------------------------
+    def commit(self, state) -> bool:
+        """Record the changes of the document in ``state`` since the last commit as a step."""
+        tables = _tables(state)
+        payloads = self._payloads(state, tables)
+        if self._chunks is None:
+            self._set_chunks({name: h for name, (h, _) in payloads.items()}, payloads)
+            self._tables = {key: t.copy() for key, t in tables.items()}
+            return False
+        chunks = {}
+        for name in payloads.keys() | self._chunks.keys():
+            before, after = self._chunks.get(name), payloads.get(name, (None,))[0]
+            if before != after:
+                chunks[name] = (before, after)
+        deltas = {}
+        for key in tables.keys() | self._tables.keys():
+            delta = diff_tables(self._tables.get(key), tables.get(key))
+            if delta is not None:
+                deltas[key] = delta
+        if not chunks and not deltas:
+            return False
+        for step in self.redo_steps:
+            self._release(step)
+        self.redo_steps = []
+        for name, (before, after) in chunks.items():
+            self._ref(before)
+            self._ref(after, payloads[name][1] if after else None)
+        self._set_chunks({name: h for name, (h, _) in payloads.items()}, payloads)
+        self.undo_steps.append(Step(chunks, deltas))
+        while len(self.undo_steps) > self.steps:
+            self._release(self.undo_steps.pop(0))
+        for key, delta in deltas.items():
+            if delta.after is not None or not delta.whole:
+                self._tables[key] = tables[key].copy()
+                if delta.whole:
+                    delta.after = self._tables[key]   # shared with the recorded table
+            else:
+                del self._tables[key]
+        return True
+
+    # -- restoring ---------------------------------------------------------------
+    def undo(self, state) -> bool:
+        self.commit(state)
+        if not self.undo_steps:
+            return False
+        step = self.undo_steps.pop()
+        self._restore(state, step, backward=True)
+        self.redo_steps.append(step)
+        return True
+
+    def redo(self, state) -> bool:
+        self.commit(state)
+        if not self.redo_steps:
+            return False
+        step = self.redo_steps.pop()
+        self._restore(state, step, backward=False)
+        self.undo_steps.append(step)
+        return True
+
+    def _restore(self, state, step: Step, backward: bool):
+        for key, delta in step.tables.items():
+            table = delta.apply(self._tables.get(key), backward)
+            if table is None:
+                self._tables.pop(key, None)
+            else:
+                self._tables[key] = table
+        chunks = dict(self._chunks)
+        for name, (before, after) in step.chunks.items():
+            chunks[name] = before if backward else after
+            if chunks[name] is None:
+                del chunks[name]
+        self._set_chunks(chunks)
+
+        def load(name):
+            return _Unpickler(self._blobs[self._chunks[name]][0], self._tables).load()
+
+        for section, keys in SECTIONS.items():
+            if section != PROPERTIES and section in step.chunks:
+                values = load(section)
+                for k in keys:
+                    if k in values:
+                        state[k] = values[k]
+                    elif k in state:
+                        del state[k]
+        properties = {name for name in step.chunks if name.split("/")[0] == PROPERTIES}
+        current = {mp.get("uuid"): mp for mp in state.get("materialProperties", []) or []}
+        if properties:
+            order = load(PROPERTIES) if PROPERTIES in step.chunks else list(current)
+            state["materialProperties"] = [
+                load(f"{PROPERTIES}/{u}") if f"{PROPERTIES}/{u}" in properties or u not in current else current[u]
+                for u in order]
+            current = {mp.get("uuid"): mp for mp in state["materialProperties"]}
+        # Tables of property sets that were not reloaded above
+        for key in step.tables:
+            uuid, res_idx = key.rsplit("/", 1)
+            mp = current.get(uuid)
+            if mp is None or f"{PROPERTIES}/{uuid}" in properties or key not in self._tables:
+                continue
+            results = mp.get("results", [])
+            if int(res_idx) < len(results):
+                results[int(res_idx)]["quantities"] = self._tables[key].copy()
@@ -0,0 +1,202 @@
+"""Document-wide index of identifiers and XML ids.
+
+Identifier lists live in many places: ``documentIdentifiers``, each
+producer's ``organizationIdentifiers``, each material's
+``materialIdentifiers`` and one list per row of every result table.  The
+index maps every (scheme, value) pair and every ``id`` to the places it
+occurs, and keeps the problem sets (pairs used twice, pairs whose links
+disagree, ids defined twice, ``refId`` entries without a target) up to
+date as lists are replaced.  Replacing a list costs time proportional to
+that list, so editing one row of a table with tens of thousands of
+identifiers does not rescan the document.
+
+A slot names the owner of one identifier list::
+
+    ("document",)                           documentIdentifiers
+    ("producer", index)                     organizationIdentifiers
+    ("material", uuid)                      materialIdentifiers
+    ("property", mp_uuid, result, row)      result["identifiers"][row]
+
+Elements that carry ``id``/``refId`` attributes but no list use
+``("propertySet", mp_uuid)`` and ``("result", mp_uuid, result)``.
+The location of one entry is its slot plus its position in the list.
+"""
+from collections import Counter
+from typing import NamedTuple
+
+
+class Finding(NamedTuple):
+    kind: str  # "duplicate", "conflict", "duplicate id" or "dangling refId"
+    subject: str
+    locations: tuple
+
+
+def _key(ident):
+    value = (ident.get("value") or "").strip()
+    if not value:
+        return None
+    return (ident.get("scheme") or "").strip().casefold(), value
+
+
+def _entry(ident):
+    refs = tuple((ident.get("refId") or "").split())
+    return _key(ident), (ident.get("link") or "").strip(), (ident.get("id") or "").strip(), refs
+
+
+class IdentifierIndex:
+    def __init__(self):
+        self._slots = {}            # slot -> tuple of entries
+        self._pairs = {}            # (scheme, value) -> {location: link}
+        self._links = {}            # (scheme, value) -> Counter of non-empty links
+        self._defs = {}             # id -> set of locations
+        self._refs = {}             # referenced id -> set of locations
+        self.duplicates = set()     # pairs used more than once
+        self.conflicts = set()      # pairs with more than one distinct link
+        self.duplicate_ids = set()  # ids defined more than once
+        self.dangling = set()       # referenced ids that are not defined
+
+    @classmethod
+    def from_state(cls, state) -> "IdentifierIndex":
+        index = cls()
+        index.set_identifiers(("document",), state.get("documentIdentifiers", []))
+        for p, prod in enumerate(state.get("producers", [])):
+            index.set_identifiers(("producer", p), prod.get("organizationIdentifiers", []))
+        for mat in state.get("materials", []):
+            index.set_identifiers(("material", mat.get("uuid")), mat.get("materialIdentifiers", []))
+        for mp in state.get("materialProperties", []):
+            mp_uuid = mp.get("uuid")
+            index.set_element(("propertySet", mp_uuid), mp)
+            for r, res in enumerate(mp.get("results", [])):
+                index.set_element(("result", mp_uuid, r), res)
+                for row, ids in enumerate(res.get("identifiers", [])):
+                    index.set_identifiers(("property", mp_uuid, r, row), ids)
+        return index
+
+    def __len__(self):
+        return sum(len(locations) for locations in self._pairs.values())
+
+    # -- updates -------------------------------------------------------------
+    def set_identifiers(self, slot, id_list):
+        """Replace the identifiers held by ``slot``; a no-op when nothing changed."""
+        self._replace(slot, tuple(_entry(ident) for ident in id_list or []))
+
+    def set_element(self, slot, element):
+        """Record the ``id``/``refId`` attributes of a non-identifier element."""
+        entry = (None, "", (element.get("id") or "").strip(), tuple((element.get("refId") or "").split()))
+        self._replace(slot, (entry,) if entry[2] or entry[3] else ())
+
+    def drop(self, slot):
+        self._replace(slot, ())
+
+    def _replace(self, slot, entries):
+        old = self._slots.get(slot, ())
+        if old == entries:
+            return
+        for pos, entry in enumerate(old):
+            self._remove(slot + (pos,), entry)
+        for pos, entry in enumerate(entries):
+            self._add(slot + (pos,), entry)
+        if entries:
+            self._slots[slot] = entries
+        else:
+            self._slots.pop(slot, None)
+
+    def _add(self, location, entry):
+        key, link, id_, refs = entry
+        if key is not None:
+            self._pairs.setdefault(key, {})[location] = link
+            if link:
+                self._links.setdefault(key, Counter())[link] += 1
+            self._check_pair(key)
+        if id_:
+            self._defs.setdefault(id_, set()).add(location)
+            self._check_id(id_)
+        for ref in refs:
+            self._refs.setdefault(ref, set()).add(location)
+            self._check_id(ref)
+
+    def _remove(self, location, entry):
+        key, link, id_, refs = entry
+        if key is not None:
+            locations = self._pairs[key]
+            del locations[location]
+            if not locations:
+                del self._pairs[key]
+            if link:
+                links = self._links[key]
+                links[link] -= 1
+                if not links[link]:
+                    del links[link]
+                if not links:
+                    del self._links[key]
+            self._check_pair(key)
+        if id_:
+            self._discard(self._defs, id_, location)
+            self._check_id(id_)
+        for ref in refs:
+            self._discard(self._refs, ref, location)
+            self._check_id(ref)
+
+    @staticmethod
+    def _discard(mapping, name, location):
+        locations = mapping[name]
+        locations.discard(location)
+        if not locations:
+            del mapping[name]
+
+    def _check_pair(self, key):
+        _toggle(self.duplicates, key, len(self._pairs.get(key, ())) > 1)
+        _toggle(self.conflicts, key, len(self._links.get(key, ())) > 1)
+
+    def _check_id(self, id_):
+        defined = len(self._defs.get(id_, ()))
+        _toggle(self.duplicate_ids, id_, defined > 1)
+        _toggle(self.dangling, id_, defined == 0 and id_ in self._refs)
+
+    # -- queries -------------------------------------------------------------
+    def locations(self, scheme: str, value: str):
+        """Locations of a (scheme, value) pair."""
+        return tuple(self._pairs.get(_key({"scheme": scheme, "value": value}), ()))
+
+    def resolve(self, id_: str):
+        return tuple(self._defs.get(id_, ()))
+
+    def findings(self):
+        """Current problems, cheapest to compute when there are few."""
+        result = []
+        for key in sorted(self.duplicates):
+            result.append(Finding("duplicate", f"{key[0]}: {key[1]}", tuple(self._pairs[key])))
+        for key in sorted(self.conflicts):
+            links = ", ".join(sorted(self._links[key]))
+            result.append(Finding("conflict", f"{key[0]}: {key[1]} → {links}", tuple(self._pairs[key])))
+        for id_ in sorted(self.duplicate_ids):
+            result.append(Finding("duplicate id", id_, tuple(self._defs[id_])))
+        for id_ in sorted(self.dangling):
+            result.append(Finding("dangling refId", id_, tuple(self._refs[id_])))
+        return result
+
+
+def _toggle(problems, item, present):
+    if present:
+        problems.add(item)
+    else:
+        problems.discard(item)
+
+
+def describe(location, state) -> str:
+    """Human-readable label of an index location, numbered as in the editor tabs."""
+    kind = location[0]
+    if kind == "document":
+        return f"Document identifier {location[1] + 1}"
+    if kind == "producer":
+        return f"Producer {location[1] + 1}, identifier {location[2] + 1}"
+    if kind == "material":
+        n = next((i for i, m in enumerate(state.get("materials", [])) if m.get("uuid") == location[1]), -1)
+        return f"Material {n + 1}, identifier {location[2] + 1}"
+    n = next((i for i, mp in enumerate(state.get("materialProperties", [])) if mp.get("uuid") == location[1]), -1)
+    label = f"Properties Set {n + 1}"
+    if kind == "result":
+        label += f", Table {location[2] + 1}"
+    elif kind == "property":
+        label += f", Table {location[2] + 1}, row {location[3] + 1}, identifier {location[4] + 1}"
+    return label
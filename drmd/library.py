@@ -0,0 +1,230 @@
+"""Indexed library of issued certificates.
+
+Each certificate is parsed once on ingest.  The parsed model (the same
+dictionary ``parse_drmd`` returns) is stored pickled next to a SQLite FTS5
+index over material names, property names, identifiers, producers and
+statement text.  Searching is a single FTS query, and opening a hit as a
+template unpickles the stored model instead of parsing XML again.
+
+Index a directory from the command line::
+
+    python -m drmd.library index certificates/
+    python -m drmd.library search "lead soil"
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from drmd.blobstore import BlobStore
+from drmd.model import parse_drmd
+
+DEFAULT_LIBRARY_DB = os.environ.get("DRMD_LIBRARY_DB", "./.drmd_library.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    sha256 TEXT NOT NULL,
+    title TEXT,
+    unique_identifier TEXT,
+    materials TEXT,
+    indexed REAL NOT NULL,
+    model BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS certificates_fts USING fts5(
+    materials, properties, identifiers, producers, statements,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _ids(id_list):
+    return " ".join(f"{i.get('scheme', '')} {i.get('value', '')}" for i in id_list or [])
+
+
+def search_fields(state) -> dict:
+    """Text of the indexed columns for one parsed certificate."""
+    materials = [f"{m.get('name', '')} {m.get('description', '')}" for m in state.get("materials", [])]
+    properties, identifiers = [], [_ids(state.get("documentIdentifiers"))]
+    for m in state.get("materials", []):
+        identifiers.append(_ids(m.get("materialIdentifiers")))
+    for mp in state.get("materialProperties", []):
+        properties.append(mp.get("name", ""))
+        for res in mp.get("results", []):
+            properties.append(res.get("result_name", ""))
+            quantities = res.get("quantities")
+            if quantities is not None and "Name" in quantities:
+                properties.extend(str(n) for n in quantities["Name"].dropna())
+            for row_ids in res.get("identifiers", []):
+                identifiers.append(_ids(row_ids))
+    producers = []
+    for p in state.get("producers", []):
+        producers.append(f"{p.get('producerName', '')} {p.get('producerCity', '')} {p.get('producerCountryCode', '')}")
+        identifiers.append(_ids(p.get("organizationIdentifiers")))
+    statements = [s.get("content", "") for s in state.get("official_statements", {}).values()]
+    statements += [f"{s.get('name', '')} {s.get('content', '')}" for s in state.get("custom_statements", [])]
+    return {
+        "materials": " · ".join(materials),
+        "properties": " · ".join(properties),
+        "identifiers": " · ".join(i for i in identifiers if i.strip()),
+        "producers": " · ".join(producers),
+        "statements": " · ".join(s for s in statements if s),
+    }
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _parse_file(path):
+    """Worker: read and parse one file; returns the row to insert or an error."""
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        state = parse_drmd(data, BlobStore())
+        return path, hashlib.sha256(data).hexdigest(), state, None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+class Library:
+    def __init__(self, path: str = DEFAULT_LIBRARY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM certificates").fetchone()[0]
+
+    def known_hashes(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT path, sha256 FROM certificates"))
+
+    def add(self, path: str, sha256: str, state: dict):
+        """Insert or replace one parsed certificate."""
+        fields = search_fields(state)
+        model = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        materials = ", ".join(m.get("name", "") for m in state.get("materials", []) if m.get("name"))
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id FROM certificates WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM certificates_fts WHERE rowid = ?", row)
+                    conn.execute("DELETE FROM certificates WHERE id = ?", row)
+                cur = conn.execute(
+                    "INSERT INTO certificates (path, sha256, title, unique_identifier, materials, indexed, model) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, sha256, state.get("title_option", ""), state.get("persistent_id_value", ""),
+                     materials, time.time(), model))
+                conn.execute(
+                    "INSERT INTO certificates_fts (rowid, materials, properties, identifiers, producers, statements) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cur.lastrowid, fields["materials"], fields["properties"], fields["identifiers"],
+                     fields["producers"], fields["statements"]))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def add_bytes(self, name: str, xml_bytes: bytes, blob_store=None):
+        self.add(name, hashlib.sha256(xml_bytes).hexdigest(), parse_drmd(xml_bytes, blob_store))
+
+    def index_paths(self, paths, max_workers: int | None = None):
+        """Parse and index files in parallel, skipping files whose hash is unchanged.
+
+        Yields ``(path, status, error)`` with status "indexed", "unchanged" or "failed".
+        """
+        known = self.known_hashes()
+        todo = []
+        for path in paths:
+            path = os.path.abspath(path)
+            with open(path, "rb") as fh:
+                if known.get(path) == hashlib.sha256(fh.read()).hexdigest():
+                    yield path, "unchanged", None
+                    continue
+            todo.append(path)
+        if not todo:
+            return
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for path, sha256, state, error in pool.map(_parse_file, todo, chunksize=4):
+                if error:
+                    yield path, "failed", error
+                else:
+                    self.add(path, sha256, state)
+                    yield path, "indexed", None
+
+    def search(self, text: str, limit: int = 20):
+        """Best matches as ``(id, path, title, unique_identifier, materials, snippet)``."""
+        query = fts_query(text)
+        if not query:
+            return []
+        with self._lock:
+            return self._conn.execute(
+                "SELECT c.id, c.path, c.title, c.unique_identifier, c.materials, "
+                "snippet(certificates_fts, -1, '**', '**', ' … ', 8) "
+                "FROM certificates_fts JOIN certificates c ON c.id = certificates_fts.rowid "
+                "WHERE certificates_fts MATCH ? ORDER BY bm25(certificates_fts) LIMIT ?",
+                (query, limit)).fetchall()
+
+    def load_model(self, cert_id: int) -> dict:
+        """The pre-parsed model of a certificate, ready to put into session state."""
+        with self._lock:
+            (blob,) = self._conn.execute("SELECT model FROM certificates WHERE id = ?", (cert_id,)).fetchone()
+        return pickle.loads(zlib.decompress(blob))
+
+    def remove(self, cert_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM certificates_fts WHERE rowid = ?", (cert_id,))
+            self._conn.execute("DELETE FROM certificates WHERE id = ?", (cert_id,))
+
+
+def _xml_files(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for dirpath, _, files in os.walk(target):
+                yield from (os.path.join(dirpath, f) for f in sorted(files) if f.lower().endswith(".xml"))
+        else:
+            yield target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search the local DRMD certificate library.")
+    parser.add_argument("--db", default=DEFAULT_LIBRARY_DB, help="library database (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_index = sub.add_parser("index", help="add XML files or directories to the library")
+    p_index.add_argument("paths", nargs="+")
+    p_index.add_argument("--workers", type=int, default=None)
+    p_search = sub.add_parser("search", help="full-text search")
+    p_search.add_argument("query")
+    p_search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    library = Library(args.db)
+    if args.command == "index":
+        failed = 0
+        for path, status, error in library.index_paths(_xml_files(args.paths), args.workers):
+            failed += status == "failed"
+            print(f"{status:9} {path}" + (f": {error}" if error else ""))
+        return 1 if failed else 0
+    for cert_id, path, title, uid, materials, snippet in library.search(args.query, args.limit):
+        print(f"[{cert_id}] {path}  {uid}  {materials}\n      {snippet}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
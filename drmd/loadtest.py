@@ -0,0 +1,280 @@
+"""Load test: simulated editors working concurrently in one app process.
+
+A Streamlit server runs every session's script in its own thread of one
+process, so N editors share one interpreter (and its GIL) and every
+interaction reruns the whole of ``app.py``.  This harness reproduces that
+with Streamlit's in-process testing API: each simulated session is an
+``AppTest`` driven from its own thread through a realistic scenario,
+
+1. ``load``        upload a large certificate through the sidebar uploader,
+2. ``edit``        change a value in every quantities table,
+3. ``identifier``  add a document identifier and type its value,
+4. ``export``      press Generate XML,
+
+and every rerun is timed.  With ``Sections`` navigation each step first
+selects its section, a rerun of its own reported as ``navigate`` (switching
+tabs happens in the browser and costs nothing).  The data editor cannot be driven by ``AppTest``,
+so ``edit`` changes the table in session state, which is what the editor
+does before the rerun it triggers.  ``AppTest`` installs a mock runtime for
+each run and removes it when the run ends, which would pull it from under
+the runs of other threads, and compiles the script again for every run;
+``shared_runtime`` keeps one runtime and one script cache in place for all
+sessions, as a server does.
+
+For each navigation mode and concurrency level the report gives rerun
+latency percentiles per step, throughput (reruns per second over all sessions), the resident memory
+of the process before and after the level, and the number of script errors.
+Run it against a warmed process (the document is exported once up front)
+and compare reports between versions to catch regressions:
+
+    python -m drmd.loadtest --sessions 1,2,4,8 --rows 2000 --csv load.csv
+    python -m drmd.loadtest --sessions 4 --max-p95 2.5      # exit 1 if slower
+    python -m drmd.loadtest --sessions 1,4 --navigation Tabs,Sections
+"""
+import argparse
+import contextlib
+import itertools
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import warnings
+
+import pandas as pd
+
+from drmd.model import parse_drmd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_APP = os.path.join(ROOT, "app.py")
+STEPS = ("load", "navigate", "edit", "identifier", "export")
+NAVIGATION_MODES = ("Tabs", "Sections")
+REPORT_COLUMNS = ["navigation", "sessions", "step", "reruns", "p50", "p90", "p95", "p99", "max",
+                  "throughput", "rss_before_mb", "rss_after_mb", "errors"]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB (peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+@contextlib.contextmanager
+def shared_runtime():
+    """One mock runtime and script cache for all concurrent ``AppTest`` runs; their own install/remove goes to a stand-in."""
+    from unittest import mock
+
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    registry = BidiComponentManager()
+    registry.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = registry
+    stand_in = type("Runtime", (), {"_instance": None})
+    script_cache = ScriptCache()
+    with mock.patch.object(app_test, "Runtime", stand_in), mock.patch.object(Runtime, "_instance", runtime), \
+            mock.patch.object(app_test, "ScriptCache", lambda: script_cache), \
+            mock.patch.object(local_script_runner, "ScriptCache", lambda: script_cache):
+        yield runtime
+
+
+def _app_test(app: str):
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(app, default_timeout=600)
+
+
+def synthetic_document(app: str = DEFAULT_APP, rows: int = 1000, properties: int = 4, seed: int = 0) -> bytes:
+    """Export of a certificate with ``properties`` property sets of ``rows`` quantities, made by the app itself."""
+    rng = random.Random(seed)
+    at = _app_test(app)
+    at.run()
+    mps = []
+    for p in range(properties):
+        q = pd.DataFrame({
+            "Name": [f"Analyte {p}-{i}" for i in range(rows)],
+            "Label": "",
+            "Value": [round(rng.uniform(0.1, 100.0), 4) for _ in range(rows)],
+            "Quantity Kind": "MassFraction",
+            "Unit": "\\milli\\gram\\per\\kilogram",
+            "Uncertainty": [round(rng.uniform(0.01, 1.0), 4) for _ in range(rows)],
+            "Coverage Factor": 2.0,
+            "Coverage Probability": 0.95,
+            "Distribution": "normal",
+            "Identifier": [f"q-{p}-{i}" for i in range(rows)],
+        })
+        mps.append({"uuid": f"mp{p}", "id": f"mp{p}", "name": f"Property set {p}", "description": "", "procedures": "",
+                    "isCertified": True, "results": [{"result_name": "Certified values", "description": "", "quantities": q,
+                                                      "identifiers": [[{"scheme": "ID", "value": f"q-{p}-{i}", "link": ""}]
+                                                                      for i in range(rows)]}]})
+    at.session_state["materialProperties"] = mps
+    at.session_state["persistent_id_value"] = "load-test"
+    at.run()
+    at.button(key="generate_xml").click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at.session_state["export_result"]["xml"].encode("utf-8")
+
+
+class Session:
+    """One simulated editor; ``timings`` collects ``(step, seconds)`` per rerun."""
+
+    def __init__(self, app: str, document: bytes, seed: int = 0, navigation: str = "Tabs"):
+        self.at = _app_test(app)
+        self.at.session_state["ui_navigation"] = navigation
+        self.navigation = navigation
+        self.document = document
+        self.rng = random.Random(seed)
+        self.timings = []
+        self.errors = []
+
+    def _run(self, step: str, element=None):
+        start = time.perf_counter()
+        (element or self.at).run()
+        self.timings.append((step, time.perf_counter() - start))
+        if self.at.exception:
+            self.errors.append(f"{step}: {self.at.exception[0].message}")
+
+    def load(self):
+        self._run("load")
+        uploader = next(u for u in self.at.sidebar.file_uploader if u.key == "xml_template")
+        uploader.set_value(("certificate.xml", self.document, "application/xml"))
+        self._run("load", uploader)
+
+    def goto(self, section: str):
+        if self.navigation == "Sections" and self.at.radio(key="active_section").value != section:
+            self._run("navigate", self.at.radio(key="active_section").set_value(section))
+
+    def edit(self):
+        self.goto("Properties")
+        for mp in self.at.session_state["materialProperties"]:
+            for result in mp.get("results", []):
+                q = result.get("quantities")
+                if q is not None and len(q):
+                    row = self.rng.randrange(len(q))
+                    q.at[q.index[row], "Value"] = round(self.rng.uniform(0.1, 100.0), 4)
+        self._run("edit")
+
+    def identifier(self):
+        self.goto("Administrative Data")
+        n = len(self.at.session_state["documentIdentifiers"])
+        self._run("identifier", self.at.button(key="add_doc_id").click())
+        self._run("identifier", self.at.text_input(key=f"doc_value_{n}").input(f"LT-{self.rng.randrange(10 ** 6)}"))
+
+    def export(self):
+        self.goto("Validate & Export")
+        self._run("export", self.at.button(key="generate_xml").click())
+
+    def scenario(self, iterations: int = 1):
+        self.load()
+        for _ in range(iterations):
+            self.edit()
+            self.identifier()
+            self.export()
+
+
+def _percentile(values, q):
+    return float(pd.Series(values).quantile(q)) if values else float("nan")
+
+
+def run_level(app: str, document: bytes, sessions: int, iterations: int = 1, navigation: str = "Tabs") -> list:
+    """Run ``sessions`` scenarios at once; one report row per step plus an "all" row."""
+    simulated = [Session(app, document, seed=i, navigation=navigation) for i in range(sessions)]
+    barrier = threading.Barrier(sessions)
+
+    def work(session):
+        barrier.wait()
+        try:
+            session.scenario(iterations)
+        except Exception as e:
+            session.errors.append(f"{type(e).__name__}: {e}")
+
+    before = rss_mb()
+    threads = [threading.Thread(target=work, args=(s,), name=f"session-{i}") for i, s in enumerate(simulated)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    after = rss_mb()
+
+    timings = [t for s in simulated for t in s.timings]
+    errors = sum(len(s.errors) for s in simulated)
+    rows = []
+    for step in STEPS + ("all",):
+        values = [sec for name, sec in timings if step in ("all", name)]
+        rows.append({
+            "navigation": navigation, "sessions": sessions, "step": step, "reruns": len(values),
+            "p50": _percentile(values, 0.5), "p90": _percentile(values, 0.9), "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99), "max": max(values, default=float("nan")),
+            "throughput": len(values) / elapsed if elapsed else float("nan"),
+            "rss_before_mb": before, "rss_after_mb": after, "errors": errors if step == "all" else "",
+        })
+    for s in simulated:
+        for message in s.errors[:3]:
+            print(f"error: {message.splitlines()[0]}", file=sys.stderr)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rerun latency, throughput and memory of the app under concurrent simulated sessions.")
+    parser.add_argument("--app", default=DEFAULT_APP)
+    parser.add_argument("--sessions", default="1,2,4", help="comma-separated concurrency levels")
+    parser.add_argument("--navigation", default="Tabs", help="comma-separated navigation modes to compare: Tabs, Sections")
+    parser.add_argument("--iterations", type=int, default=2, help="edit/identifier/export rounds per session")
+    parser.add_argument("--xml", help="certificate to load (default: a synthetic one)")
+    parser.add_argument("--rows", type=int, default=1000, help="quantities per property set of the synthetic certificate")
+    parser.add_argument("--properties", type=int, default=4, help="property sets of the synthetic certificate")
+    parser.add_argument("--csv", help="write the report to this CSV file")
+    parser.add_argument("--max-p95", type=float, help="exit 1 when the p95 rerun latency of any level exceeds this (seconds)")
+    args = parser.parse_args(argv)
+    if set(args.navigation.split(",")) - set(NAVIGATION_MODES):
+        parser.error(f"--navigation takes {', '.join(NAVIGATION_MODES)}")
+    warnings.filterwarnings("ignore")
+
+    if args.xml:
+        with open(args.xml, "rb") as fh:
+            document = fh.read()
+    else:
+        document = synthetic_document(args.app, args.rows, args.properties)
+    quantities = sum(len(r["quantities"]) for mp in parse_drmd(document).get("materialProperties", []) for r in mp["results"])
+    rows = []
+    with shared_runtime():
+        # One unmeasured session first, so the levels see a warmed process as a served app would.
+        Session(args.app, document).scenario(1)
+        print(f"document: {len(document):,} bytes, {quantities:,} quantities; rss {rss_mb():.0f} MB")
+        for navigation, level in itertools.product(args.navigation.split(","), (int(n) for n in args.sessions.split(","))):
+            level_rows = run_level(args.app, document, level, args.iterations, navigation)
+            rows.extend(level_rows)
+            total = level_rows[-1]
+            print(f"{navigation:8} {level:3} sessions  {total['reruns']:4} reruns  p50 {total['p50']:6.3f}s  p95 {total['p95']:6.3f}s  "
+                  f"max {total['max']:6.3f}s  {total['throughput']:5.2f} reruns/s  "
+                  f"rss {total['rss_before_mb']:.0f} -> {total['rss_after_mb']:.0f} MB  errors {total['errors']}")
+    report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    if args.csv:
+        report.to_csv(args.csv, index=False)
+    failed = report[report["step"] == "all"]["errors"].astype(int).sum() > 0
+    if args.max_p95 is not None and (report[report["step"] == "all"]["p95"] > args.max_p95).any():
+        print(f"p95 rerun latency above {args.max_p95}s", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
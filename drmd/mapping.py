@@ -0,0 +1,786 @@
+"""Declarative mapping between DRMD XML and the editor's document model.
+
+The tables below say once where each value of the model lives in the XML:
+a path relative to the parent element, how its text is read and written,
+its default when absent and whether it is written when empty.  Loading
+(``parse_drmd``) and exporting (the app's generate step, the streaming
+export) both run on them, so a field added here is read and written, and
+the two directions cannot drift apart.
+
+``bind`` compiles a table for a set of namespaces: prefixed paths become
+tuples of ``{uri}local`` tags and every record gets a dispatch table from
+child tag to fields.  Loading a record is then one pass over its children
+instead of a ``find`` per field (each of which parses its path and sorts the
+namespace dict again), and exporting builds the elements in the table's
+order.
+
+Node types:
+
+* ``Text``: element text (``join``: all matching elements);
+* ``Attr``: attribute of the record element;
+* ``Flag``: ``true`` element written only when set;
+* ``Record``: dictionary of fields; ``flat`` records merge their fields
+  into the parent's dictionary (``administrativeData`` has no key of its own);
+* ``Each``: list of records at a repeated element;
+* ``Value``: model value not stored in the XML (``uuid``);
+* ``Custom``: functions for the few mappings that are not field by field
+  (validity choice, statements, quantity tables, attachments).
+
+Round-trip speed and fidelity of a corpus (load, export, load again, and
+what the model does not carry per section):
+
+    python -m drmd.mapping certificates/*.xml
+"""
+import argparse
+import copy
+import functools
+import glob
+import math
+import re
+import sys
+import tempfile
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import date
+
+import pandas as pd
+
+from drmd.blobstore import BlobStore
+from drmd.model import ALLOWED_TITLES, INIT_ID, SCHEMA_VERSION, clean_text
+
+NAMESPACES = {
+    "drmd": "https://example.org/drmd",
+    "dcc": "https://ptb.de/dcc",
+    "si": "https://ptb.de/si",
+}
+QUANTITY_COLUMNS = ["Name", "Label", "Value", "Quantity Kind", "Unit",
+                    "Uncertainty", "Coverage Factor", "Coverage Probability", "Distribution", "Identifier"]
+MISSING = object()   # a load result that sets no key
+LANG = {"lang": "en"}
+
+
+def _tags(path: str, ns: dict) -> tuple:
+    """``"drmd:name/dcc:content"`` as ``("{uri}name", "{uri}content")``."""
+    tags = []
+    for step in path.split("/") if path else ():
+        prefix, _, local = step.rpartition(":")
+        tags.append(f"{{{ns[prefix]}}}{local}" if prefix else local)
+    return tuple(tags)
+
+
+def _walk(elem, tags: tuple) -> list:
+    """Elements at ``tags`` below ``elem`` in document order (a compiled ``findall``)."""
+    found = [elem]
+    for tag in tags:
+        found = [child for e in found for child in e if child.tag == tag]
+    return found
+
+
+def _parent(parent, tags: tuple):
+    """Parent for a new element at ``tags``; intermediate elements continue the previous sibling field's."""
+    for tag in tags[:-1]:
+        last = parent[-1] if len(parent) else None
+        parent = last if last is not None and last.tag == tag else ET.SubElement(parent, tag)
+    return parent
+
+
+def _blank(value) -> bool:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return True
+    return str(value).strip() == ""
+
+
+def _str(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _strip(text: str) -> str:
+    return text.strip()
+
+
+def _float(text: str):
+    try:
+        return float(text.strip())
+    except ValueError:
+        return None
+
+
+class Node:
+    """One entry of a mapping; ``path`` is relative to the parent record's element."""
+
+    def __init__(self, path: str = "", default=MISSING, source=None, load: bool = True):
+        self.path = path
+        self.default = default   # value when absent; called when callable
+        self.source = source     # record -> value to write, instead of the field's key
+        self.loads = load
+        self.tags = ()
+
+    def bind(self, ns: dict):
+        node = copy.copy(self)
+        node.tags = _tags(self.path, ns)
+        node._bind(ns)
+        return node
+
+    def _bind(self, ns: dict):
+        pass
+
+    def _default(self):
+        return self.default() if callable(self.default) else self.default
+
+    def value(self, record, key):
+        if self.source is not None:
+            return self.source(record)
+        return record if key is None else record.get(key)
+
+    def load(self, elems: list, ctx: dict):
+        raise NotImplementedError
+
+    def dump(self, parent, value, ctx: dict):
+        raise NotImplementedError
+
+
+class Text(Node):
+    """Text of the element at ``path``.
+
+    ``when`` is "always", "nonempty" (not blank) or "present" (not None).
+    With ``join`` the texts of all matching elements are joined on load;
+    with ``split`` every non-empty line is written as an element of its own.
+    """
+
+    def __init__(self, path: str, parse=_strip, format=_str, when: str = "nonempty", default="",
+                 attrib: dict | None = None, join: str | None = None, split: bool = False, dump: bool = True, **kw):
+        super().__init__(path, default, **kw)
+        self.parse, self.format, self.when = parse, format, when
+        self.attrib, self.join, self.split, self.dumps = attrib, join, split, dump
+
+    def load(self, elems, ctx):
+        if self.join is not None:
+            texts = [self.parse(e.text) for e in elems if e.text]
+            return self.join.join(texts) if texts else self._default()
+        if elems and elems[0].text:
+            return self.parse(elems[0].text)
+        return self._default()
+
+    def dump(self, parent, value, ctx):
+        if not self.dumps or (self.when == "nonempty" and _blank(value)) or (self.when == "present" and value is None):
+            return
+        if self.split:
+            for line in _str(value).strip().splitlines():
+                if line.strip():
+                    self._element(parent).text = line.strip()
+        else:
+            self._element(parent).text = self.format(value)
+
+    def _element(self, parent):
+        return ET.SubElement(_parent(parent, self.tags), self.tags[-1], self.attrib or {})
+
+
+def Content(path: str, **kw) -> Text:
+    """``dcc:content`` (``lang="en"``) of the text element at ``path``."""
+    return Text(f"{path}/dcc:content", attrib=LANG, **kw)
+
+
+class Flag(Text):
+    """``true`` or ``false``; written as ``true`` only when set."""
+
+    def __init__(self, path: str, **kw):
+        super().__init__(path, parse=lambda t: t.strip().lower() == "true", default=False, **kw)
+
+    def dump(self, parent, value, ctx):
+        if value:
+            self._element(parent).text = "true"
+
+
+class Attr(Node):
+    """Attribute ``name`` of the record's element."""
+
+    def __init__(self, name: str, parse=_strip, format=_strip, when: str = "nonempty", dump: bool = True, **kw):
+        super().__init__("", **kw)
+        self.name, self.parse, self.format, self.when, self.dumps = name, parse, format, when, dump
+
+    def load(self, elems, ctx):
+        text = elems[0].get(self.name) if elems else None
+        return self.parse(text) if text else self._default()
+
+    def dump(self, elem, value, ctx):
+        if self.dumps and not (self.when == "nonempty" and _blank(value)):
+            elem.set(self.name, self.format(value))
+
+
+class Value(Node):
+    """A model value that is not stored in the XML."""
+
+    def load(self, elems, ctx):
+        return self._default()
+
+    def dump(self, parent, value, ctx):
+        pass
+
+
+class Record(Node):
+    """Dictionary with one key per field, in the element order of the schema.
+
+    ``optional`` records set no keys when absent and are not written when
+    empty.
+    """
+
+    def __init__(self, path: str = "", fields=(), flat: bool = False, optional: bool = False, **kw):
+        super().__init__(path, **kw)
+        self.fields, self.flat, self.optional = list(fields), flat, optional
+
+    def _bind(self, ns):
+        self.fields = [(key, node.bind(ns)) for key, node in self.fields]
+        self.dispatch = defaultdict(list)   # child tag -> [(field index, rest of its path)]
+        for i, (_, node) in enumerate(self.fields):
+            if node.tags:
+                self.dispatch[node.tags[0]].append((i, node.tags[1:]))
+
+    def read(self, elem, ctx: dict) -> dict:
+        """The record of ``elem`` (None: every field absent), in one pass over its children."""
+        found = defaultdict(list)
+        if elem is not None:
+            for child in elem:
+                for i, rest in self.dispatch.get(child.tag, ()):
+                    found[i].extend(_walk(child, rest))
+        out = {}
+        for i, (key, node) in enumerate(self.fields):
+            if not node.loads:
+                continue
+            value = node.load(found[i] if node.tags else ([elem] if elem is not None else []), ctx)
+            if value is MISSING:
+                continue
+            if key is None:
+                out.update(value)
+            else:
+                out[key] = value
+        return out
+
+    def write(self, elem, value, ctx: dict):
+        for key, node in self.fields:
+            node.dump(elem, node.value(value, key), ctx)
+
+    def load(self, elems, ctx):
+        if not elems and self.optional:
+            return MISSING
+        return self.read(elems[0] if elems else None, ctx)
+
+    def dump(self, parent, value, ctx):
+        elem = ET.Element(self.tags[-1])
+        self.write(elem, value, ctx)
+        if self.optional and not len(elem) and not elem.attrib:
+            return
+        _parent(parent, self.tags).append(elem)
+
+    def element(self, value, ctx: dict | None = None):
+        elem = ET.Element(self.tags[-1])
+        self.write(elem, value, ctx or {})
+        return elem
+
+
+class Each(Node):
+    """List of ``item`` records, one per element at ``path``.
+
+    ``placeholder`` is written when the list is empty, with
+    ``placeholder_item`` (default: ``item``); with ``always`` the elements
+    around the list are written also when it is empty.
+    """
+
+    def __init__(self, path: str, item: Record, placeholder=None, placeholder_item: Record | None = None,
+                 always: bool = False, **kw):
+        super().__init__(path, **kw)
+        self.item, self.placeholder, self.placeholder_item = item, placeholder, placeholder_item
+        self.always = always
+
+    def _bind(self, ns):
+        self.item = self.item.bind(ns)
+        if self.placeholder_item is not None:
+            self.placeholder_item = self.placeholder_item.bind(ns)
+
+    def load(self, elems, ctx):
+        items = [self.item.read(e, ctx) for e in elems]
+        return items if items else self._default()
+
+    def dump(self, parent, values, ctx):
+        item = self.item
+        if self.always:
+            _parent(parent, self.tags)
+        if not values and self.placeholder is not None:
+            values, item = [self.placeholder], self.placeholder_item or self.item
+        for value in values or []:
+            elem = ET.SubElement(_parent(parent, self.tags), self.tags[-1])
+            item.write(elem, value, ctx)
+
+
+class Custom(Node):
+    """``load(node, elems, ctx)`` and ``dump(node, parent, value, ctx)`` functions.
+
+    ``paths`` and ``nodes`` are compiled with the mapping and available as
+    ``node.t[name]`` (tag tuples) and ``node.nodes[name]``.
+    """
+
+    def __init__(self, path: str, load=None, dump=None, paths: dict | None = None, nodes: dict | None = None, **kw):
+        super().__init__(path, load=load is not None, **kw)
+        self.loader, self.dumper = load, dump
+        self.paths, self.nodes = paths or {}, nodes or {}
+
+    def _bind(self, ns):
+        self.t = {name: _tags(path, ns) for name, path in self.paths.items()}
+        self.nodes = {name: node.bind(ns) for name, node in self.nodes.items()}
+
+    def load(self, elems, ctx):
+        return self.loader(self, elems, ctx)
+
+    def dump(self, parent, value, ctx):
+        if self.dumper is not None:
+            self.dumper(self, parent, value, ctx)
+
+
+# -- identifiers -----------------------------------------------------------------
+IDENTIFIER = Record(fields=[
+    ("id", Attr("id")),
+    ("refId", Attr("refId")),
+    ("scheme", Text("drmd:scheme", when="always")),
+    ("value", Text("drmd:value", when="always")),
+    ("link", Text("drmd:link")),
+])
+
+
+def identifiers(path: str, default=list) -> Each:
+    return Each(path, IDENTIFIER, default=default)
+
+
+def _init_ids():
+    return [INIT_ID.copy()]
+
+
+# -- administrativeData ------------------------------------------------------------
+def _title(text: str) -> str:
+    return text.strip() if text.strip() in ALLOWED_TITLES else ALLOWED_TITLES[0]
+
+
+def _iso_date(text: str) -> date:
+    try:
+        return date.fromisoformat(text.strip())
+    except ValueError:
+        return date.today()
+
+
+def _load_validity(node, elems, ctx):
+    if not elems:
+        return MISSING
+    children = {child.tag: child for child in reversed(elems[0])}   # first of each tag
+    t = node.t
+    if t["untilRevoked"][0] in children:
+        return {"validity_type": "Until Revoked"}
+    tad = children.get(t["timeAfterDispatch"][0])
+    if tad is not None:
+        state = {"validity_type": "Time After Dispatch"}
+        period = _walk(tad, t["period"])
+        if period and period[0].text:
+            state["raw_validity_period"] = period[0].text.strip()
+        dispatch = _walk(tad, t["dispatchDate"])
+        if dispatch and dispatch[0].text:
+            state["date_of_issue"] = _iso_date(dispatch[0].text)
+        return state
+    specific = children.get(t["specificTime"][0])
+    if specific is not None:
+        state = {"validity_type": "Specific Time"}
+        if specific.text:
+            state["specific_time"] = _iso_date(specific.text)
+        return state
+    return {}
+
+
+def _dump_validity(node, parent, state, ctx):
+    t = node.t
+    validity = ET.SubElement(parent, node.tags[-1])
+    if state.get("validity_type") == "Time After Dispatch":
+        tad = ET.SubElement(validity, t["timeAfterDispatch"][0])
+        ET.SubElement(tad, t["dispatchDate"][0]).text = str(state.get("date_of_issue"))
+        ET.SubElement(tad, t["period"][0]).text = state.get("raw_validity_period")
+    elif state.get("validity_type") == "Specific Time":
+        ET.SubElement(validity, t["specificTime"][0]).text = str(state.get("specific_time"))
+    else:
+        ET.SubElement(validity, t["untilRevoked"][0]).text = "true"
+
+
+CORE_DATA = Record("drmd:coreData", flat=True, fields=[
+    ("title_option", Text("drmd:titleOfTheDocument", parse=_title, when="always", default=MISSING)),
+    ("persistent_id", Text("drmd:uniqueIdentifier", default=MISSING, dump=False)),
+    ("persistent_id_value", Text("drmd:uniqueIdentifier", when="always", default=MISSING)),
+    ("documentIdentifiers", identifiers("drmd:documentIdentifiers/drmd:documentIdentifier")),
+    (None, Custom("drmd:validity", load=_load_validity, dump=_dump_validity, paths={
+        "untilRevoked": "drmd:untilRevoked", "timeAfterDispatch": "drmd:timeAfterDispatch",
+        "period": "drmd:period", "dispatchDate": "drmd:dispatchDate", "specificTime": "drmd:specificTime"})),
+])
+
+_REAL_LIST = "dcc:itemQuantity/si:realListXMLList"
+
+MATERIAL = Record(fields=[
+    ("uuid", Value(default=lambda: str(uuid.uuid4()))),
+    ("name", Content("drmd:name", when="always")),
+    ("description", Content("drmd:description", parse=clean_text)),
+    ("materialClass", Value(default="")),
+    ("minimumSampleSize", Text(f"drmd:minimumSampleSize/{_REAL_LIST}/si:valueXMLList", when="always",
+                               format=lambda v: _str(v).strip() or "0")),
+    (None, Text(f"drmd:minimumSampleSize/{_REAL_LIST}/si:unitXMLList", when="always", load=False,
+                source=lambda m: "")),
+    ("itemQuantities", Text(f"drmd:itemQuantities/{_REAL_LIST}/si:valueXMLList")),
+    (None, Text(f"drmd:itemQuantities/{_REAL_LIST}/si:unitXMLList", when="present", load=False,
+                source=lambda m: None if _blank(m.get("itemQuantities")) else "")),
+    ("isCertified", Attr("isCertified", parse=lambda v: v.lower() == "true", default=False, dump=False)),
+    ("materialIdentifiers", identifiers("drmd:materialIdentifiers/drmd:materialIdentifier", default=_init_ids)),
+])
+
+
+def _blank_material():
+    return [{"uuid": str(uuid.uuid4()), "name": "", "description": "", "materialClass": "",
+             "minimumSampleSize": "", "itemQuantities": "", "isCertified": False,
+             "materialIdentifiers": [INIT_ID.copy()]}]
+
+
+def _contact(path: str) -> str:
+    return f"drmd:contact/{path}"
+
+
+PRODUCER = Record(fields=[
+    ("producerName", Content("drmd:name", when="always")),
+    (None, Content(_contact("dcc:name"), when="always", load=False,
+                   source=lambda p: p.get("contactName", p.get("producerName", "Contact Name")))),
+    ("producerEmail", Text(_contact("dcc:eMail"))),
+    ("producerPhone", Text(_contact("dcc:phone"))),
+    ("producerFax", Text(_contact("dcc:fax"))),
+    ("producerStreet", Text(_contact("dcc:location/dcc:street"))),
+    ("producerStreetNo", Text(_contact("dcc:location/dcc:streetNo"))),
+    ("producerPostCode", Text(_contact("dcc:location/dcc:postCode"))),
+    ("producerCity", Text(_contact("dcc:location/dcc:city"))),
+    ("producerCountryCode", Text(_contact("dcc:location/dcc:countryCode"))),
+    ("organizationIdentifiers", identifiers("drmd:organizationIdentifiers/drmd:organizationIdentifier",
+                                            default=_init_ids)),
+])
+
+RESPONSIBLE_PERSON = Record(fields=[
+    ("personName", Content("dcc:person/dcc:name", when="always")),
+    ("description", Content("dcc:description", join=" ")),
+    ("role", Text("dcc:role")),
+    ("mainSigner", Flag("dcc:mainSigner")),
+    ("cryptElectronicSeal", Flag("dcc:cryptElectronicSeal")),
+    ("cryptElectronicSignature", Flag("dcc:cryptElectronicSignature")),
+    ("cryptElectronicTimeStamp", Flag("dcc:cryptElectronicTimeStamp")),
+])
+
+# Element, label written as its dcc:name
+OFFICIAL_STATEMENTS = {
+    "intendedUse": "Intended Use",
+    "commutability": "Commutability",
+    "storageInformation": "Storage Information",
+    "instructionsForHandlingAndUse": "Handling Instructions",
+    "metrologicalTraceability": "Metrological Traceability",
+    "healthAndSafetyInformation": "Health and Safety Information",
+    "subcontractors": "Subcontractors",
+    "legalNotice": "Legal Notice",
+    "referenceToCertificationReport": "Reference to Certification Report",
+}
+
+STATEMENT = Record(fields=[
+    ("name", Content("dcc:name", parse=clean_text)),
+    ("content", Text("dcc:content", parse=clean_text, attrib=LANG, join="\n", split=True)),
+])
+
+
+def _load_statements(node, elems, ctx):
+    official = {key: {"name": "", "content": ""} for key in OFFICIAL_STATEMENTS}
+    custom = []
+    keys = {node.t[key][0]: key for key in OFFICIAL_STATEMENTS}
+    for child in elems[0] if elems else ():
+        if child.tag in keys:
+            official[keys[child.tag]] = node.nodes["statement"].read(child, ctx)
+        elif child.tag == node.t["statement"][0]:
+            custom.append(node.nodes["statement"].read(child, ctx))
+    return {"official_statements": official, "custom_statements": custom}
+
+
+def _dump_statements(node, parent, state, ctx):
+    statements = ET.SubElement(parent, node.tags[-1])
+    official = state.get("official_statements") or {}
+    items = [(key, label, official.get(key, {}).get("content", "")) for key, label in OFFICIAL_STATEMENTS.items()]
+    # custom statements are all written as drmd:statement
+    items += [("statement", (cs.get("name", "") or "").strip(), cs.get("content", ""))
+              for cs in state.get("custom_statements") or []]
+    for key, label, content in items:
+        if (content or "").strip():
+            node.nodes["statement"].write(ET.SubElement(statements, node.t[key][0]),
+                                          {"name": label, "content": content}, ctx)
+
+
+ADMINISTRATIVE_DATA = Record("drmd:administrativeData", flat=True, fields=[
+    (None, CORE_DATA),
+    ("materials", Each("drmd:materials/drmd:material", MATERIAL, default=_blank_material,
+                       placeholder={"name": "Dummy Material"},
+                       placeholder_item=Record(fields=[("name", Content("drmd:name", when="always"))]))),
+    ("producers", Each("drmd:referenceMaterialProducer", PRODUCER,
+                       placeholder={"producerName": "Dummy Producer"},
+                       placeholder_item=Record(fields=[("producerName", Content("drmd:name", when="always"))]))),
+    ("responsible_persons", Each("drmd:respPersons/dcc:respPerson", RESPONSIBLE_PERSON,
+                                 placeholder={"personName": "Dummy Person", "role": "Dummy Role"})),
+    (None, Custom("drmd:statements", load=_load_statements, dump=_dump_statements,
+                  paths={key: f"drmd:{key}" for key in [*OFFICIAL_STATEMENTS, "statement"]},
+                  nodes={"statement": STATEMENT})),
+])
+
+# -- materialPropertiesList -------------------------------------------------------
+QUANTITY = Record(fields=[
+    ("refType", Attr("refType", source=lambda row: "basic_measuredValue", load=False)),
+    ("Name", Content("dcc:name", parse=clean_text, format=str, when="always")),
+    ("Label", Value(default="")),
+    ("Quantity Kind", Value(default="")),
+    (None, Record("si:real", flat=True, optional=True, fields=[
+        ("Value", Text("si:value", parse=_float, format=str, when="always", default=None)),
+        ("Unit", Text("si:unit", format=str, when="always")),
+        (None, Record("si:measurementUncertaintyUnivariate/si:expandedMU", flat=True, optional=True, fields=[
+            ("Uncertainty", Text("si:valueExpandedMU", parse=_float, default=None)),
+            ("Coverage Factor", Text("si:coverageFactor", parse=_float, default=None)),
+            ("Coverage Probability", Text("si:coverageProbability", parse=_float, default=None)),
+            ("Distribution", Text("si:distribution")),
+        ])),
+    ])),
+])
+
+
+def _load_quantities(node, elems, ctx):
+    """Rows of ``dcc:list``: ``dcc:quantity``, or ``drmd:quantity`` wrapping one with its identifiers."""
+    quantity, ids = node.nodes["quantity"], node.nodes["identifiers"]
+    wrapper, tag = node.t["wrapper"][0], node.t["quantity"][0]
+    rows, row_ids = [], []
+    for item in elems[0] if elems else ():
+        if item.tag == wrapper:
+            elem = next((child for child in item if child.tag == tag), None)
+            if elem is None:
+                continue
+        elif item.tag == tag:
+            elem = item
+        else:
+            continue
+        rows.append(quantity.read(elem, ctx))
+        row_ids.append(ids.load(_walk(item, ids.tags), ctx))
+    table = pd.DataFrame(rows, columns=QUANTITY_COLUMNS)
+    table["Identifier"] = [ids_[0]["value"] if ids_ else "" for ids_ in row_ids]
+    return {"quantities": table, "identifiers": row_ids}
+
+
+def _dump_quantities(node, parent, result, ctx):
+    quantity, ids = node.nodes["quantity"], node.nodes["identifiers"]
+    wrapper, tag = node.t["wrapper"][0], node.t["quantity"][0]
+    list_elem = ET.SubElement(_parent(parent, node.tags), node.tags[-1])
+    table = result.get("quantities", pd.DataFrame())
+    row_ids = result.get("identifiers")
+    for label, row in zip(table.index, table.to_dict("records")):
+        wrap = ET.SubElement(list_elem, wrapper)
+        quantity.write(ET.SubElement(wrap, tag), row, ctx)
+        if row_ids and label < len(row_ids):
+            ids.dump(wrap, row_ids[label], ctx)
+
+
+RESULT = Record(fields=[
+    ("id", Attr("id")),
+    ("refId", Attr("refId")),
+    ("result_name", Content("dcc:name", parse=clean_text, when="always")),
+    ("description", Content("dcc:description", parse=clean_text)),
+    (None, Custom("dcc:data/dcc:list", load=_load_quantities, dump=_dump_quantities,
+                  paths={"wrapper": "drmd:quantity", "quantity": "dcc:quantity"},
+                  nodes={"quantity": QUANTITY,
+                         "identifiers": identifiers("drmd:propertyIdentifiers/drmd:propertyIdentifier")})),
+])
+
+MATERIAL_PROPERTY = Record(fields=[
+    ("isCertified", Attr("isCertified", parse=lambda v: v.lower() == "true", default=False,
+                         format=lambda v: "true" if v else "false", when="always")),
+    ("id", Attr("id", default="")),
+    ("refId", Attr("refId")),
+    ("name", Content("drmd:name", parse=clean_text, when="always")),
+    ("description", Content("drmd:description", parse=clean_text)),
+    ("procedures", Content("drmd:procedures", parse=clean_text)),
+    ("results", Each("drmd:results/dcc:result", RESULT, default=list, always=True)),   # drmd:results is required
+    ("uuid", Value(default=lambda: str(uuid.uuid4()))),
+])
+
+# -- attachments -------------------------------------------------------------------
+def _load_payload(node, elems, ctx):
+    blob_store = ctx["blob_store"]
+    digest = blob_store.put_base64(elems[0].text if elems and elems[0].text else "")
+    return {"sha256": digest, "size": blob_store.size(digest)}
+
+
+def _dump_payload(node, parent, file, ctx):
+    payload = ctx.get("payload")
+    ET.SubElement(parent, node.tags[-1]).text = payload(file) if payload else None
+
+
+FILE = Record(fields=[
+    ("name", Text("dcc:fileName", parse=str, when="always", default="unknown")),
+    ("mimeType", Text("dcc:mimeType", parse=str, when="always", default="application/octet-stream")),
+    (None, Custom("dcc:dataBase64", load=_load_payload, dump=_dump_payload)),
+])
+
+
+def _load_files(node, elems, ctx):
+    # Without a blob store the attachments are skipped
+    if ctx.get("blob_store") is None or not elems:
+        return MISSING
+    return [node.nodes["file"].read(e, ctx) for e in elems]
+
+
+def _dump_files(node, parent, files, ctx):
+    for file in files or []:
+        node.nodes["file"].write(ET.SubElement(parent, node.tags[-1]), file, ctx)
+
+
+# -- document ----------------------------------------------------------------------
+# drmd.xsd places materials and statements at the root; the exporter writes them
+# below administrativeData.  Both are read, a root-level copy taking precedence.
+def _load_root_materials(node, elems, ctx):
+    return [node.nodes["material"].read(e, ctx) for e in elems] if elems else MISSING
+
+
+def _load_root_statements(node, elems, ctx):
+    return _load_statements(node, elems, ctx) if elems else MISSING
+
+
+COMMENT = Text("drmd:comment", join="\n", format=lambda v: _str(v).strip())
+
+DOCUMENT = Record("drmd:digitalReferenceMaterialDocument", fields=[
+    ("schemaVersion", Attr("schemaVersion", source=lambda state: SCHEMA_VERSION, load=False)),
+    (None, ADMINISTRATIVE_DATA),
+    ("materials", Custom("drmd:materials/drmd:material", load=_load_root_materials, nodes={"material": MATERIAL})),
+    (None, Custom("drmd:statements", load=_load_root_statements,
+                  paths={key: f"drmd:{key}" for key in [*OFFICIAL_STATEMENTS, "statement"]},
+                  nodes={"statement": STATEMENT})),
+    (None, Record("drmd:materialPropertiesList", flat=True, fields=[
+        ("materialProperties", Each("drmd:materialProperties", MATERIAL_PROPERTY)),
+    ])),
+    ("comment", COMMENT),
+    ("embedded_files", Custom("drmd:document", load=_load_files, dump=_dump_files, nodes={"file": FILE})),
+])
+
+# Sections the streaming export writes one at a time
+SECTIONS = {
+    "administrativeData": ADMINISTRATIVE_DATA,                          # value: the state
+    "materialProperties": Each("drmd:materialProperties", MATERIAL_PROPERTY),   # value: one property set
+    "comment": COMMENT,                                                 # value: the comment
+    "document": Custom("drmd:document", dump=_dump_files, nodes={"file": FILE}),  # value: one file
+}
+
+
+@functools.lru_cache(maxsize=16)
+def compiled(name: str | None = None, drmd_ns: str = NAMESPACES["drmd"]) -> Node:
+    """``DOCUMENT`` (or section ``name``) bound to the namespaces, with ``drmd_ns`` for ``drmd``."""
+    node = DOCUMENT if name is None else SECTIONS[name]
+    return node.bind({**NAMESPACES, "drmd": drmd_ns})
+
+
+def _legacy_identifiers(root, ns: dict) -> list:
+    """Document identifiers of files from before ``documentIdentifiers`` (``identifications``)."""
+    identifications, identification, issuer, value = _tags(
+        "drmd:identifications/drmd:identification/drmd:issuer/drmd:value", ns)
+    for container in root.iter(identifications):
+        for legacy in _walk(container, (identification,)):
+            fields = {child.tag: child.text for child in reversed(legacy)}   # first of each tag
+            return [{"scheme": (fields.get(issuer) or "").strip(), "value": (fields.get(value) or "").strip(),
+                     "link": ""}]
+    return _init_ids()
+
+
+def load_document(root, blob_store=None) -> dict:
+    """Session-state values of the document ``root`` (an ElementTree element); see ``parse_drmd``."""
+    match = re.match(r"\{(.*?)\}", root.tag)
+    ns = {**NAMESPACES, "drmd": match.group(1) if match else NAMESPACES["drmd"]}
+    state = compiled(None, ns["drmd"]).read(root, {"blob_store": blob_store})
+    if not state["documentIdentifiers"]:
+        state["documentIdentifiers"] = _legacy_identifiers(root, ns)
+    return state
+
+
+def export_document(state, payload=None) -> ET.Element:
+    """The document element for ``state``; ``payload(file)`` gives the base64 text of an attachment."""
+    return compiled().element(state, {"payload": payload})
+
+
+def export_section(name: str, value, payload=None):
+    """One top-level section of the document (see ``SECTIONS``), or None when it is empty."""
+    node = compiled(name)
+    scratch = ET.Element("section")
+    node.dump(scratch, [value] if name in ("materialProperties", "document") else value, {"payload": payload})
+    return scratch[0] if len(scratch) else None
+
+
+# -- round-trip benchmark ------------------------------------------------------------
+def _model(value):
+    """``value`` without generated uuids, with tables as lists of rows, for comparing models."""
+    if isinstance(value, dict):
+        return {k: _model(v) for k, v in value.items() if k != "uuid"}
+    if isinstance(value, list):
+        return [_model(v) for v in value]
+    if isinstance(value, pd.DataFrame):
+        return [[None if _blank(x) and not isinstance(x, str) else x for x in row]
+                for row in value.astype(object).itertuples(index=False)]
+    return value
+
+
+def round_trip(xml_bytes: bytes, blob_store) -> dict:
+    """Timings and fidelity of load -> export -> load for one document."""
+    from drmd.fingerprint import changed_sections, fingerprint
+
+    def payload(file):
+        return blob_store.base64(file["sha256"])
+
+    start = time.perf_counter()
+    state = load_document(ET.fromstring(xml_bytes), blob_store)
+    loaded = time.perf_counter()
+    exported = ET.tostring(export_document(state, payload), encoding="utf-8")
+    dumped = time.perf_counter()
+    again = load_document(ET.fromstring(exported), blob_store)
+    before, after = _model(state), _model(again)
+    changed = changed_sections(fingerprint(xml_bytes), fingerprint(exported))
+    return {
+        "bytes": len(xml_bytes),
+        "load_s": loaded - start,
+        "export_s": dumped - loaded,
+        # keys the exporter filled in (placeholders, defaults) that load back differently
+        "model_changes": sorted(k for k in before.keys() | after.keys() if before.get(k) != after.get(k)),
+        "export_stable": ET.tostring(export_document(again, payload), encoding="utf-8") == exported,
+        # innermost sections of the input the model does not carry (or the exporter adds)
+        "sections_differing": [name for name in changed if not any(c.startswith(name + "/") for c in changed)],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-trip speed and fidelity of the DRMD mapping.")
+    parser.add_argument("paths", nargs="+", help="XML files (glob patterns allowed)")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N timings per file")
+    args = parser.parse_args(argv)
+
+    for prefix, uri in NAMESPACES.items():
+        ET.register_namespace(prefix, uri)
+    paths = [p for pattern in args.paths for p in sorted(glob.glob(pattern)) or [pattern]]
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        blob_store = BlobStore(tmp)
+        for path in paths:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            runs = [round_trip(data, blob_store) for _ in range(args.repeat)]
+            result = runs[0]
+            load_s, export_s = min(r["load_s"] for r in runs), min(r["export_s"] for r in runs)
+            failed += bool(result["model_changes"]) or not result["export_stable"]
+            print(f"{path}: {result['bytes']:,} bytes  load {load_s * 1000:.1f} ms  export {export_s * 1000:.1f} ms  "
+                  f"model {'preserved' if not result['model_changes'] else 'changed: ' + ', '.join(result['model_changes'])}  "
+                  f"export {'stable' if result['export_stable'] else 'UNSTABLE'}")
+            for name in result["sections_differing"]:
+                print(f"  differs: {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
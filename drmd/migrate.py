@@ -0,0 +1,286 @@
+"""Bulk upgrade of legacy DRMD files to the current schema version.
+
+The rules are the ones the editor applies when it loads an old document,
+applied to the XML itself, so everything the editor does not model
+(respPersons details, method lists, metadata) is carried over unchanged:
+
+* ``identifications/identification`` (issuer, value) become registry-style
+  ``documentIdentifiers/documentIdentifier`` (scheme, value) in coreData;
+* quantities written directly into ``dcc:list`` are wrapped in
+  ``drmd:quantity``, as the exporter writes them;
+* elements in an older drmd namespace move to the current one;
+* ``schemaVersion`` is set to ``SCHEMA_VERSION``.
+
+A document that changes loses its enveloped signature, which could no
+longer verify.  Files are upgraded in parallel, each output is validated
+against ``drmd.xsd`` up to its first error (with the engine of
+``drmd.validation``), and ``manifest.json`` in the output directory records
+the hash of every source that was migrated or found current, so a rerun only
+processes new, changed or previously failed files.
+
+    python -m drmd.migrate archive/ --out migrated/ --report report.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from drmd.model import SCHEMA_VERSION
+from drmd.validation import DEFAULT_VALIDATION_ENGINE, validator
+
+DRMD_NS = "https://example.org/drmd"
+DCC_NS = "https://ptb.de/dcc"
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+DEFAULT_XSD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "drmd.xsd")
+DONE = ("migrated", "unchanged")
+
+
+def _q(ns, local):
+    return f"{{{ns}}}{local}"
+
+
+def rule_namespace(root):
+    """Move elements of an older drmd namespace to the current one."""
+    old = etree.QName(root).namespace
+    if not old or old == DRMD_NS:
+        return 0
+    changed = 0
+    for elem in root.iter():
+        if isinstance(elem.tag, str) and etree.QName(elem).namespace == old:
+            elem.tag = _q(DRMD_NS, etree.QName(elem).localname)
+            changed += 1
+    etree.cleanup_namespaces(root, top_nsmap={"drmd": DRMD_NS})
+    return changed
+
+
+def rule_identifications(root):
+    """``identifications/identification`` -> ``coreData/documentIdentifiers``."""
+    legacy = root.findall(f".//{_q(DRMD_NS, 'identifications')}")
+    if not legacy:
+        return 0
+    core = root.find(f".//{_q(DRMD_NS, 'coreData')}")
+    added = None   # outermost element created here
+    if core is None:
+        admin = root.find(f".//{_q(DRMD_NS, 'administrativeData')}")
+        if admin is None:
+            admin = added = etree.Element(_q(DRMD_NS, "administrativeData"))
+            root.insert(0, admin)
+        core = etree.Element(_q(DRMD_NS, "coreData"))
+        admin.insert(0, core)
+        added = added if added is not None else core
+    target = core.find(_q(DRMD_NS, "documentIdentifiers"))
+    if target is None:
+        target = etree.Element(_q(DRMD_NS, "documentIdentifiers"))
+        anchor = core.find(_q(DRMD_NS, "uniqueIdentifier"))
+        if anchor is None:
+            anchor = core.find(_q(DRMD_NS, "titleOfTheDocument"))
+        if anchor is not None:
+            anchor.addnext(target)
+        else:
+            core.insert(0, target)
+    changed = 0
+    for block in legacy:
+        for ident in block.findall(_q(DRMD_NS, "identification")):
+            issuer = ident.findtext(_q(DRMD_NS, "issuer")) or ""
+            value = ident.findtext(_q(DRMD_NS, "value")) or ""
+            new = etree.SubElement(target, _q(DRMD_NS, "documentIdentifier"))
+            etree.SubElement(new, _q(DRMD_NS, "scheme")).text = issuer.strip()
+            etree.SubElement(new, _q(DRMD_NS, "value")).text = value.strip()
+            if ident.get("id"):
+                new.set("id", ident.get("id"))
+            changed += 1
+        block.getparent().remove(block)
+    outer = added if added is not None else target
+    if changed or added is not None:
+        previous = outer.getprevious()
+        outer.tail = previous.tail if previous is not None else outer.getparent().text
+        etree.indent(outer, level=sum(1 for _ in outer.iterancestors()))
+    return changed
+
+
+def rule_quantity_wrapper(root):
+    """Wrap bare ``dcc:quantity`` children of result lists in ``drmd:quantity``."""
+    changed = 0
+    for lst in root.iterfind(f".//{_q(DRMD_NS, 'results')}//{_q(DCC_NS, 'list')}"):
+        for quantity in lst.findall(_q(DCC_NS, "quantity")):
+            wrapper = etree.Element(_q(DRMD_NS, "quantity"))
+            wrapper.tail, quantity.tail = quantity.tail, None
+            quantity.addprevious(wrapper)
+            wrapper.append(quantity)
+            etree.indent(wrapper, level=sum(1 for _ in wrapper.iterancestors()))
+            changed += 1
+    return changed
+
+
+def rule_schema_version(root):
+    if root.get("schemaVersion") == SCHEMA_VERSION:
+        return 0
+    root.set("schemaVersion", SCHEMA_VERSION)
+    return 1
+
+
+RULES = [
+    ("namespace", rule_namespace),
+    ("identifications", rule_identifications),
+    ("quantity wrapper", rule_quantity_wrapper),
+    ("schemaVersion", rule_schema_version),
+]
+
+
+def migrate_bytes(data: bytes):
+    """``(output bytes, [names of rules that changed something])``; output is None when nothing changed."""
+    root = etree.fromstring(data, etree.XMLParser(remove_blank_text=False, huge_tree=True))
+    applied = [name for name, rule in RULES if rule(root)]
+    if not applied:
+        return None, []
+    for signature in root.findall(_q(DS_NS, "Signature")):
+        root.remove(signature)
+        applied.append("signature removed")
+    return etree.tostring(root, xml_declaration=True, encoding="utf-8"), applied
+
+
+_validator = None
+
+
+def _validate(data: bytes, xsd_path: str):
+    """``(valid, message)``; valid is None when the schema itself cannot be loaded (e.g. offline imports)."""
+    global _validator
+    try:
+        if _validator is None or _validator[0] != xsd_path:
+            _validator = (xsd_path, validator(DEFAULT_VALIDATION_ENGINE, xsd_path))
+    except Exception as e:
+        _validator = (xsd_path, e)
+    checker = _validator[1]
+    if isinstance(checker, Exception):
+        return None, f"not validated: {type(checker).__name__}: {str(checker).splitlines()[0]}"
+    report = checker.validate(data, max_errors=1)
+    return report.valid, "" if report.valid else report.errors[0].message[:500]
+
+
+def _migrate_file(job):
+    """Worker: migrate one file; returns a report row."""
+    source, target, xsd_path, validate = job
+    row = {"source": source, "target": "", "sha256": "", "status": "failed", "rules": "", "valid": "", "message": ""}
+    try:
+        with open(source, "rb") as fh:
+            data = fh.read()
+        row["sha256"] = hashlib.sha256(data).hexdigest()
+        output, applied = migrate_bytes(data)
+        row["rules"] = "; ".join(applied)
+        if validate:
+            valid, row["message"] = _validate(output if output is not None else data, xsd_path)
+            row["valid"] = "" if valid is None else str(valid).lower()
+            if valid is False:
+                row["message"] = f"invalid after migration: {row['message']}"
+                return row
+        if output is None:
+            row["status"] = "unchanged"
+            return row
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(output)
+        os.replace(tmp, target)
+        row["target"], row["status"] = target, "migrated"
+    except Exception as e:
+        row["message"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+class Migration:
+    def __init__(self, out_dir: str, xsd_path: str = DEFAULT_XSD, validate: bool = True):
+        self.out_dir = os.path.abspath(out_dir)
+        self.xsd_path = os.path.abspath(xsd_path)
+        self.validate = validate
+        self.manifest_path = os.path.join(self.out_dir, "manifest.json")
+        os.makedirs(self.out_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as fh:
+                self.manifest = json.load(fh)
+        else:
+            self.manifest = {}
+
+    def _save_manifest(self):
+        fd, tmp = tempfile.mkstemp(dir=self.out_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def run(self, sources, base: str | None = None, max_workers: int | None = None):
+        """Migrate ``sources`` in parallel, yielding one report row per file.
+
+        Outputs mirror the source layout below ``base`` (default: the common
+        parent of all sources).  Files whose hash the manifest records as
+        done are reported as "skipped" without being parsed.
+        """
+        sources = [os.path.abspath(p) for p in sources]
+        if not sources:
+            return
+        base = os.path.abspath(base) if base else os.path.commonpath([os.path.dirname(p) for p in sources])
+        todo = []
+        for source in sources:
+            entry = self.manifest.get(source)
+            if entry and entry["status"] in DONE:
+                with open(source, "rb") as fh:
+                    if hashlib.sha256(fh.read()).hexdigest() == entry["sha256"]:
+                        yield dict(entry, source=source, status="skipped", message=f"already {entry['status']}")
+                        continue
+            todo.append((source, os.path.join(self.out_dir, os.path.relpath(source, base)), self.xsd_path, self.validate))
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                for row in pool.map(_migrate_file, todo, chunksize=8):
+                    self.manifest[row["source"]] = {k: row[k] for k in ("sha256", "status", "target", "rules", "valid")}
+                    yield row
+        finally:
+            self._save_manifest()
+
+
+def _xml_files(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for dirpath, _, files in os.walk(target):
+                yield from (os.path.join(dirpath, f) for f in sorted(files) if f.lower().endswith(".xml"))
+        else:
+            yield target
+
+
+REPORT_COLUMNS = ["source", "status", "rules", "valid", "target", "sha256", "message"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Upgrade legacy DRMD files to schema version {SCHEMA_VERSION}.")
+    parser.add_argument("paths", nargs="+", help="XML files or directories")
+    parser.add_argument("--out", required=True, help="output directory; also holds manifest.json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--report", help="write the per-file report to this CSV file")
+    parser.add_argument("--no-validate", action="store_true", help="skip schema validation of the output")
+    parser.add_argument("--xsd", default=DEFAULT_XSD)
+    args = parser.parse_args(argv)
+
+    sources = [p for p in _xml_files(args.paths)
+               if not os.path.abspath(p).startswith(os.path.abspath(args.out) + os.sep)]
+    migration = Migration(args.out, args.xsd, validate=not args.no_validate)
+    base = args.paths[0] if len(args.paths) == 1 and os.path.isdir(args.paths[0]) else None
+    rows, counts = [], {}
+    for row in migration.run(sources, base, args.workers):
+        rows.append(row)
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+        detail = row["rules"] or row["message"]
+        print(f"{row['status']:9} {row['source']}" + (f": {detail}" if detail else ""))
+    if args.report:
+        with open(args.report, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, REPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    print(", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "no files")
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""XML → document model mapping.
+
+``parse_drmd`` turns DRMD XML into the dictionary of session-state values the
+editor works with (document identifiers, producers, materials, property
+tables, statements, attachments).  The app applies it to
+``st.session_state``; the library and batch tools use it without Streamlit.
+"""
+import io
+import re
+import xml.etree.ElementTree as ET
+
+ALLOWED_TITLES = ["referenceMaterialCertificate", "productInformationSheet"]  # default first
+INIT_ID = {"scheme": "", "value": "", "link": ""}
+SCHEMA_VERSION = "0.2.0"  # written to exports; older documents are upgraded by drmd.migrate
+
+
+def clean_text(txt: str) -> str:
+    return re.sub(r"\s+", " ", txt or "").strip()
+
+
+def parse_drmd(xml_bytes: bytes, blob_store=None) -> dict:
+    """Map a DRMD document onto session-state keys.
+
+    Only keys found in the document are returned, mirroring what the loader
+    overwrites.  Attachment payloads are written to ``blob_store``; without a
+    store the ``document`` elements are skipped.  The mapping itself is the
+    table in ``drmd.mapping``, which the exporter uses as well.
+    """
+    from drmd.mapping import load_document  # drmd.mapping uses the constants above
+
+    return load_document(ET.parse(io.BytesIO(xml_bytes)).getroot(), blob_store)
@@ -0,0 +1,380 @@
+"""Compressed DRMD package (``.drmdz``).
+
+A DRMD file carries its attachments inline as base64, which is a third larger
+than the files themselves and compresses poorly next to the XML.  A package
+is a zip with
+
+    manifest.json              format version and one entry per dcc:dataBase64
+    document.xml               the document with every dataBase64 left empty
+    attachments/0001-<name>    the decoded bytes of each payload
+    certificate.html           the rendered certificate (optional)
+
+``pack`` and ``unpack`` convert between the two forms in a single pass over a
+binary stream: payloads are decoded or encoded in chunks on the way, so
+memory stays bounded for any attachment size, and ``unpack(pack(x)) == x``
+byte for byte.  For that the manifest records how each payload was laid out
+(whitespace before and after it, line width and line separator); a payload
+that is not laid out regularly, or is not canonical base64, is also stored
+as the original text.
+
+``load_package`` reads a package into editor state like ``parse_drmd``, with
+the attachments streamed from the zip into the blob store.
+
+    python -m drmd.package pack certificate.xml certificate.drmdz --html
+    python -m drmd.package unpack certificate.drmdz certificate.xml
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+from drmd.model import parse_drmd
+
+FORMAT = "drmd-package"
+VERSION = 1
+MANIFEST = "manifest.json"
+DOCUMENT = "document.xml"
+HTML = "certificate.html"
+CHUNK = 1024 * 1024
+SPOOL = 16 * 1024 * 1024   # stripped document kept in memory up to this size, then on disk
+
+# Start tag of a payload element; the pattern ends at ">" so a match is never a partial tag.
+_PAYLOAD = re.compile(rb"<((?:[\w.-]+:)?dataBase64)\b[^<>]*?(/?)>")
+_TAIL = 1024   # bytes held back at a chunk boundary, longer than any payload start tag
+_FIELD = {name: re.compile(rb"<(?:[\w.-]+:)?" + name + rb"\b[^<>]*>([^<]*)</") for name in (b"fileName", b"mimeType")}
+_SAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+def is_package(data: bytes) -> bool:
+    """Whether ``data`` (or its first bytes) is a zip rather than XML."""
+    return data[:4] == b"PK\x03\x04"
+
+
+def _scan(stream, chunk_size: int = CHUNK):
+    """Split an XML byte stream into ``("xml", bytes)``, ``("start", match)``,
+    ``("text", bytes)`` and ``("end", None)`` events around payload elements.
+
+    The text of a payload comes as any number of ``text`` events between its
+    ``start`` (not for self-closing elements) and ``end``.
+    """
+    buf, in_payload, eof = b"", False, False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        while True:
+            if in_payload:
+                end = buf.find(b"<")
+                if end < 0:
+                    if buf:
+                        yield "text", buf
+                    buf = b""
+                    break
+                if end:
+                    yield "text", buf[:end]
+                buf, in_payload = buf[end:], False
+                yield "end", None
+            match = _PAYLOAD.search(buf)
+            if match is None:
+                keep = 0 if eof else min(len(buf), _TAIL)
+                if len(buf) > keep:
+                    yield "xml", buf[:len(buf) - keep]
+                    buf = buf[len(buf) - keep:]
+                break
+            if match.start():
+                yield "xml", buf[:match.start()]
+            yield "start", match
+            buf, in_payload = buf[match.end():], not match.group(2)
+    if in_payload:
+        yield "end", None
+
+
+class _Payload:
+    """Decodes base64 text fed in pieces and records its layout."""
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.regular = True   # False: layout or encoding not reproducible from the bytes
+        self.lead = None      # whitespace before the first character
+        self.width = None     # characters per line
+        self.sep = None       # whitespace between lines
+        self._space = b""     # whitespace since the last character
+        self._run = 0         # characters since the last whitespace
+        self._pending = b""   # characters not yet decoded (less than one group of four)
+
+    def feed(self, text: bytes) -> bytes:
+        chars = []
+        for piece in re.findall(rb"\s+|\S+", text):
+            if piece[:1].isspace():
+                self._space += piece
+                continue
+            if self.lead is None:
+                self.lead = self._space
+            elif self._space:
+                if self.width is None:
+                    self.width, self.sep = self._run, self._space
+                elif self._run != self.width or self._space != self.sep:
+                    self.regular = False
+                self._run = 0
+            self._space = b""
+            self._run += len(piece)
+            chars.append(piece)
+        data = self._pending + b"".join(chars)
+        whole = len(data) - len(data) % 4
+        self._pending = data[whole:]
+        return self._decode(data[:whole])
+
+    def close(self) -> bytes:
+        data = self._decode(self._pending) if self._pending else b""
+        if self.lead is None:      # whitespace only
+            self.lead, self._space = self._space, b""
+        elif self.width is not None and self._run > self.width:
+            self.regular = False
+        return data
+
+    def _decode(self, text: bytes) -> bytes:
+        try:
+            data = base64.b64decode(text, validate=True)
+        except (binascii.Error, ValueError):
+            self.regular = False
+            try:
+                data = base64.b64decode(text + b"=" * (-len(text) % 4))
+            except (binascii.Error, ValueError):
+                data = b""   # not base64 at all; the original text is what is kept
+        if self.regular and base64.b64encode(data) != text:
+            self.regular = False
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def layout(self) -> dict:
+        return {"lead": self.lead.decode("ascii"), "width": self.width,
+                "sep": (self.sep or b"").decode("ascii"), "trail": self._space.decode("ascii")}
+
+
+def _field(recent: bytes, name: bytes) -> str | None:
+    matches = _FIELD[name].findall(recent)
+    return matches[-1].decode("utf-8", "replace").strip() if matches else None
+
+
+def pack(src, dst, html: str | bytes | bool | None = None, chunk_size: int = CHUNK) -> dict:
+    """Write the single-file document read from ``src`` as a package to ``dst``.
+
+    ``src`` is a binary stream, ``dst`` a path or binary stream.  ``html`` is
+    stored as ``certificate.html``; ``True`` renders it with ``drmd.xsl``.
+    Returns the manifest.
+    """
+    payloads = []
+    with zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zf, \
+            tempfile.SpooledTemporaryFile(SPOOL) as document:
+        entry = payload = raw = None
+        recent = b""   # end of the document written so far, for the attachment's fileName
+        try:
+            for kind, data in _scan(src, chunk_size):
+                if kind == "xml":
+                    document.write(data)
+                    recent = (recent + data)[-4096:]
+                elif kind == "start":
+                    document.write(data.group(0))
+                    if data.group(2):
+                        payloads.append(None)
+                elif kind == "text":
+                    if entry is None:
+                        name = _field(recent, b"fileName") or "attachment"
+                        path = f"attachments/{len(payloads) + 1:04d}-{_SAFE_NAME.sub('_', name)[-100:]}"
+                        entry = zf.open(_info(path), "w", force_zip64=True)
+                        payload, raw = _Payload(), tempfile.SpooledTemporaryFile(SPOOL)
+                        info = {"path": path, "fileName": name, "mimeType": _field(recent, b"mimeType")}
+                    raw.write(data)
+                    entry.write(payload.feed(data))
+                elif kind == "end":
+                    if entry is None:   # empty element
+                        payloads.append(None)
+                        continue
+                    entry.write(payload.close())
+                    entry.close()
+                    info.update(sha256=payload.sha256.hexdigest(), size=payload.size, layout=payload.layout())
+                    if not payload.regular:
+                        info["text"] = info["path"] + ".b64"
+                        raw.seek(0)
+                        with zf.open(_info(info["text"]), "w", force_zip64=True) as fh:
+                            shutil.copyfileobj(raw, fh, CHUNK)
+                    raw.close()
+                    payloads.append(info)
+                    entry = payload = raw = None
+        except BaseException:
+            # An open entry would make the zip's own close fail and hide the error.
+            if entry is not None:
+                entry.close()
+                raw.close()
+            raise
+        document.seek(0)
+        with zf.open(_info(DOCUMENT), "w", force_zip64=True) as fh:
+            shutil.copyfileobj(document, fh, CHUNK)
+        if html is True:
+            from lxml import etree
+            from drmd.preview import stylesheet
+            document.seek(0)
+            html = str(stylesheet()(etree.parse(document)))
+        if html:
+            zf.writestr(_info(HTML), html)
+        manifest = {"format": FORMAT, "version": VERSION, "document": DOCUMENT,
+                    "html": HTML if html else None, "payloads": payloads}
+        zf.writestr(_info(MANIFEST), json.dumps(manifest, indent=1))
+    return manifest
+
+
+def _info(name: str) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def read_manifest(zf: zipfile.ZipFile) -> dict:
+    manifest = json.loads(zf.read(MANIFEST))
+    if manifest.get("format") != FORMAT:
+        raise ValueError("not a DRMD package")
+    if manifest.get("version", 0) > VERSION:
+        raise ValueError(f"package version {manifest['version']} is newer than this reader ({VERSION})")
+    return manifest
+
+
+def _write_payload(zf: zipfile.ZipFile, info: dict, dst, chunk_size: int = CHUNK):
+    """Write the base64 text of payload ``info`` to ``dst`` as it was in the original."""
+    if "text" in info:
+        with zf.open(info["text"]) as fh:
+            shutil.copyfileobj(fh, dst, chunk_size)
+        return
+    layout = info["layout"]
+    width, sep = layout["width"], layout["sep"].encode("ascii")
+    dst.write(layout["lead"].encode("ascii"))
+    column = 0
+    with zf.open(info["path"]) as fh:
+        while chunk := fh.read(chunk_size - chunk_size % 3):
+            text = base64.b64encode(chunk)
+            if not width:
+                dst.write(text)
+                continue
+            pieces, pos = [], 0
+            while pos < len(text):
+                if column == width:
+                    pieces.append(sep)
+                    column = 0
+                take = min(width - column, len(text) - pos)
+                pieces.append(text[pos:pos + take])
+                pos += take
+                column += take
+            dst.write(b"".join(pieces))
+    dst.write(layout["trail"].encode("ascii"))
+
+
+def unpack(src, dst, chunk_size: int = CHUNK) -> dict:
+    """Write the single-file document of package ``src`` (path or stream) to the binary stream ``dst``."""
+    with zipfile.ZipFile(src) as zf:
+        manifest = read_manifest(zf)
+        payloads = iter(manifest["payloads"])
+        info = None
+        with zf.open(manifest["document"]) as document:
+            for kind, data in _scan(document, chunk_size):
+                if kind == "xml":
+                    dst.write(data)
+                elif kind == "start":
+                    dst.write(data.group(0))
+                    info = next(payloads)
+                    if info is not None:
+                        _write_payload(zf, info, dst, chunk_size)
+                elif kind == "text" and info is None:
+                    dst.write(data)
+    return manifest
+
+
+def unpack_bytes(src) -> bytes:
+    out = io.BytesIO()
+    unpack(src, out)
+    return out.getvalue()
+
+
+class _PackageBlobs:
+    """Blob store for ``parse_drmd`` that takes the payloads from the package, in document order."""
+
+    def __init__(self, zf, payloads, blob_store):
+        self.zf = zf
+        self.payloads = iter(payloads)
+        self.blob_store = blob_store
+
+    def put_base64(self, text: str) -> str:
+        info = next(self.payloads, None)
+        if info is None:
+            return self.blob_store.put_base64(text)
+        with self.zf.open(info["path"]) as fh:
+            return self.blob_store.put_stream(fh)
+
+    def size(self, digest: str) -> int:
+        return self.blob_store.size(digest)
+
+
+def load_package(src, blob_store) -> tuple[dict, bytes]:
+    """Editor state of package ``src`` (as ``parse_drmd``) and the document to verify its signature on.
+
+    The document is the single-file form when the package is signed (the
+    signature covers the payloads) and the package's own document otherwise.
+    """
+    with zipfile.ZipFile(src) as zf:
+        manifest = read_manifest(zf)
+        document = zf.read(manifest["document"])
+        # parse_drmd reads the payloads of drmd:document elements only
+        root = ET.fromstring(document)
+        parents = {child: parent for parent in root.iter() for child in parent}
+        elements = [e for e in root.iter() if e.tag.rpartition("}")[2] == "dataBase64"]
+        payloads = [info for elem, info in zip(elements, manifest["payloads"])
+                    if parents[elem].tag.rpartition("}")[2] == "document"]
+        state = parse_drmd(document, _PackageBlobs(zf, payloads, blob_store))
+    signed = root.find(".//{http://www.w3.org/2000/09/xmldsig#}Signature") is not None
+    if signed:
+        document = unpack_bytes(src)
+    return state, document
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between DRMD XML files and compressed DRMD packages.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("pack", help="XML file -> package")
+    p.add_argument("source")
+    p.add_argument("target")
+    p.add_argument("--html", action="store_true", help="also store the certificate rendered with drmd.xsl")
+    u = sub.add_parser("unpack", help="package -> XML file")
+    u.add_argument("source")
+    u.add_argument("target")
+    args = parser.parse_args(argv)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(args.target)), suffix=".tmp")
+    try:
+        with open(args.source, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if args.command == "pack":
+                manifest = pack(src, dst, html=args.html or None)
+            else:
+                manifest = unpack(src, dst)
+        os.replace(tmp, args.target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    files = [p for p in manifest["payloads"] if p]
+    print(f"{args.source} ({os.path.getsize(args.source):,} bytes) -> {args.target} "
+          f"({os.path.getsize(args.target):,} bytes), {len(files)} attachments")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
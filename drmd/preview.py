@@ -0,0 +1,178 @@
+"""Paged previews of an export.
+
+The XSLT output of a large certificate can hold thousands of table rows, and
+the pretty-printed XML can carry megabytes of base64 attachments on single
+lines.  Shipping either to the browser in one message freezes the tab, so the
+export tab shows them a page at a time:
+
+* ``HtmlPreview`` splits the HTML into sections at ``<h2>`` headings and pages
+  each section by table rows.  A table that spans pages is re-opened with its
+  header row on the next page.  Every row is serialized once when the preview
+  is built; rendering a page only joins strings.
+* ``PagedText`` pages plain text (the XML) by lines and shortens long lines,
+  so attachment payloads are never sent to the client.
+
+``stylesheet`` compiles ``drmd.xsl`` once per process.
+"""
+import bisect
+import copy
+import functools
+import os
+import re
+
+from lxml import etree, html as lxml_html
+
+DEFAULT_ROWS_PER_PAGE = 100
+DEFAULT_LINES_PER_PAGE = 200
+DEFAULT_MAX_LINE = 400
+DRMD_XSL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "drmd.xsl")
+
+
+@functools.lru_cache(maxsize=4)
+def stylesheet(xsl_path: str = DRMD_XSL) -> etree.XSLT:
+    return etree.XSLT(etree.parse(xsl_path))
+
+
+def _html(elem) -> str:
+    return etree.tostring(elem, method="html", encoding="unicode", with_tail=True)
+
+
+def _split_table(table):
+    """``(opening tag, header row html, [row html])`` for a table element."""
+    # Direct rows and rows of the table's own thead/tbody; nested tables stay inside their cell.
+    rows = []
+    for child in table:
+        if child.tag == "tr":
+            rows.append(child)
+        elif child.tag in ("thead", "tbody"):
+            rows.extend(row for row in child if row.tag == "tr")
+    header = ""
+    if rows and rows[0].findall("th") and not rows[0].findall("td"):
+        header, rows = _html(rows[0]), rows[1:]
+    shell = copy.copy(table)
+    shell[:] = []
+    shell.text = shell.tail = None
+    opening = _html(shell).rsplit("</table>", 1)[0]
+    return opening, header, [_html(row) for row in rows]
+
+
+class HtmlPreview:
+    def __init__(self, document, rows_per_page: int = DEFAULT_ROWS_PER_PAGE):
+        """``document`` is an HTML string or an lxml tree (e.g. an XSLT result)."""
+        if isinstance(document, (str, bytes)):
+            root = lxml_html.document_fromstring(document)
+        else:
+            root = document.getroot() if hasattr(document, "getroot") else document
+        self.rows_per_page = rows_per_page
+        self.head = "".join(_html(e) for e in root.iterfind("head/style"))
+        body = root.find("body")
+        self.sections = []  # [(title, items)]; item = ("html", text) or ("table", opening, header, rows)
+        title, items = None, []
+        for child in (body if body is not None else []):
+            if not isinstance(child.tag, str):
+                continue
+            if child.tag == "h2":
+                # Content before the first heading (the document title) opens the first section.
+                if title is not None:
+                    self.sections.append((title, items))
+                    items = []
+                title = " ".join(child.itertext()).strip() or "Section"
+            if child.tag == "table":
+                items.append(("table",) + _split_table(child))
+                if child.tail and child.tail.strip():
+                    items.append(("html", child.tail))
+            else:
+                items.append(("html", _html(child)))
+        if items or title is not None:
+            self.sections.append((title or "Document", items))
+        self._pages = [self._paginate(items) for _, items in self.sections]
+
+    def _paginate(self, items):
+        """Page boundaries as lists of ``(item index, first row, end row)``."""
+        pages, current, budget = [], [], self.rows_per_page
+        for i, item in enumerate(items):
+            if item[0] == "html":
+                current.append((i, 0, 0))
+                continue
+            rows, start = item[3], 0
+            if budget == 0 and rows:
+                pages.append(current)
+                current, budget = [], self.rows_per_page
+            while True:
+                take = min(budget, len(rows) - start)
+                current.append((i, start, start + take))
+                start += take
+                budget -= take
+                if start >= len(rows):
+                    break
+                pages.append(current)
+                current, budget = [], self.rows_per_page
+        if current or not pages:
+            pages.append(current)
+        return pages
+
+    @property
+    def titles(self):
+        return [title for title, _ in self.sections]
+
+    def page_count(self, section: int) -> int:
+        return len(self._pages[section])
+
+    def row_count(self, section: int) -> int:
+        return sum(len(item[3]) for item in self.sections[section][1] if item[0] == "table")
+
+    def render(self, section: int, page: int = 0) -> str:
+        """A standalone HTML page with one page of one section."""
+        items = self.sections[section][1]
+        parts = ["<html><head>", self.head, "</head><body>"]
+        for i, start, end in self._pages[section][page]:
+            item = items[i]
+            if item[0] == "html":
+                parts.append(item[1])
+            else:
+                _, opening, header, rows = item
+                parts.extend((opening, header, *rows[start:end], "</table>"))
+        parts.append("</body></html>")
+        return "".join(parts)
+
+
+class PagedText:
+    def __init__(self, text: str, lines_per_page: int = DEFAULT_LINES_PER_PAGE, max_line: int = DEFAULT_MAX_LINE):
+        self.text = text
+        self.lines_per_page = lines_per_page
+        self.max_line = max_line
+        # Offsets of line starts; the text itself is never split.
+        self._starts = [0] + [m.end() for m in re.finditer("\n", text)]
+        if len(self._starts) > 1 and self._starts[-1] == len(text):
+            self._starts.pop()
+
+    @property
+    def line_count(self) -> int:
+        return len(self._starts)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-self.line_count // self.lines_per_page))
+
+    def _line(self, n: int) -> str:
+        start = self._starts[n]
+        end = self._starts[n + 1] - 1 if n + 1 < len(self._starts) else len(self.text)
+        if end - start > self.max_line:
+            return f"{self.text[start:start + self.max_line]} … [{end - start - self.max_line:,} more characters]"
+        return self.text[start:end]
+
+    def page(self, n: int) -> str:
+        first = n * self.lines_per_page
+        return "\n".join(self._line(i) for i in range(first, min(first + self.lines_per_page, self.line_count)))
+
+    def line_range(self, n: int):
+        """1-based first and last line of page ``n``."""
+        first = n * self.lines_per_page
+        return first + 1, min(first + self.lines_per_page, self.line_count)
+
+    def find(self, term: str, start: int = 0):
+        """Page of the first occurrence of ``term`` at or after character ``start``; None if absent."""
+        pos = self.text.find(term, start)
+        if pos < 0:
+            return None
+        return (bisect.bisect_right(self._starts, pos) - 1) // self.lines_per_page
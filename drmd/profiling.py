@@ -0,0 +1,222 @@
+"""Profiling of the next few reruns of the app script.
+
+How long a rerun takes depends on the session: how many property sets,
+how large the tables, how many attachments.  ``RerunProfiler`` lives in the
+session state of the session that is slow, is started at the top of the
+script and stopped at its end, and records for each of the next N reruns
+
+* the wall time of the rerun and of each named block (the tabs), and
+* either a cProfile of everything that ran (``mode="cprofile"``), or stack
+  samples of the script thread taken every few milliseconds
+  (``mode="sample"``), folded into the collapsed-stack format that
+  flamegraph.pl, inferno and speedscope read.
+
+``archive`` bundles the result with ``state_summary`` of the session, which
+records sizes only (lengths, table shapes, byte counts; ids in key names are
+masked), so a user can send it without sending their certificate.
+"""
+import contextlib
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import re
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+MODES = ("cprofile", "sample")
+_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|\b[0-9a-f]{16,}\b|\d+")
+
+
+class _Sampler(threading.Thread):
+    """Collects the stack of thread ``ident`` every ``interval`` seconds as folded strings."""
+
+    def __init__(self, ident: int, interval: float, stacks: Counter):
+        super().__init__(name="drmd-profile-sampler", daemon=True)
+        self.target = ident
+        self.interval = interval
+        self.stacks = stacks
+        self.running = True
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+
+class RerunProfiler:
+    def __init__(self, reruns: int = 3, mode: str = "cprofile", interval: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.reruns = reruns
+        self.remaining = reruns
+        self.mode = mode
+        self.interval = interval
+        self.runs = []            # per rerun: {"seconds", "complete", "blocks": {name: seconds}}
+        self.stats = None         # pstats.Stats over all profiled reruns (cprofile mode)
+        self.stacks = Counter()   # folded stack -> samples (sample mode)
+        self._current = None
+
+    @property
+    def done(self) -> bool:
+        return self.remaining == 0 and self._current is None
+
+    def start(self):
+        """Begin profiling this rerun, if any are left.
+
+        A rerun cut short by ``st.rerun()`` never reaches ``stop``; it is
+        closed here and marked incomplete.
+        """
+        if self._current is not None:
+            self.stop(complete=False)
+        if self.remaining <= 0:
+            return
+        self.remaining -= 1
+        run = {"start": time.perf_counter(), "blocks": defaultdict(float)}
+        if self.mode == "cprofile":
+            run["profile"] = cProfile.Profile()
+            run["profile"].enable()
+        else:
+            run["sampler"] = _Sampler(threading.get_ident(), self.interval, self.stacks)
+            run["sampler"].start()
+        self._current = run
+
+    def stop(self, complete: bool = True):
+        run, self._current = self._current, None
+        if run is None:
+            return
+        if "profile" in run:
+            run["profile"].disable()
+            if self.stats is None:
+                self.stats = pstats.Stats(run["profile"])
+            else:
+                self.stats.add(run["profile"])
+        else:
+            run["sampler"].running = False
+            run["sampler"].join()
+        self.runs.append({"seconds": time.perf_counter() - run["start"], "complete": complete,
+                          "blocks": dict(run["blocks"])})
+
+    @contextlib.contextmanager
+    def block(self, name: str):
+        """Time the enclosed code as block ``name`` of the current rerun."""
+        run = self._current
+        if run is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            run["blocks"][name] += time.perf_counter() - start
+
+    # -- results -----------------------------------------------------------------
+    def block_table(self) -> pd.DataFrame:
+        """Seconds per block (rows) and rerun (columns); time outside all blocks is "(other)"."""
+        columns = {}
+        for i, run in enumerate(self.runs, 1):
+            blocks = dict(run["blocks"])
+            blocks["(other)"] = run["seconds"] - sum(blocks.values())
+            blocks["total"] = run["seconds"]
+            columns[f"rerun {i}" + ("" if run["complete"] else " (cut short)")] = blocks
+        return pd.DataFrame(columns).fillna(0.0)
+
+    def top_functions(self, limit: int = 25) -> pd.DataFrame:
+        """Functions with the most cumulative time (cprofile mode) or the most samples at the top of the stack (sample mode)."""
+        if self.stats is not None:
+            rows = [(f"{func} ({file.rsplit('/', 1)[-1]}:{line})", calls, total, cumulative)
+                    for (file, line, func), (_, calls, total, cumulative, _) in self.stats.stats.items()]
+            df = pd.DataFrame(rows, columns=["function", "calls", "own s", "cumulative s"])
+            return df.sort_values("cumulative s", ascending=False).head(limit).reset_index(drop=True)
+        own, inclusive = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for frame in set(frames):
+                inclusive[frame] += n
+        total = sum(self.stacks.values()) or 1
+        return pd.DataFrame([(f, n, inclusive[f], inclusive[f] / total) for f, n in own.most_common(limit)],
+                            columns=["function", "own samples", "samples", "share"])
+
+    def folded(self) -> str:
+        """Collapsed stacks (``frame;frame;frame count`` per line)."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def archive(self, summary: dict | None = None) -> bytes:
+        """Zip with the profile (``profile.prof`` or ``flamegraph.folded``), block times, top functions and ``summary``."""
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            if self.stats is not None:
+                # The format of pstats.Stats.dump_stats; open with snakeviz or pstats.
+                zf.writestr("profile.prof", marshal.dumps(self.stats.stats))
+                text = io.StringIO()
+                report = pstats.Stats(stream=text)
+                report.add(self.stats)
+                report.sort_stats("cumulative").print_stats(60)
+                zf.writestr("profile.txt", text.getvalue())
+            if self.stacks:
+                zf.writestr("flamegraph.folded", self.folded())
+            zf.writestr("blocks.csv", self.block_table().to_csv())
+            zf.writestr("top_functions.csv", self.top_functions(100).to_csv(index=False))
+            zf.writestr("session_summary.json", json.dumps(summary or {}, indent=1, default=str))
+        return buf.getvalue()
+
+
+def _size(value) -> dict:
+    if isinstance(value, pd.DataFrame):
+        return {"type": "DataFrame", "rows": len(value), "columns": len(value.columns),
+                "bytes": int(value.memory_usage(deep=True).sum())}
+    if isinstance(value, (str, bytes, bytearray)):
+        return {"type": type(value).__name__, "length": len(value)}
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        return {"type": type(value).__name__, "items": len(value)}
+    return {"type": type(value).__name__}
+
+
+def state_summary(state) -> dict:
+    """Sizes of a session state without its content.
+
+    Keys are grouped with ids and numbers masked (``mat_name_#`` for one
+    input per material), and the document structure is counted: property
+    sets, tables and their rows, identifiers, attachments.
+    """
+    keys = {}
+    for key in state.keys():
+        if key == "profiler":
+            continue
+        pattern = _ID.sub("#", str(key))
+        entry = keys.setdefault(pattern, {"count": 0, **_size(state[key])})
+        entry["count"] += 1
+    tables = [r.get("quantities") for mp in state.get("materialProperties", []) or [] for r in mp.get("results", [])]
+    rows = [len(t) for t in tables if isinstance(t, pd.DataFrame)]
+    identifiers = sum(len(ids) for mp in state.get("materialProperties", []) or [] for r in mp.get("results", [])
+                      for ids in r.get("identifiers", []))
+    files = state.get("embedded_files", []) or []
+    export = state.get("export_result") or {}
+    document = {
+        "materials": len(state.get("materials", []) or []),
+        "producers": len(state.get("producers", []) or []),
+        "responsible_persons": len(state.get("responsible_persons", []) or []),
+        "property_sets": len(state.get("materialProperties", []) or []),
+        "tables": len(tables),
+        "table_rows": sum(rows),
+        "largest_table_rows": max(rows, default=0),
+        "property_identifiers": identifiers,
+        "attachments": len(files),
+        "attachment_bytes": sum(f.get("size", 0) or 0 for f in files),
+        "export_bytes": len(export.get("xml", "")) or export.get("size", 0),
+    }
+    return {"document": document, "session_state": dict(sorted(keys.items()))}
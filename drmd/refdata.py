@@ -0,0 +1,177 @@
+"""Read-only reference data shared by all worker processes.
+
+Several app processes behind a load balancer would each parse ``qudt.ttl``
+(seconds, tens of megabytes while rdflib holds the graph) and compile
+``drmd.xsd``.  Instead the first process that needs a dataset builds it once
+and publishes it as a file; every process then maps that file read-only, so
+the data is held once in the page cache however many workers attach, and a
+worker started later finds it already built.
+
+A published file is a ``{str: picklable}`` table sorted by key::
+
+    magic  count  key offsets[count + 1]  value offsets[count + 1]  keys  values
+
+``SharedMapping`` looks keys up by bisection directly in the mapped file and
+unpickles only the value that is asked for; nothing is loaded up front.
+The file name carries a hash of the sources the data is built from (and of
+the module that builds it), so changing either publishes a new file.
+Publishing is atomic and guarded by a lock file, so workers starting
+together build a dataset only once.
+
+    python -m drmd.refdata        # build everything, e.g. in the Docker image
+"""
+import argparse
+import array
+import bisect
+import contextlib
+import glob
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+from collections.abc import Mapping
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent first builds just duplicate work
+    fcntl = None
+
+MAGIC = b"DRMDREF1"
+_HEADER = struct.Struct("<8sQ")
+DEFAULT_DIR = os.environ.get(
+    "DRMD_REFDATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".drmd_refdata"))
+
+
+class SharedMapping(Mapping):
+    """Read-only mapping over a file written by ``publish``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        magic, n = _HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a reference data file")
+        table = self._view[_HEADER.size:_HEADER.size + 16 * (n + 1)].cast("Q")
+        self._n = n
+        self._key_offsets = table[:n + 1]
+        self._value_offsets = table[n + 1:]
+        self._data = _HEADER.size + 16 * (n + 1)
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._view[self._data + self._key_offsets[i]:self._data + self._key_offsets[i + 1]])
+
+    def _index(self, key) -> int:
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode("utf-8")
+        i = bisect.bisect_left(range(self._n), encoded, key=self._key)
+        return i if i < self._n and self._key(i) == encoded else -1
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        if i < 0:
+            raise KeyError(key)
+        start = self._data + self._key_offsets[self._n]
+        return pickle.loads(self._view[start + self._value_offsets[i]:start + self._value_offsets[i + 1]])
+
+    def __contains__(self, key) -> bool:
+        return self._index(key) >= 0
+
+    def __iter__(self):
+        return (self._key(i).decode("utf-8") for i in range(self._n))
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __reduce__(self):
+        # Pickling (st.cache_data, process pools) sends the path, not the data.
+        return SharedMapping, (self.path,)
+
+
+def publish(path: str, data: Mapping):
+    """Write ``data`` (str keys, picklable values) to ``path`` atomically."""
+    items = sorted((k.encode("utf-8"), pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)) for k, v in data.items())
+    key_offsets, value_offsets = array.array("Q", [0]), array.array("Q", [0])
+    for k, v in items:
+        key_offsets.append(key_offsets[-1] + len(k))
+        value_offsets.append(value_offsets[-1] + len(v))
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(_HEADER.pack(MAGIC, len(items)))
+            fh.write(key_offsets.tobytes())
+            fh.write(value_offsets.tobytes())
+            for k, _ in items:
+                fh.write(k)
+            for _, v in items:
+                fh.write(v)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    with open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def _digest(sources) -> str:
+    h = hashlib.sha256()
+    for source in sources:
+        with open(source, "rb") as fh:
+            h.update(hashlib.sha256(fh.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def shared(name: str, sources, build, directory: str | None = None) -> Mapping:
+    """The dataset ``name`` built by ``build()`` from the files ``sources``.
+
+    Returns a ``SharedMapping`` over the published file, building and
+    publishing it first when no process has yet.  Older versions of the
+    dataset are removed; workers still mapping them keep their view.  When
+    the directory is not writable the data is built in this process only.
+    """
+    directory = directory or DEFAULT_DIR
+    path = os.path.join(directory, f"{name}-{_digest(sources)}.ref")
+    if os.path.exists(path):
+        return SharedMapping(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with _locked(os.path.join(directory, f"{name}.lock")):
+            if not os.path.exists(path):
+                publish(path, build())
+                for old in glob.glob(os.path.join(directory, f"{name}-*.ref")):
+                    if old != path:
+                        os.unlink(old)
+    except OSError:
+        return build()
+    return SharedMapping(path)
+
+
+def main(argv=None):
+    argparse.ArgumentParser(description=f"Build the shared reference data files in {DEFAULT_DIR} "
+                                        "(set DRMD_REFDATA_DIR to change).").parse_args(argv)
+    from drmd.schema_model import field_model
+    from drmd.units import quantity_kinds
+
+    kinds = quantity_kinds()
+    fields = field_model().specs
+    for mapping in (kinds, fields):
+        print(f"{len(mapping):6} entries  {getattr(mapping, 'path', 'not shared')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Business rules for certificate content that the XSD cannot express.
+
+A rule is one line of data: the scope it applies to, a severity, a message
+and a boolean expression over the columns of that scope, for example::
+
+    Rule("probability-range", "quantities", "error", "Coverage probability outside (0, 1]",
+         "p.notna() & ~((p > 0) & (p <= 1))")
+
+``RuleSet`` compiles the expressions once.  ``check`` builds one frame per
+scope for the whole document and evaluates every rule on it as a vectorized
+mask:
+
+* "quantities": every row of every quantities table, concatenated, with
+  the owning property set, table and row label and the set's
+  ``isCertified`` flag;
+* "sets": one row per property set;
+* "materials": one row per material.
+
+Expressions see the columns under short names (``SCOPES``) and derived
+columns (``DERIVED``), computed when a rule first uses them.  Lookups such as
+unit dimensions or expected coverage factors run once per distinct value,
+not once per row, so 100k rows check in well under a second.  Findings are
+a DataFrame with one row per rule and offending row; ``owner``/``table``/
+``row`` locate it in the Properties tab (row is the table's row label).
+
+    python -m drmd.rules certificate.xml
+"""
+import argparse
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from drmd.uncertainty import inconsistent_rows
+from drmd.units import dsi_dimension, quantity_kinds
+
+
+class Rule(NamedTuple):
+    id: str
+    scope: str      # "quantities", "sets" or "materials"
+    severity: str   # "error" or "warning"
+    message: str
+    expr: str
+
+
+RULES = [
+    Rule("certified-value", "quantities", "error", "Certified property without a numeric value",
+         "certified & value.isna()"),
+    Rule("certified-uncertainty", "quantities", "error", "Certified value without an uncertainty",
+         "certified & uncertainty.isna()"),
+    Rule("uncertainty-negative", "quantities", "error", "Uncertainty is negative",
+         "uncertainty < 0"),
+    Rule("probability-range", "quantities", "error", "Coverage probability outside (0, 1]",
+         "p.notna() & ~((p > 0) & (p <= 1))"),
+    Rule("factor-range", "quantities", "error", "Coverage factor is not positive",
+         "k <= 0"),
+    Rule("factor-bounded", "quantities", "error", "Coverage factor beyond the maximum of a bounded distribution",
+         "k > max_factor"),
+    Rule("factor-distribution", "quantities", "warning",
+         "Coverage factor does not match the coverage probability for the distribution",
+         "factor_mismatch"),
+    Rule("negative-fraction", "quantities", "error", "Negative value of a fraction or ratio",
+         "fraction & (value < 0)"),
+    Rule("unit-kind", "quantities", "warning", "Unit does not fit the quantity kind",
+         "unit_mismatch"),
+    Rule("certified-empty", "sets", "error", "Certified property set has no values",
+         "certified & (rows == 0)"),
+    Rule("set-name", "sets", "warning", "Property set has no name",
+         "name.str.strip() == ''"),
+    Rule("sample-size", "materials", "error", "Minimum sample size is not a non-negative number",
+         "(sample_size.str.strip() != '') & ~(pd.to_numeric(sample_size, errors='coerce') >= 0)"),
+]
+
+# Scope -> {name in expressions: column of the scope's frame}
+SCOPES = {
+    "quantities": {"name": "Name", "value": "Value", "kind": "Quantity Kind", "unit": "Unit",
+                   "uncertainty": "Uncertainty", "k": "Coverage Factor", "p": "Coverage Probability",
+                   "distribution": "Distribution", "certified": "certified"},
+    "sets": {"name": "name", "certified": "certified", "rows": "rows"},
+    "materials": {"name": "name", "sample_size": "minimumSampleSize"},
+}
+NUMERIC = ["Value", "Uncertainty", "Coverage Factor", "Coverage Probability"]
+LOCATION = ["owner", "table", "row"]
+FINDING_COLUMNS = ["rule", "severity", "message", "scope", *LOCATION]
+_BOUNDED = {"uniform": np.sqrt(3), "rectangular": np.sqrt(3), "triangular": np.sqrt(6)}
+
+
+def _per_value(series: pd.Series, func) -> pd.Series:
+    """``func`` applied once per distinct value of ``series``."""
+    values = series.fillna("").astype(str).str.strip()
+    return values.map({v: func(v) for v in values.unique()})
+
+
+def _kind_dimensions() -> dict:
+    return {name: kind.dimension for name, kind in quantity_kinds().items()}
+
+
+def _unit_mismatch(frame) -> pd.Series:
+    units = frame["Unit"].fillna("").astype(str).str.strip()
+    kinds = frame["Quantity Kind"].fillna("").astype(str).str.strip()
+    pairs = pd.DataFrame({"unit": units, "kind": kinds})
+    stated = (units != "") & (kinds != "")
+    if not stated.any():
+        return pd.Series(False, index=frame.index)
+    kind_dims = _kind_dimensions()
+    distinct = pairs[stated].drop_duplicates()
+    # Units that are not D-SI and kinds not in QUDT are not judged
+    bad = {(u, k) for u, k in distinct.itertuples(index=False)
+           if dsi_dimension(u) and kind_dims.get(k) and dsi_dimension(u) != kind_dims[k]}
+    if not bad:
+        return pd.Series(False, index=frame.index)
+    return stated & pd.Series(list(zip(units, kinds)), index=frame.index).isin(bad)
+
+
+def _fraction(frame) -> pd.Series:
+    kinds = frame["Quantity Kind"].fillna("").astype(str)
+    dimensionless = _per_value(frame["Unit"], lambda u: dsi_dimension(u).endswith("D1"))
+    return kinds.str.contains("Fraction|Ratio", regex=True) | dimensionless.astype(bool)
+
+
+def _max_factor(frame) -> pd.Series:
+    names = frame["Distribution"].fillna("").astype(str).str.strip().str.lower()
+    return names.map(_BOUNDED).astype(float).fillna(np.inf)
+
+
+# Derived quantities columns: name -> frame -> Series
+DERIVED = {
+    "factor_mismatch": inconsistent_rows,
+    "unit_mismatch": _unit_mismatch,
+    "fraction": _fraction,
+    "max_factor": _max_factor,
+}
+
+
+class _Columns(dict):
+    """Names visible to one scope's expressions; derived columns are computed on first use."""
+
+    def __init__(self, frame, scope):
+        super().__init__({name: frame[col] for name, col in SCOPES[scope].items()}, pd=pd, np=np)
+        self.frame, self.scope = frame, scope
+
+    def __missing__(self, name):
+        if self.scope != "quantities" or name not in DERIVED:
+            raise NameError(f"name {name!r} is not defined for {self.scope} rules")
+        self[name] = DERIVED[name](self.frame)
+        return self[name]
+
+
+def quantity_frame(state) -> pd.DataFrame:
+    """All quantities rows of the document, with ``owner`` (property set uuid), ``table``, ``row`` and ``certified``."""
+    tables, keys = [], []
+    for mp in state.get("materialProperties", []) or []:
+        for res_idx, result in enumerate(mp.get("results", [])):
+            table = result.get("quantities")
+            if isinstance(table, pd.DataFrame) and len(table):
+                tables.append(table)
+                keys.append((mp.get("uuid"), res_idx, bool(mp.get("isCertified", False))))
+    columns = list(dict.fromkeys(c for c in SCOPES["quantities"].values() if c != "certified"))
+    if not tables:
+        return pd.DataFrame(columns=[*LOCATION, "certified", *columns])
+    lengths = [len(t) for t in tables]
+    frame = pd.concat([t.reindex(columns=columns) for t in tables], ignore_index=True)
+    frame["owner"] = np.repeat([k[0] for k in keys], lengths)
+    frame["table"] = np.repeat([k[1] for k in keys], lengths)
+    frame["row"] = np.concatenate([t.index.to_numpy() for t in tables])
+    frame["certified"] = np.repeat([k[2] for k in keys], lengths)
+    for col in NUMERIC:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    return frame
+
+
+def set_frame(state) -> pd.DataFrame:
+    rows = [{"owner": mp.get("uuid"), "table": None, "row": None, "name": mp.get("name") or "",
+             "certified": bool(mp.get("isCertified", False)),
+             "rows": sum(len(r.get("quantities", ())) for r in mp.get("results", []))}
+            for mp in state.get("materialProperties", []) or []]
+    return pd.DataFrame(rows, columns=[*LOCATION, "name", "certified", "rows"])
+
+
+def material_frame(state) -> pd.DataFrame:
+    rows = [{"owner": m.get("uuid"), "table": None, "row": None, "name": m.get("name") or "",
+             "minimumSampleSize": str(m.get("minimumSampleSize") or "")}
+            for m in state.get("materials", []) or []]
+    return pd.DataFrame(rows, columns=[*LOCATION, "name", "minimumSampleSize"])
+
+
+class RuleSet:
+    def __init__(self, rules=RULES):
+        self.rules = list(rules)
+        self._code = [compile(rule.expr, f"<rule {rule.id}>", "eval") for rule in self.rules]
+
+    def evaluate(self, frame: pd.DataFrame, scope: str) -> pd.DataFrame:
+        """Findings of the rules of ``scope`` on ``frame`` (which has ``owner``/``table``/``row``)."""
+        if not len(frame):
+            return pd.DataFrame(columns=FINDING_COLUMNS)
+        names = _Columns(frame, scope)
+        found = []
+        for rule, code in zip(self.rules, self._code):
+            if rule.scope != scope:
+                continue
+            mask = np.asarray(eval(code, {"__builtins__": {}}, names), dtype=bool)
+            if mask.any():
+                hits = frame.loc[mask, LOCATION].copy()
+                hits.insert(0, "rule", rule.id)
+                hits.insert(1, "severity", rule.severity)
+                hits.insert(2, "message", rule.message)
+                hits.insert(3, "scope", scope)
+                found.append(hits)
+        if not found:
+            return pd.DataFrame(columns=FINDING_COLUMNS)
+        return pd.concat(found, ignore_index=True)
+
+    def check(self, state) -> pd.DataFrame:
+        """Findings for the whole document, errors first."""
+        findings = [self.evaluate(quantity_frame(state), "quantities"),
+                    self.evaluate(set_frame(state), "sets"),
+                    self.evaluate(material_frame(state), "materials")]
+        findings = pd.concat([f for f in findings if len(f)] or findings[:1], ignore_index=True)
+        return findings.sort_values("severity", kind="stable", ignore_index=True)
+
+    def check_table(self, table: pd.DataFrame, certified: bool = False) -> pd.DataFrame:
+        """Findings of the quantities rules for one table (``row`` is its row label)."""
+        return self.evaluate(quantity_frame({"materialProperties": [
+            {"uuid": None, "isCertified": certified, "results": [{"quantities": table}]}]}), "quantities")
+
+
+def describe(finding, state) -> str:
+    """Where a finding is, numbered as in the editor tabs."""
+    if finding["scope"] == "materials":
+        n = next((i for i, m in enumerate(state.get("materials", [])) if m.get("uuid") == finding["owner"]), -1)
+        return f"Material {n + 1}"
+    n = next((i for i, mp in enumerate(state.get("materialProperties", [])) if mp.get("uuid") == finding["owner"]), -1)
+    if finding["scope"] == "sets":
+        return f"Properties Set {n + 1}"
+    return f"Properties Set {n + 1}, Table {finding['table'] + 1}, row {finding['row']}"
+
+
+def main(argv=None):
+    from drmd.model import parse_drmd
+
+    parser = argparse.ArgumentParser(description="Check DRMD certificates against the business rules.")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    rules = RuleSet()
+    errors = 0
+    for path in args.paths:
+        with open(path, "rb") as fh:
+            state = parse_drmd(fh.read())
+        start = time.perf_counter()
+        findings = rules.check(state)
+        elapsed = time.perf_counter() - start
+        rows = len(quantity_frame(state))
+        print(f"{path}: {len(findings)} finding(s) in {rows:,} rows, {elapsed * 1000:.0f} ms")
+        for _, finding in findings.iterrows():
+            print(f"  {finding['severity']:7} {describe(finding, state)}: {finding['message']} [{finding['rule']}]")
+        errors += int((findings["severity"] == "error").sum())
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Field model compiled from ``drmd.xsd``.
+
+The schema is read once, as plain XML, and walked from the root element:
+every element and attribute becomes a ``Field`` keyed by its path below the
+root (``administrativeData/coreData/validity/timeAfterDispatch/period``,
+``.../documentIdentifier/@id``; the root itself is ``""``) with its
+occurrence bounds, its type and the facets of that type.  Each field also gets a validator built at compile
+time from those facets, so checking one input while it is typed is a couple
+of regex matches.  Only the plain description of each field (type,
+occurrence bounds, facets) is kept in the compiled model, which is published
+through ``drmd.refdata`` and shared by all processes; the validator of a
+field is built the first time that field is checked.
+
+``xml_schema`` keeps the full xmlschema validator of the same file, which
+is slow to build (it fetches the imported schemas), once per process.
+
+The dcc and si schemas are imported from the web and are not read here;
+the few of their simple types the editor fills directly are described in
+``EXTERNAL_TYPES``.  Complex dcc types (``textType``, ``richContentType``,
+...) are leaves of the model with no facets.
+"""
+import functools
+import os
+import re
+from typing import Callable, Mapping, NamedTuple
+
+from lxml import etree
+
+from drmd.refdata import shared
+
+DRMD_XSD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "drmd.xsd")
+
+XS = "http://www.w3.org/2001/XMLSchema"
+NAMESPACES = {
+    "http://www.w3.org/2001/XMLSchema": "xs",
+    "https://example.org/drmd": "drmd",
+    "https://ptb.de/dcc": "dcc",
+    "https://ptb.de/si": "si",
+    "http://www.w3.org/2000/09/xmldsig#": "ds",
+}
+
+# Lexical spaces of the built-in types the schema uses (whitespace already collapsed).
+_NCNAME = r"[A-Za-z_][\w.\-]*"
+BUILTIN_PATTERNS = {
+    "xs:boolean": r"true|false|1|0",
+    "xs:date": r"-?\d{4,}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])(Z|[+-]\d{2}:\d{2})?",
+    "xs:dateTime": r"-?\d{4,}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])T([01]\d|2[0-3]):[0-5]\d:[0-5]\d(\.\d+)?(Z|[+-]\d{2}:\d{2})?",
+    "xs:duration": r"-?P(?=\d|T\d)(\d+Y)?(\d+M)?(\d+D)?(T(?=\d)(\d+H)?(\d+M)?(\d+(\.\d+)?S)?)?",
+    "xs:integer": r"[+-]?\d+",
+    "xs:decimal": r"[+-]?(\d+(\.\d*)?|\.\d+)",
+    "xs:double": r"[+-]?((\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?|INF)|NaN",
+    "xs:anyURI": r"[^\s<>\"{}|\\^`]*",
+    "xs:ID": _NCNAME,
+    "xs:IDREF": _NCNAME,
+    "xs:IDREFS": rf"{_NCNAME}( {_NCNAME})*",
+}
+BUILTIN_MESSAGES = {
+    "xs:boolean": "must be true or false",
+    "xs:date": "must be a date (YYYY-MM-DD)",
+    "xs:dateTime": "must be a date and time (YYYY-MM-DDThh:mm:ss)",
+    "xs:duration": "must be an xs:duration, e.g. P1Y6M for 1 year 6 months",
+    "xs:integer": "must be an integer",
+    "xs:decimal": "must be a decimal number",
+    "xs:double": "must be a number",
+    "xs:anyURI": "must be a URI without spaces",
+    "xs:ID": "must be an XML name (letter or _ first, no spaces)",
+    "xs:IDREF": "must be an XML name (letter or _ first, no spaces)",
+    "xs:IDREFS": "must be XML names separated by spaces",
+}
+# Simple types of the imported dcc schema that the editor fills directly.
+EXTERNAL_TYPES = {
+    "dcc:notEmptyStringType": ("xs:string", {"minLength": 1}),
+    "dcc:refTypesType": ("xs:string", {}),
+}
+
+
+class Field(NamedTuple):
+    path: str
+    type: str                 # "prefix:name" of the type, or the base type of an anonymous one
+    min_occurs: int
+    max_occurs: int | None    # None for unbounded
+    facets: dict
+    validate: Callable        # value -> error message or None
+    simple: bool = True       # False for complex types (containers)
+
+    @property
+    def required(self) -> bool:
+        return self.min_occurs > 0
+
+
+def _qname(name: str, nsmap: dict) -> str:
+    """``prefix:local`` of a QName attribute, normalized to the prefixes in ``NAMESPACES``."""
+    prefix, _, local = name.rpartition(":")
+    uri = nsmap.get(prefix or None)
+    return f"{NAMESPACES.get(uri, prefix)}:{local}" if uri else local
+
+
+def _collapse(value) -> str:
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def _compile_validator(type_name: str, facets: dict, required: bool):
+    """One closure per field; all regexes are compiled here, not per call.
+
+    Complex fields get no facets and only check that a required value is present.
+    """
+    checks = []
+    if "enumeration" in facets:
+        allowed = frozenset(facets["enumeration"])
+        listing = ", ".join(facets["enumeration"])
+        checks.append(lambda v: None if v in allowed else f"must be one of {listing}")
+    for pattern in facets.get("pattern", ()):
+        try:
+            rx = re.compile(pattern)
+        except re.error:  # XSD-only regex syntax (\p{..}, character class subtraction); left to the validator
+            continue
+        checks.append(lambda v, rx=rx, p=pattern: None if rx.fullmatch(v) else f"must match {p}")
+    if type_name in BUILTIN_PATTERNS and "enumeration" not in facets:
+        rx = re.compile(BUILTIN_PATTERNS[type_name])
+        message = BUILTIN_MESSAGES[type_name]
+        checks.append(lambda v: None if rx.fullmatch(v) else message)
+    if "minLength" in facets:
+        n = int(facets["minLength"])
+        checks.append(lambda v: None if len(v) >= n else ("must not be empty" if n == 1 else f"needs at least {n} characters"))
+    if "maxLength" in facets:
+        n = int(facets["maxLength"])
+        checks.append(lambda v: None if len(v) <= n else f"allows at most {n} characters")
+    for facet, compare, word in (("minInclusive", float.__ge__, "at least"), ("maxInclusive", float.__le__, "at most"),
+                                 ("minExclusive", float.__gt__, "more than"), ("maxExclusive", float.__lt__, "less than")):
+        if facet in facets:
+            bound = float(facets[facet])
+
+            def check(v, bound=bound, compare=compare, word=word):
+                try:
+                    return None if compare(float(v), bound) else f"must be {word} {bound:g}"
+                except ValueError:
+                    return None  # reported by the type pattern
+            checks.append(check)
+
+    def validate(value):
+        v = _collapse(value)
+        if not v:
+            return "required" if required else None
+        for check in checks:
+            error = check(v)
+            if error:
+                return error
+        return None
+    return validate
+
+
+class _Compiler:
+    def __init__(self, xsd_path: str):
+        root = etree.parse(xsd_path).getroot()
+        self.target = NAMESPACES.get(root.get("targetNamespace"), "")
+        self._complex = {f"{self.target}:{t.get('name')}": t for t in root.iterfind(f"{{{XS}}}complexType")}
+        self._simple = {f"{self.target}:{t.get('name')}": t for t in root.iterfind(f"{{{XS}}}simpleType")}
+        self.specs = {}
+        for elem in root.iterfind(f"{{{XS}}}element"):
+            self._walk_type(elem, None, ())
+
+    def _simple_facets(self, simple, nsmap):
+        """``(base type, facets)`` of a simpleType element, following named bases."""
+        restriction = simple.find(f"{{{XS}}}restriction")
+        if restriction is None:
+            return "xs:string", {}
+        base = _qname(restriction.get("base", "xs:string"), nsmap)
+        base, facets = self._resolve_simple(base)
+        facets = dict(facets)
+        for facet in restriction:
+            if not isinstance(facet.tag, str):
+                continue
+            name = etree.QName(facet).localname
+            if name in ("enumeration", "pattern"):
+                facets[name] = facets.get(name, ()) + (facet.get("value"),)
+            else:
+                facets[name] = facet.get("value")
+        return base, facets
+
+    def _resolve_simple(self, type_name):
+        if type_name in self._simple:
+            return self._simple_facets(self._simple[type_name], self._simple[type_name].nsmap)
+        if type_name in EXTERNAL_TYPES:
+            return EXTERNAL_TYPES[type_name]
+        return type_name, {}
+
+    def _add(self, path, type_name, facets, min_occurs, max_occurs, simple=True):
+        self.specs[path] = (type_name, min_occurs, max_occurs, facets if simple else {}, simple)
+
+    def _walk_type(self, decl, parent, seen, min_occurs=1, max_occurs=1):
+        """Add the field for element declaration ``decl`` and, for complex types, its children."""
+        nsmap = decl.nsmap
+        name = decl.get("name") or _qname(decl.get("ref", ""), nsmap)
+        path = "" if parent is None else f"{parent}/{name}" if parent else name
+        type_attr = decl.get("type")
+        type_name = _qname(type_attr, nsmap) if type_attr else ""
+        inline_simple = decl.find(f"{{{XS}}}simpleType")
+        inline_complex = decl.find(f"{{{XS}}}complexType")
+        if inline_simple is not None:
+            base, facets = self._simple_facets(inline_simple, nsmap)
+            self._add(path, base, facets, min_occurs, max_occurs)
+        elif inline_complex is not None or type_name in self._complex:
+            complex_type = inline_complex if inline_complex is not None else self._complex[type_name]
+            self._add(path, type_name or "complex", {}, min_occurs, max_occurs, simple=False)
+            if type_name and type_name in seen:
+                return
+            self._walk_complex(complex_type, path, seen + ((type_name,) if type_name else ()))
+        elif type_name.startswith("xs:") or type_name in self._simple or type_name in EXTERNAL_TYPES:
+            base, facets = self._resolve_simple(type_name)
+            if decl.get("fixed") is not None:
+                facets = dict(facets, enumeration=(decl.get("fixed"),))
+            self._add(path, type_name if type_name.startswith("xs:") or type_name in EXTERNAL_TYPES else base,
+                      facets, min_occurs, max_occurs)
+        else:  # complex type of an imported schema
+            self._add(path, type_name, {}, min_occurs, max_occurs, simple=False)
+
+    def _walk_complex(self, complex_type, path, seen):
+        for attr in complex_type.iter(f"{{{XS}}}attribute"):
+            nsmap = attr.nsmap
+            type_name = _qname(attr.get("type", "xs:string"), nsmap)
+            base, facets = self._resolve_simple(type_name)
+            self._add(f"{path}/@{attr.get('name')}" if path else f"@{attr.get('name')}", type_name if type_name.startswith("xs:") else base, facets,
+                      1 if attr.get("use") == "required" else 0, 1)
+        self._walk_particles(complex_type, path, seen, optional=False)
+
+    def _walk_particles(self, node, path, seen, optional):
+        for child in node:
+            if not isinstance(child.tag, str):
+                continue
+            tag = etree.QName(child).localname
+            if tag in ("sequence", "all", "choice", "complexContent", "extension", "restriction"):
+                # Every branch of a choice is optional on its own.
+                self._walk_particles(child, path, seen, optional or tag == "choice" or child.get("minOccurs") == "0")
+            elif tag == "element":
+                min_occurs = 0 if optional else int(child.get("minOccurs", "1"))
+                max_attr = child.get("maxOccurs", "1")
+                self._walk_type(child, path, seen, min_occurs, None if max_attr == "unbounded" else int(max_attr))
+
+def compile_fields(xsd_path: str = DRMD_XSD) -> dict:
+    """``{path: (type, min_occurs, max_occurs, facets, simple)}`` for every field of the schema."""
+    return _Compiler(xsd_path).specs
+
+
+class FieldModel:
+    def __init__(self, specs: Mapping):
+        """``specs`` as returned by ``compile_fields`` (or a shared view of it)."""
+        self.specs = specs
+        self._fields = {}
+
+    def _field(self, path: str) -> Field | None:
+        try:
+            return self._fields[path]
+        except KeyError:
+            pass
+        spec = self.specs.get(path)
+        field = None
+        if spec is not None:
+            type_name, min_occurs, max_occurs, facets, simple = spec
+            field = Field(path, type_name, min_occurs, max_occurs, facets,
+                          _compile_validator(type_name, facets, min_occurs > 0), simple)
+        self._fields[path] = field
+        return field
+
+    def __getitem__(self, path: str) -> Field:
+        field = self._field(path)
+        if field is None:
+            raise KeyError(path)
+        return field
+
+    def __contains__(self, path: str) -> bool:
+        return self._field(path) is not None
+
+    def check(self, path: str, value) -> str | None:
+        """Error message for ``value`` in the field at ``path``; None when it is valid (or the path is unknown)."""
+        field = self._field(path)
+        return field.validate(value) if field is not None else None
+
+    def required(self, prefix: str = ""):
+        """Paths of required simple fields below ``prefix``."""
+        return [path for path, (_, min_occurs, _, _, simple) in self.specs.items()
+                if min_occurs > 0 and simple and path.startswith(prefix)]
+
+
+@functools.lru_cache(maxsize=4)
+def xml_schema(xsd_path: str = DRMD_XSD):
+    import xmlschema
+    return xmlschema.XMLSchema(xsd_path)
+
+
+@functools.lru_cache(maxsize=4)
+def field_model(xsd_path: str = DRMD_XSD) -> FieldModel:
+    return FieldModel(shared("fields", (xsd_path, __file__), functools.partial(compile_fields, xsd_path)))
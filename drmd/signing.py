@@ -0,0 +1,635 @@
+"""Enveloped XML signatures (XMLDSig) for DRMD documents.
+
+Every top-level section of the document (``administrativeData``,
+``materials``, ``materialPropertiesList``, ``statements``, ``comment`` and each
+``document``) gets its own ``ds:Reference``.  The section is selected with an
+XPath Filter 2.0 transform and canonicalized with exclusive C14N.  An extra
+"skeleton" reference covers the root element's own tag and attributes
+(``schemaVersion``) and the list of its children: their order, tags and
+attributes and the text between them, so sections cannot be added, removed or
+reordered without breaking the signature.
+Each section is canonicalized once per signature.  Its digest is cached
+under a cheap fingerprint of the raw subtree, so re-signing after an edit
+only re-canonicalizes the sections that changed.
+
+Batch signing (``sign_files`` / ``python -m drmd.signing``) spreads documents
+over worker processes that each load the key and certificate once.
+
+``verify_document`` checks every ``ds:Signature`` of an incoming document.
+A signature is only valid if its references cover the whole document: one
+reference to the root element, or a header or skeleton reference plus one
+reference per root child other than ``ds:Signature``.  Otherwise content
+could be inserted next to the signed sections.  A reference with ``URI=""``
+and no filter covers the whole document, including processing instructions
+and comments outside the root; ``ds:Object`` content that no reference
+covers makes a signature invalid.  A valid signature is only reported as
+trusted when its certificate chains to one in ``DRMD_TRUST_STORE`` (a PEM
+bundle or a directory of certificates).
+Results are cached by the SHA-256 of the document bytes, so the same file
+uploaded again costs one lookup.
+"""
+import argparse
+import base64
+import copy
+import functools
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from lxml import etree
+
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+DSIG2_NS = "http://www.w3.org/2002/06/xmldsig-filter2"
+C14N_EXC = "http://www.w3.org/2001/10/xml-exc-c14n#"
+XPATH_FILTER2 = "http://www.w3.org/2002/06/xmldsig-filter2"
+DIGEST_SHA256 = "http://www.w3.org/2001/04/xmlenc#sha256"
+RSA_SHA256 = "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"
+ECDSA_SHA256 = "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256"
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+DEFAULT_TRUST_STORE = os.environ.get("DRMD_TRUST_STORE", "")
+MAX_CHAIN_LENGTH = 8
+
+# Algorithms accepted when verifying documents signed by other tools.
+C14N_METHODS = {
+    "http://www.w3.org/2001/10/xml-exc-c14n#": dict(exclusive=True, with_comments=False),
+    "http://www.w3.org/2001/10/xml-exc-c14n#WithComments": dict(exclusive=True, with_comments=True),
+    "http://www.w3.org/TR/2001/REC-xml-c14n-20010315": dict(exclusive=False, with_comments=False),
+    "http://www.w3.org/TR/2001/REC-xml-c14n-20010315#WithComments": dict(exclusive=False, with_comments=True),
+}
+DIGEST_METHODS = {
+    "http://www.w3.org/2000/09/xmldsig#sha1": hashlib.sha1,
+    DIGEST_SHA256: hashlib.sha256,
+    "http://www.w3.org/2001/04/xmldsig-more#sha384": hashlib.sha384,
+    "http://www.w3.org/2001/04/xmlenc#sha512": hashlib.sha512,
+}
+SIGNATURE_METHODS = {
+    "http://www.w3.org/2000/09/xmldsig#rsa-sha1": ("rsa", hashes.SHA1),
+    RSA_SHA256: ("rsa", hashes.SHA256),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha384": ("rsa", hashes.SHA384),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha512": ("rsa", hashes.SHA512),
+    ECDSA_SHA256: ("ec", hashes.SHA256),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha384": ("ec", hashes.SHA384),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha512": ("ec", hashes.SHA512),
+}
+
+# XPath Filter 2.0 expressions: the n-th element child of the root; the root
+# element without its content (written by earlier versions); the root element
+# with its children but without their content and without signatures.
+SECTION_XPATH = "/*/*[{position}]"
+HEADER_XPATH = "/*/node()"
+SKELETON_XPATH = "/*/*/node() | /*/ds:Signature"
+
+
+def xml_parser():
+    # lxml parsers must not be shared between threads; they are cheap to create.
+    return etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+
+def _ds(tag):
+    return f"{{{DS_NS}}}{tag}"
+
+
+def c14n(elem) -> bytes:
+    return etree.tostring(elem, method="c14n", exclusive=True, with_comments=False)
+
+
+def _pi_c14n(node) -> bytes:
+    text = f"<?{node.target} {node.text}?>" if node.text else f"<?{node.target}?>"
+    return text.encode("utf-8")
+
+
+def header_c14n(root) -> bytes:
+    """Canonical form of the root element with all of its children removed.
+
+    This equals exclusive C14N of the node-set produced by subtracting
+    ``/*/node()`` from the document: top-level processing instructions, the
+    root start tag with its attributes and namespaces, and the end tag.
+    """
+    shell = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+    before = [n for n in reversed(list(root.itersiblings(preceding=True))) if isinstance(n, etree._ProcessingInstruction)]
+    after = [n for n in root.itersiblings() if isinstance(n, etree._ProcessingInstruction)]
+    return (b"".join(_pi_c14n(n) + b"\n" for n in before) + c14n(shell)
+            + b"".join(b"\n" + _pi_c14n(n) for n in after))
+
+
+def skeleton_c14n(root) -> bytes:
+    """Canonical form of the node-set produced by subtracting ``SKELETON_XPATH`` from the document.
+
+    That is the header (see ``header_c14n``) with the root's children in
+    between: the start and end tag of each element child other than
+    ``ds:Signature``, processing instructions, and the text around them.
+    """
+    shell = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+    shell.text = root.text
+    last = None
+    for child in root:
+        if child.tag == _ds("Signature"):
+            # The signature's subtree goes, the text after it stays.
+            tail = child.tail or ""
+            if last is None:
+                shell.text = (shell.text or "") + tail
+            else:
+                last.tail = (last.tail or "") + tail
+            continue
+        if isinstance(child.tag, str):
+            last = etree.SubElement(shell, child.tag, attrib=dict(child.attrib), nsmap=child.nsmap)
+        elif isinstance(child, etree._ProcessingInstruction):
+            last = etree.ProcessingInstruction(child.target, child.text)
+            shell.append(last)
+        else:
+            # Comments are not part of the canonical form; their tail is.
+            tail = child.tail or ""
+            if last is None:
+                shell.text = (shell.text or "") + tail
+            else:
+                last.tail = (last.tail or "") + tail
+            continue
+        last.tail = child.tail
+    before = [n for n in reversed(list(root.itersiblings(preceding=True))) if isinstance(n, etree._ProcessingInstruction)]
+    after = [n for n in root.itersiblings() if isinstance(n, etree._ProcessingInstruction)]
+    return (b"".join(_pi_c14n(n) + b"\n" for n in before) + c14n(shell)
+            + b"".join(b"\n" + _pi_c14n(n) for n in after))
+
+
+def signable_sections(root):
+    """(position, element) of the root's element children, excluding signatures."""
+    sections = []
+    for position, child in enumerate((c for c in root if isinstance(c.tag, str)), start=1):
+        if child.tag != _ds("Signature"):
+            sections.append((position, child))
+    return sections
+
+
+class DigestCache:
+    """Bounded map from a fingerprint of a section's raw serialization to its
+    base64 SHA-256 digest over the exclusive-C14N form.
+
+    Equal raw bytes imply equal canonical bytes, so a hit skips the
+    canonicalization and hashing of unchanged sections.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, elem) -> str:
+        key = hashlib.blake2b(etree.tostring(elem, with_tail=False), digest_size=20).digest()
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = base64.b64encode(hashlib.sha256(c14n(elem)).digest()).decode("ascii")
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+
+def load_private_key(data: bytes, password: bytes | None = None):
+    try:
+        return serialization.load_pem_private_key(data, password=password)
+    except ValueError:
+        return serialization.load_der_private_key(data, password=password)
+
+
+def load_certificate(data: bytes) -> x509.Certificate:
+    try:
+        return x509.load_pem_x509_certificate(data)
+    except ValueError:
+        return x509.load_der_x509_certificate(data)
+
+
+class Signer:
+    """Signs DRMD documents with one private key and its X.509 certificate."""
+
+    def __init__(self, private_key, certificate: x509.Certificate, digest_cache: DigestCache | None = None):
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = RSA_SHA256
+        elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+            self.algorithm = ECDSA_SHA256
+        else:
+            raise ValueError("Only RSA and EC private keys are supported.")
+        if certificate.public_key().public_numbers() != private_key.public_key().public_numbers():
+            raise ValueError("The certificate does not belong to the private key.")
+        self.private_key = private_key
+        self.certificate = certificate
+        self.cert_b64 = base64.b64encode(certificate.public_bytes(serialization.Encoding.DER)).decode("ascii")
+        self.digests = digest_cache or DigestCache()
+
+    @classmethod
+    def from_pem(cls, key_data: bytes, cert_data: bytes, password: bytes | None = None):
+        return cls(load_private_key(key_data, password), load_certificate(cert_data))
+
+    def _sign_value(self, data: bytes) -> bytes:
+        if self.algorithm == RSA_SHA256:
+            return self.private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        # XMLDSig wants the raw r || s form, not DER.
+        r, s = decode_dss_signature(self.private_key.sign(data, ec.ECDSA(hashes.SHA256())))
+        size = (self.private_key.curve.key_size + 7) // 8
+        return r.to_bytes(size, "big") + s.to_bytes(size, "big")
+
+    def _reference(self, signed_info, xpath, filter_type, digest):
+        ref = etree.SubElement(signed_info, _ds("Reference"), URI="")
+        transforms = etree.SubElement(ref, _ds("Transforms"))
+        xpath_t = etree.SubElement(transforms, _ds("Transform"), Algorithm=XPATH_FILTER2)
+        etree.SubElement(xpath_t, f"{{{DSIG2_NS}}}XPath", Filter=filter_type,
+                         nsmap={"dsig-xpath": DSIG2_NS, "ds": DS_NS}).text = xpath
+        etree.SubElement(transforms, _ds("Transform"), Algorithm=C14N_EXC)
+        etree.SubElement(ref, _ds("DigestMethod"), Algorithm=DIGEST_SHA256)
+        etree.SubElement(ref, _ds("DigestValue")).text = digest
+
+    def sign_tree(self, root, replace: bool = True):
+        """Append an enveloped ds:Signature to ``root`` (an lxml element)."""
+        if replace:
+            for old in root.findall(_ds("Signature")):
+                old.getparent().remove(old)
+        signature = etree.Element(_ds("Signature"), nsmap={"ds": DS_NS})
+        signed_info = etree.SubElement(signature, _ds("SignedInfo"))
+        etree.SubElement(signed_info, _ds("CanonicalizationMethod"), Algorithm=C14N_EXC)
+        etree.SubElement(signed_info, _ds("SignatureMethod"), Algorithm=self.algorithm)
+        skeleton_digest = base64.b64encode(hashlib.sha256(skeleton_c14n(root)).digest()).decode("ascii")
+        self._reference(signed_info, SKELETON_XPATH, "subtract", skeleton_digest)
+        for position, section in signable_sections(root):
+            self._reference(signed_info, SECTION_XPATH.format(position=position), "intersect", self.digests.digest(section))
+        value = etree.SubElement(signature, _ds("SignatureValue"))
+        key_info = etree.SubElement(signature, _ds("KeyInfo"))
+        x509_data = etree.SubElement(key_info, _ds("X509Data"))
+        etree.SubElement(x509_data, _ds("X509Certificate")).text = self.cert_b64
+        root.append(signature)
+        # SignedInfo is canonicalized in place, i.e. with the document as context.
+        value.text = base64.b64encode(self._sign_value(c14n(signed_info))).decode("ascii")
+        return signature
+
+    def sign(self, xml_bytes: bytes) -> bytes:
+        """Return ``xml_bytes`` with an enveloped signature appended to the root."""
+        tree = etree.ElementTree(etree.fromstring(xml_bytes, xml_parser()))
+        self.sign_tree(tree.getroot())
+        return etree.tostring(tree, xml_declaration=True, encoding="utf-8")
+
+
+# -----------------------------------------------------------------------------
+# Verification
+
+@dataclass(frozen=True)
+class VerificationResult:
+    status: str            # "unsigned", "valid", "invalid" or "error"
+    message: str = ""
+    signer: str = ""       # subject of the signing certificate
+    signatures: int = 0
+    trusted: bool = False  # every signing certificate chains to the trust store
+
+    @property
+    def valid(self) -> bool:
+        return self.status == "valid"
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _canonical(elem, method: str) -> bytes:
+    if method not in C14N_METHODS:
+        raise _Unsupported(f"canonicalization {method}")
+    return etree.tostring(elem, method="c14n", **C14N_METHODS[method])
+
+
+def _without_signature(target, signature):
+    """Copy of ``target`` (an element or the whole document) with ``signature`` removed
+    (enveloped-signature transform)."""
+    top = target.getroot() if isinstance(target, etree._ElementTree) else target
+    steps = []
+    elem = signature
+    while elem is not top:
+        parent = elem.getparent()
+        steps.append([c for c in parent if isinstance(c.tag, str)].index(elem) + 1)
+        elem = parent
+    target_copy = copy.deepcopy(target)
+    top_copy = target_copy.getroot() if isinstance(target_copy, etree._ElementTree) else target_copy
+    sig_copy = top_copy.xpath("/".join(["."] + [f"*[{n}]" for n in reversed(steps)]))[0]
+    parent = sig_copy.getparent()
+    # lxml moves the tail text with the element; the transform keeps it.
+    if sig_copy.tail:
+        previous = sig_copy.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + sig_copy.tail
+        else:
+            parent.text = (parent.text or "") + sig_copy.tail
+    parent.remove(sig_copy)
+    return target_copy
+
+
+def _reference_data(root, signature, ref, canonical_cache):
+    """Canonical octets a ds:Reference points at (subset of XMLDSig transforms), and what they cover.
+
+    The scope is "header" or "skeleton" for the root filters, "document" for
+    the whole root element, otherwise the referenced element.
+    """
+    uri = ref.get("URI")
+    transforms = [t for t in ref.iterfind(f"{_ds('Transforms')}/{_ds('Transform')}")]
+    c14n_method = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+    target, enveloped, header = None, False, None
+    if uri and uri.startswith("#"):
+        ident = uri[1:]
+        found = root.xpath("//*[@Id=$v or @ID=$v or @id=$v]", v=ident)
+        if len(found) != 1:
+            raise _Unsupported(f"reference {uri} not found")
+        target = found[0]
+    elif uri != "":
+        raise _Unsupported(f"external reference {uri!r}")
+    for transform in transforms:
+        alg = transform.get("Algorithm")
+        if alg == ENVELOPED:
+            enveloped = True
+        elif alg == XPATH_FILTER2:
+            xpaths = transform.findall(f"{{{DSIG2_NS}}}XPath")
+            if len(xpaths) != 1:
+                raise _Unsupported("multiple XPath filters")
+            expr, kind = (xpaths[0].text or "").strip(), xpaths[0].get("Filter")
+            if kind == "subtract" and expr == HEADER_XPATH:
+                header = header_c14n
+            elif kind == "subtract" and expr == SKELETON_XPATH:
+                header = skeleton_c14n
+            elif kind == "intersect":
+                prefixes = {k: v for k, v in xpaths[0].nsmap.items() if k}
+                selected = root.getroottree().xpath(expr, namespaces=prefixes)
+                if len(selected) != 1 or not isinstance(selected[0], etree._Element):
+                    raise _Unsupported(f"XPath filter {expr!r} does not select one element")
+                target = selected[0]
+            else:
+                raise _Unsupported(f"XPath filter {kind} {expr!r}")
+        elif alg in C14N_METHODS:
+            c14n_method = alg
+        else:
+            raise _Unsupported(f"transform {alg}")
+    if header is not None:
+        return header(root), "header" if header is header_c14n else "skeleton"
+    if target is None:
+        # URI="" is the whole document: top-level processing instructions and comments too.
+        document = root.getroottree()
+        if enveloped:
+            return _canonical(_without_signature(document, signature), c14n_method), "document"
+        key = ("", c14n_method)
+        if key not in canonical_cache:
+            canonical_cache[key] = _canonical(document, c14n_method)
+        return canonical_cache[key], "document"
+    scope = "document" if target is root else target
+    if enveloped and any(a is target for a in signature.iterancestors()):
+        return _canonical(_without_signature(target, signature), c14n_method), scope
+    # lxml proxies are recreated on access, so key by tree path rather than id().
+    key = (target.getroottree().getpath(target), c14n_method)
+    if key not in canonical_cache:
+        canonical_cache[key] = _canonical(target, c14n_method)
+    return canonical_cache[key], scope
+
+
+def _check_coverage(root, scopes):
+    """Raise unless the references cover the root element and every section (child other than a signature)."""
+    if "document" in scopes:
+        return
+    if "header" not in scopes and "skeleton" not in scopes:
+        raise InvalidSignature("signature does not cover the root element")
+    tree = root.getroottree()
+    covered = {tree.getpath(s) for s in scopes if isinstance(s, etree._Element)}
+    for position, section in signable_sections(root):
+        if tree.getpath(section) not in covered:
+            raise InvalidSignature(f"signature does not cover {etree.QName(section).localname} (/*/*[{position}])")
+
+
+def _check_objects(signature, scopes):
+    """Raise if a ds:Object of ``signature`` has content that no reference covers."""
+    tree = signature.getroottree()
+    covered = {tree.getpath(s) for s in scopes if isinstance(s, etree._Element)}
+    for obj in signature.findall(_ds("Object")):
+        if tree.getpath(obj) not in covered and (len(obj) or (obj.text or "").strip()):
+            raise InvalidSignature("ds:Object content is not covered by the signature")
+
+
+@functools.lru_cache(maxsize=4)
+def load_trust_store(path: str = DEFAULT_TRUST_STORE) -> tuple:
+    """Certificates of a PEM bundle, or of every file in a directory (PEM or DER)."""
+    if not path:
+        return ()
+    files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+    anchors = []
+    for name in files:
+        with open(name, "rb") as fh:
+            data = fh.read()
+        if b"-----BEGIN CERTIFICATE-----" in data:
+            anchors.extend(x509.load_pem_x509_certificates(data))
+        else:
+            anchors.append(x509.load_der_x509_certificate(data))
+    return tuple(anchors)
+
+
+def _is_ca(cert) -> bool:
+    try:
+        return cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    except x509.ExtensionNotFound:
+        return False
+
+
+def certificate_trusted(cert, intermediates=(), anchors=None) -> bool:
+    """True if ``cert`` is a trust anchor or chains to one through ``intermediates``.
+
+    Every certificate of the chain must be within its validity period and
+    every issuer must be a CA.  ``anchors`` defaults to ``DRMD_TRUST_STORE``.
+    """
+    anchors = load_trust_store() if anchors is None else tuple(anchors)
+    if not anchors:
+        return False
+    now = datetime.now(timezone.utc)
+    pool = [*intermediates, *anchors]
+    current = cert
+    for _ in range(MAX_CHAIN_LENGTH):
+        if not current.not_valid_before_utc <= now <= current.not_valid_after_utc:
+            return False
+        if current in anchors:
+            return True
+        for issuer in pool:
+            if issuer == current or issuer.subject != current.issuer or not _is_ca(issuer):
+                continue
+            try:
+                current.verify_directly_issued_by(issuer)
+            except (ValueError, TypeError, InvalidSignature):
+                continue
+            current = issuer
+            break
+        else:
+            return False
+    return False
+
+
+def _check_signature_value(cert, method, data, value):
+    kind, hash_cls = SIGNATURE_METHODS[method]
+    public_key = cert.public_key()
+    if kind == "rsa" and isinstance(public_key, rsa.RSAPublicKey):
+        public_key.verify(value, data, padding.PKCS1v15(), hash_cls())
+    elif kind == "ec" and isinstance(public_key, ec.EllipticCurvePublicKey):
+        half = len(value) // 2
+        der = encode_dss_signature(int.from_bytes(value[:half], "big"), int.from_bytes(value[half:], "big"))
+        public_key.verify(der, data, ec.ECDSA(hash_cls()))
+    else:
+        raise _Unsupported(f"signature method {method} does not match the certificate key")
+
+
+def _verify_one(root, signature, canonical_cache) -> tuple:
+    """Verify one ds:Signature; returns ``(signer subject, trusted)`` or raises."""
+    signed_info = signature.find(_ds("SignedInfo"))
+    if signed_info is None:
+        raise _Unsupported("ds:SignedInfo missing")
+    c14n_method = signed_info.find(_ds("CanonicalizationMethod")).get("Algorithm")
+    sig_method = signed_info.find(_ds("SignatureMethod")).get("Algorithm")
+    if sig_method not in SIGNATURE_METHODS:
+        raise _Unsupported(f"signature method {sig_method}")
+    cert_elems = signature.findall(f"{_ds('KeyInfo')}/{_ds('X509Data')}/{_ds('X509Certificate')}")
+    if not cert_elems or not (cert_elems[0].text or "").strip():
+        raise _Unsupported("no X.509 certificate in ds:KeyInfo")
+    # The first certificate signs; any others are intermediates of its chain.
+    cert, *intermediates = [x509.load_der_x509_certificate(base64.b64decode("".join((e.text or "").split())))
+                            for e in cert_elems]
+
+    references = signed_info.findall(_ds("Reference"))
+    if not references:
+        raise _Unsupported("no ds:Reference")
+    scopes = []
+    for ref in references:
+        digest_alg = ref.find(_ds("DigestMethod")).get("Algorithm")
+        if digest_alg not in DIGEST_METHODS:
+            raise _Unsupported(f"digest method {digest_alg}")
+        data, scope = _reference_data(root, signature, ref, canonical_cache)
+        scopes.append(scope)
+        expected = base64.b64decode("".join((ref.findtext(_ds("DigestValue")) or "").split()))
+        if DIGEST_METHODS[digest_alg](data).digest() != expected:
+            raise InvalidSignature(f"digest mismatch for reference {_describe(ref)}")
+    _check_coverage(root, scopes)
+    _check_objects(signature, scopes)
+
+    value = base64.b64decode("".join((signature.findtext(_ds("SignatureValue")) or "").split()))
+    _check_signature_value(cert, sig_method, _canonical(signed_info, c14n_method), value)
+    return cert.subject.rfc4514_string(), certificate_trusted(cert, intermediates)
+
+
+def _describe(ref) -> str:
+    xpath = ref.find(f"{_ds('Transforms')}/{_ds('Transform')}/{{{DSIG2_NS}}}XPath")
+    return xpath.text if xpath is not None else (ref.get("URI") or '""')
+
+
+def verify_document(xml_bytes: bytes) -> VerificationResult:
+    """Check all signatures of a document (uncached)."""
+    try:
+        root = etree.fromstring(xml_bytes, xml_parser())
+    except etree.XMLSyntaxError as e:
+        return VerificationResult("error", f"XML could not be parsed: {e}")
+    signatures = list(root.iter(_ds("Signature")))
+    if not signatures:
+        return VerificationResult("unsigned")
+    # Subtrees referenced by several signatures are canonicalized once.
+    canonical_cache = {}
+    signers = []
+    for signature in signatures:
+        try:
+            signers.append(_verify_one(root, signature, canonical_cache))
+        except InvalidSignature as e:
+            return VerificationResult("invalid", str(e) or "signature value does not match", signatures=len(signatures))
+        except _Unsupported as e:
+            return VerificationResult("error", f"unsupported signature: {e}", signatures=len(signatures))
+        except Exception as e:
+            return VerificationResult("error", f"{type(e).__name__}: {e}", signatures=len(signatures))
+    return VerificationResult("valid", signer="; ".join(s for s, _ in signers), signatures=len(signatures),
+                              trusted=all(t for _, t in signers))
+
+
+_verify_cache = OrderedDict()
+_verify_lock = threading.Lock()
+VERIFY_CACHE_SIZE = 10000
+
+
+def verify_cached(xml_bytes: bytes) -> VerificationResult:
+    """``verify_document`` memoized by the SHA-256 of the document bytes."""
+    key = hashlib.sha256(xml_bytes).digest()
+    with _verify_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return _verify_cache[key]
+    result = verify_document(xml_bytes)
+    with _verify_lock:
+        _verify_cache[key] = result
+        if len(_verify_cache) > VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Batch signing
+
+_worker_signer = None
+
+
+def _init_worker(key_data, cert_data, password):
+    global _worker_signer
+    _worker_signer = Signer.from_pem(key_data, cert_data, password)
+
+
+def _sign_file(job):
+    src, dst = job
+    try:
+        with open(src, "rb") as fh:
+            signed = _worker_signer.sign(fh.read())
+        with open(dst, "wb") as fh:
+            fh.write(signed)
+        return src, dst, None
+    except Exception as e:
+        return src, dst, f"{type(e).__name__}: {e}"
+
+
+def sign_files(paths, out_dir, key_data: bytes, cert_data: bytes, password: bytes | None = None, max_workers: int | None = None):
+    """Sign many files in parallel; yields ``(source, target, error)`` per file."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(p, os.path.join(out_dir, os.path.basename(p))) for p in paths]
+    # Fail early on a bad key or password instead of once per worker.
+    Signer.from_pem(key_data, cert_data, password)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(key_data, cert_data, password)) as pool:
+        yield from pool.map(_sign_file, jobs, chunksize=8)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sign DRMD XML files with an enveloped XML signature.")
+    parser.add_argument("files", nargs="+", help="DRMD XML files to sign")
+    parser.add_argument("--key", required=True, help="private key (PEM or DER)")
+    parser.add_argument("--cert", required=True, help="X.509 certificate (PEM or DER)")
+    parser.add_argument("--password-env", help="environment variable holding the key password")
+    parser.add_argument("--out", required=True, help="output directory for signed files")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    with open(args.key, "rb") as fh:
+        key_data = fh.read()
+    with open(args.cert, "rb") as fh:
+        cert_data = fh.read()
+    password = os.environ[args.password_env].encode() if args.password_env else None
+
+    failed = 0
+    for src, dst, error in sign_files(args.files, args.out, key_data, cert_data, password, args.workers):
+        if error:
+            failed += 1
+            print(f"FAILED {src}: {error}", file=sys.stderr)
+        else:
+            print(f"signed {src} -> {dst}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
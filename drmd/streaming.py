@@ -0,0 +1,107 @@
+"""Incremental XML export.
+
+The in-memory export builds the whole ElementTree, serializes it and
+pretty-prints it through minidom, so peak memory is several times the size
+of the document.  ``StreamingWriter`` writes the document to a file or any
+binary stream instead: the root start tag is written first, every section is
+serialized as soon as it is built and then dropped, and attachment payloads
+are written as base64 in fixed-size pieces straight from the blob store.
+Memory is bounded by the largest section (in practice one property set),
+not by the document.
+
+    with open(path, "wb") as fh, StreamingWriter(fh, root_tag, NAMESPACES) as out:
+        out.section(admin_data)
+        with out.element(list_tag):
+            for item in items:
+                out.section(build(item))
+        out.section(document_elem, payload=blob_store.iter_base64(sha256))
+"""
+import contextlib
+import re
+import uuid
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+_XMLNS = re.compile(r'\s+xmlns:(\w+)="([^"]*)"')
+
+
+def _qname(tag: str, namespaces: dict) -> str:
+    """``{uri}local`` as ``prefix:local`` using ``namespaces`` (prefix -> uri)."""
+    if tag.startswith("{"):
+        uri, local = tag[1:].split("}", 1)
+        for prefix, ns in namespaces.items():
+            if ns == uri:
+                return f"{prefix}:{local}"
+    return tag
+
+
+class StreamingWriter:
+    def __init__(self, out, root_tag: str, namespaces: dict, attrib: dict | None = None, indent: str = "  "):
+        """``out`` is a binary stream; ``namespaces`` maps prefixes to URIs and
+        must use the prefixes registered with ``ET.register_namespace``."""
+        self.out = out
+        self.namespaces = dict(namespaces)
+        self.indent = indent
+        self.root = _qname(root_tag, self.namespaces)
+        self.attrib = attrib or {}
+        self.bytes_written = 0
+        self.depth = 1
+
+    def _write(self, text: str):
+        data = text.encode("utf-8")
+        self.out.write(data)
+        self.bytes_written += len(data)
+
+    def __enter__(self):
+        decls = "".join(f" xmlns:{prefix}={quoteattr(uri)}" for prefix, uri in self.namespaces.items())
+        attrs = "".join(f" {_qname(k, self.namespaces)}={quoteattr(str(v))}" for k, v in self.attrib.items())
+        self._write(f'<?xml version="1.0" encoding="utf-8"?>\n<{self.root}{decls}{attrs}>')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._write(f"\n</{self.root}>\n")
+        return False
+
+    @contextlib.contextmanager
+    def element(self, tag: str, attrib: dict | None = None):
+        """Open ``tag`` around the sections written inside the ``with`` block."""
+        name = _qname(tag, self.namespaces)
+        attrs = "".join(f" {_qname(k, self.namespaces)}={quoteattr(str(v))}" for k, v in (attrib or {}).items())
+        self._write(f"\n{self.indent * self.depth}<{name}{attrs}>")
+        self.depth += 1
+        yield self
+        self.depth -= 1
+        self._write(f"\n{self.indent * self.depth}</{name}>")
+
+    def _serialize(self, elem) -> str:
+        elem.tail = None
+        ET.indent(elem, space=self.indent, level=self.depth)
+        text = ET.tostring(elem, encoding="unicode")
+        # The namespaces are declared once on the root; drop the copies ElementTree puts on each section.
+        end = text.index(">")
+        head = _XMLNS.sub(lambda m: "" if self.namespaces.get(m.group(1)) == m.group(2) else m.group(0), text[:end])
+        return head + text[end:]
+
+    def section(self, elem, payload=None):
+        """Write ``elem`` (an ElementTree element) as the next child of the root.
+
+        With ``payload`` (an iterable of text pieces) the element's first
+        empty descendant of tag ``dataBase64`` gets that text, written piece by
+        piece without ever being held in full.
+        """
+        if elem is None:
+            return
+        marker = None
+        if payload is not None:
+            target = next(e for e in elem.iter() if e.tag.endswith("dataBase64") and not e.text)
+            marker = target.text = f"@@{uuid.uuid4().hex}@@"
+        text = self._serialize(elem)
+        if marker is None:
+            self._write(f"\n{self.indent * self.depth}{text}")
+            return
+        before, after = text.split(marker, 1)
+        self._write(f"\n{self.indent * self.depth}{before}")
+        for piece in payload:
+            self._write(piece)
+        self._write(after)
@@ -0,0 +1,158 @@
+r"""Quantity kinds and units.
+
+Quantity kinds come from the bundled QUDT vocabulary (``qudt.ttl``): for each
+kind its applicable QUDT units and its dimension vector.  Certificates state
+units in D-SI notation (``\milli\gram\per\kilogram``); ``dsi_to_qudt`` maps
+those to QUDT unit names (``MilliGM-PER-KiloGM``) and ``dsi_dimension`` to a
+QUDT dimension vector, so values can be matched against a quantity kind even
+when the certificate does not name the kind.
+
+The parsed kinds are published through ``drmd.refdata``, so the turtle file
+is parsed once for all processes rather than once per worker.
+"""
+import functools
+import os
+import re
+from typing import NamedTuple
+
+from drmd.refdata import shared
+
+QUDT_TTL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "qudt.ttl")
+
+# D-SI prefix -> QUDT prefix and power of ten
+PREFIXES = {
+    "yocto": ("Yocto", -24), "zepto": ("Zepto", -21), "atto": ("Atto", -18), "femto": ("Femto", -15),
+    "pico": ("Pico", -12), "nano": ("Nano", -9), "micro": ("Micro", -6), "milli": ("Milli", -3),
+    "centi": ("Centi", -2), "deci": ("Deci", -1), "deca": ("Deca", 1), "hecto": ("Hecto", 2),
+    "kilo": ("Kilo", 3), "mega": ("Mega", 6), "giga": ("Giga", 9), "tera": ("Tera", 12),
+}
+
+# D-SI unit -> QUDT unit and exponents of (A, E, L, I, M, H, T)
+UNITS = {
+    "metre": ("M", (0, 0, 1, 0, 0, 0, 0)),
+    "gram": ("GM", (0, 0, 0, 0, 1, 0, 0)),
+    "kilogram": ("KiloGM", (0, 0, 0, 0, 1, 0, 0)),
+    "second": ("SEC", (0, 0, 0, 0, 0, 0, 1)),
+    "minute": ("MIN", (0, 0, 0, 0, 0, 0, 1)),
+    "hour": ("HR", (0, 0, 0, 0, 0, 0, 1)),
+    "day": ("DAY", (0, 0, 0, 0, 0, 0, 1)),
+    "ampere": ("A", (0, 1, 0, 0, 0, 0, 0)),
+    "kelvin": ("K", (0, 0, 0, 0, 0, 1, 0)),
+    "degreecelsius": ("DEG_C", (0, 0, 0, 0, 0, 1, 0)),
+    "mole": ("MOL", (1, 0, 0, 0, 0, 0, 0)),
+    "candela": ("CD", (0, 0, 0, 1, 0, 0, 0)),
+    "litre": ("L", (0, 0, 3, 0, 0, 0, 0)),
+    "liter": ("L", (0, 0, 3, 0, 0, 0, 0)),
+    "hertz": ("HZ", (0, 0, 0, 0, 0, 0, -1)),
+    "newton": ("N", (0, 0, 1, 0, 1, 0, -2)),
+    "pascal": ("PA", (0, 0, -1, 0, 1, 0, -2)),
+    "joule": ("J", (0, 0, 2, 0, 1, 0, -2)),
+    "watt": ("W", (0, 0, 2, 0, 1, 0, -3)),
+    "coulomb": ("C", (0, 1, 0, 0, 0, 0, 1)),
+    "volt": ("V", (0, -1, 2, 0, 1, 0, -3)),
+    "ohm": ("OHM", (0, -2, 2, 0, 1, 0, -3)),
+    "siemens": ("S", (0, 2, -2, 0, -1, 0, 3)),
+    "becquerel": ("BQ", (0, 0, 0, 0, 0, 0, -1)),
+    "gray": ("GRAY", (0, 0, 2, 0, 0, 0, -2)),
+    "sievert": ("SV", (0, 0, 2, 0, 0, 0, -2)),
+    "katal": ("KAT", (1, 0, 0, 0, 0, 0, -1)),
+    "one": ("UNITLESS", (0, 0, 0, 0, 0, 0, 0)),
+    "percent": ("PERCENT", (0, 0, 0, 0, 0, 0, 0)),
+    "ppm": ("PPM", (0, 0, 0, 0, 0, 0, 0)),
+}
+
+_TOKEN = re.compile(r"\\(\w+)(?:\{([^}]*)\})?")
+
+
+class QuantityKind(NamedTuple):
+    name: str
+    units: tuple
+    dimension: str
+
+
+@functools.lru_cache(maxsize=4)
+def quantity_kinds(path: str = QUDT_TTL):
+    """``{kind name: QuantityKind}`` for every QUDT quantity kind in ``path``, as a read-only mapping."""
+    return shared("qudt", (path, __file__), functools.partial(_parse_kinds, path))
+
+
+@functools.lru_cache(maxsize=4)
+def unit_choices(path: str = QUDT_TTL):
+    """``{kind name: [unit, ...]}`` for unit pickers; kinds without applicable units offer "Custom"."""
+    return shared("qudt-units", (path, __file__),
+                  lambda: {name: list(kind.units) or ["Custom"] for name, kind in quantity_kinds(path).items()})
+
+
+def _parse_kinds(path: str) -> dict:
+    from rdflib import Graph, Namespace
+
+    g = Graph()
+    g.parse(path, format="turtle")
+    Q = Namespace("http://qudt.org/schema/qudt/")
+    kinds = {}
+    for s in g.subjects(None, Q.QuantityKind):
+        name = s.split("/")[-1]
+        units = tuple(sorted(u.split("/")[-1] for u in g.objects(s, Q.applicableUnit)))
+        dimension = next((d.split("/")[-1] for d in g.objects(s, Q.hasDimensionVector)), "")
+        kinds[name] = QuantityKind(name, units, dimension)
+    return kinds
+
+
+def _factors(unit: str):
+    """Yield ``(qudt prefix, unit name, exponent)`` for a D-SI unit string; None if it is not D-SI."""
+    tokens = _TOKEN.findall(unit or "")
+    if not tokens or _TOKEN.sub("", unit).strip():
+        return None
+    factors, prefix, invert = [], "", False
+    for name, arg in tokens:
+        if name == "per":
+            invert = True
+        elif name in PREFIXES:
+            prefix += PREFIXES[name][0]
+        elif name == "tothe" and factors:
+            try:
+                power = int(arg)
+            except ValueError:
+                return None
+            p, n, e = factors[-1]
+            factors[-1] = (p, n, e * power)
+        elif name in UNITS:
+            factors.append((prefix, name, -1 if invert else 1))
+            prefix, invert = "", False
+        else:
+            return None
+    return factors
+
+
+@functools.lru_cache(maxsize=4096)
+def dsi_to_qudt(unit: str) -> str:
+    r"""QUDT unit name for a D-SI unit (``\milli\gram\per\kilogram`` -> ``MilliGM-PER-KiloGM``).
+
+    Returns "" for units that are not D-SI or use unknown unit names.
+    """
+    factors = _factors(unit)
+    if not factors:
+        return ""
+
+    def part(prefix, name, exp):
+        return f"{prefix}{UNITS[name][0]}{abs(exp) if abs(exp) != 1 else ''}"
+
+    num = "-".join(part(*f) for f in factors if f[2] > 0)
+    den = "-".join(part(*f) for f in factors if f[2] < 0)
+    if not den:
+        return num
+    return f"{num}-PER-{den}" if num else f"PER-{den}"
+
+
+@functools.lru_cache(maxsize=4096)
+def dsi_dimension(unit: str) -> str:
+    r"""QUDT dimension vector of a D-SI unit (``\milli\gram\per\kilogram`` -> ``A0E0L0I0M0H0T0D1``)."""
+    factors = _factors(unit)
+    if not factors:
+        return ""
+    dims = [0] * 7
+    for _, name, exp in factors:
+        for i, d in enumerate(UNITS[name][1]):
+            dims[i] += d * exp
+    a, e, l, i, m, h, t = dims
+    return f"A{a}E{e}L{l}I{i}M{m}H{h}T{t}D{int(not any(dims))}"
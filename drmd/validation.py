@@ -0,0 +1,233 @@
+"""Schema validation with a choice of engine.
+
+Two validators check documents against ``drmd.xsd``:
+
+* "lxml": libxml2's XML Schema validator (C), for routine checks on export;
+* "xmlschema": the pure-Python validator, slower, whose errors explain the
+  failing schema component and instance element, for diagnostics.
+
+Both return a ``Report`` of every error, collected in a single pass.
+``max_errors`` makes validation fail fast.  xmlschema stops after that many
+errors.  libxml2 always validates the whole in-memory document (it is fast)
+and only the report is cut.  A file path is validated while it is read, so
+memory stays bounded.  xmlschema does this in lazy mode.  With lxml the
+file is read by ``iterparse``, which stops at the first error.
+
+libxml2 cannot fetch the imported dcc/si/xmldsig schemas over https.  The
+lxml engine therefore compiles a local copy of ``drmd.xsd`` and its imports,
+which xmlschema exports once to ``DRMD_SCHEMA_DIR``.  A schema file is
+exported again when its content changes.  ``DRMD_VALIDATION_ENGINE`` selects
+the app's engine.  ``bench`` compares the engines on synthetic certificates
+of several sizes:
+
+    python -m drmd.validation check certificate.xml --engine xmlschema --max-errors 20
+    python -m drmd.validation bench --rows 100,1000,10000 --properties 4
+"""
+import argparse
+import functools
+import hashlib
+import io
+import itertools
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from lxml import etree
+
+from drmd.schema_model import DRMD_XSD, xml_schema
+
+DEFAULT_VALIDATION_ENGINE = os.environ.get("DRMD_VALIDATION_ENGINE", "lxml")
+DEFAULT_SCHEMA_DIR = os.environ.get("DRMD_SCHEMA_DIR", "./.drmd_schemas")
+
+
+class Issue(NamedTuple):
+    line: int | None
+    path: str
+    message: str
+    detail: str = ""   # full xmlschema diagnostic, if any
+
+    def __str__(self):
+        if self.detail:
+            return self.detail
+        where = ", ".join(p for p in (f"line {self.line}" if self.line else "", self.path) if p)
+        return f"{where}: {self.message}" if where else self.message
+
+
+class Report(NamedTuple):
+    engine: str
+    errors: list
+    truncated: bool   # validation stopped before the end; there may be more errors
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def message(self) -> str:
+        text = "\n\n".join(str(e) for e in self.errors)
+        return text + ("\n\n(validation stopped; there may be more errors)" if self.truncated else "")
+
+
+def local_schema(xsd_path: str = DRMD_XSD, directory: str = DEFAULT_SCHEMA_DIR) -> str:
+    """Path of a copy of ``xsd_path`` whose imports are all local files (exported by xmlschema)."""
+    with open(xsd_path, "rb") as fh:
+        digest = hashlib.sha256(fh.read()).hexdigest()[:16]
+    target = os.path.join(os.path.abspath(directory), digest)
+    main = os.path.join(target, os.path.basename(xsd_path))
+    if not os.path.exists(main):
+        os.makedirs(directory, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix="export_", dir=directory)
+        try:
+            xml_schema(os.path.abspath(xsd_path)).export(tmp, save_remote=True)
+            os.replace(tmp, target)
+        except OSError:
+            if not os.path.exists(main):   # not a concurrent export of the same schema
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return main
+
+
+def _parser():
+    return etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+
+class LxmlValidator:
+    engine = "lxml"
+
+    def __init__(self, xsd_path: str = DRMD_XSD):
+        self.schema = etree.XMLSchema(etree.parse(local_schema(xsd_path), _parser()))
+        # The error log belongs to the schema object; one validation at a time reads it.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _issues(error_log) -> list:
+        return [Issue(e.line or None, e.path or "", e.message) for e in error_log.filter_from_errors()]
+
+    def validate(self, source, max_errors: int | None = None) -> Report:
+        """Validate ``source`` (document bytes, or a file path as str)."""
+        if isinstance(source, str):
+            return self._validate_file(source)
+        try:
+            tree = etree.parse(io.BytesIO(source), _parser())
+        except etree.XMLSyntaxError as e:
+            return Report(self.engine, self._issues(e.error_log) or [Issue(e.lineno, "", e.msg)], True)
+        with self._lock:
+            self.schema.validate(tree)
+            errors = self._issues(self.schema.error_log)
+        truncated = max_errors is not None and len(errors) > max_errors
+        return Report(self.engine, errors[:max_errors] if truncated else errors, truncated)
+
+    def _validate_file(self, path: str) -> Report:
+        try:
+            # libxml2 validates while parsing; elements already parsed are not needed again.
+            for _, elem in etree.iterparse(path, events=("end",), schema=self.schema,
+                                           resolve_entities=False, no_network=True, huge_tree=True):
+                elem.clear(keep_tail=True)
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        except etree.XMLSyntaxError as e:
+            return Report(self.engine, self._issues(e.error_log)[:1] or [Issue(e.lineno, "", e.msg)], True)
+        return Report(self.engine, [], False)
+
+
+class XmlschemaValidator:
+    engine = "xmlschema"
+
+    def __init__(self, xsd_path: str = DRMD_XSD):
+        self.schema = xml_schema(os.path.abspath(xsd_path))
+
+    def validate(self, source, max_errors: int | None = None) -> Report:
+        """Validate ``source`` (document bytes, or a file path as str, read lazily)."""
+        import xmlschema
+        if isinstance(source, str):
+            resource = xmlschema.XMLResource(source, lazy=True)
+        else:
+            resource = xmlschema.XMLResource(io.BytesIO(source))
+        stop = None if max_errors is None else max_errors + 1
+        found = list(itertools.islice(self.schema.iter_errors(resource), stop))
+        truncated = max_errors is not None and len(found) > max_errors
+        errors = [Issue(getattr(e, "sourceline", None), e.path or "", e.reason or e.message, str(e))
+                  for e in (found[:max_errors] if truncated else found)]
+        return Report(self.engine, errors, truncated)
+
+
+ENGINES = {"lxml": LxmlValidator, "xmlschema": XmlschemaValidator}
+
+
+@functools.lru_cache(maxsize=8)
+def validator(engine: str = DEFAULT_VALIDATION_ENGINE, xsd_path: str = DRMD_XSD):
+    """The compiled validator of ``engine`` for ``xsd_path``, built once per process."""
+    if engine not in ENGINES:
+        raise ValueError(f"unknown validation engine {engine!r}; choose one of {', '.join(ENGINES)}")
+    return ENGINES[engine](os.path.abspath(xsd_path))
+
+
+def validate(source, engine: str = DEFAULT_VALIDATION_ENGINE, max_errors: int | None = None,
+             xsd_path: str = DRMD_XSD) -> Report:
+    return validator(engine, xsd_path).validate(source, max_errors)
+
+
+def bench(sizes, properties: int, engines, xsd_path: str = DRMD_XSD, repeat: int = 3):
+    """Yield one result dict per (rows, engine): document size and median validation time."""
+    from drmd.loadtest import synthetic_document
+
+    for engine in engines:
+        validator(engine, xsd_path)   # compile outside the timings
+    for rows in sizes:
+        document = synthetic_document(rows=rows, properties=properties)
+        for engine in engines:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                report = validate(document, engine, xsd_path=xsd_path)
+                times.append(time.perf_counter() - start)
+            yield {"rows": rows * properties, "bytes": len(document), "engine": engine,
+                   "validate_s": statistics.median(times),
+                   "errors": len(report.errors)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate DRMD certificates against the schema.")
+    parser.add_argument("--xsd", default=DRMD_XSD, help="schema (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_check = sub.add_parser("check", help="validate files")
+    p_check.add_argument("paths", nargs="+")
+    p_check.add_argument("--engine", choices=sorted(ENGINES), default=DEFAULT_VALIDATION_ENGINE)
+    p_check.add_argument("--max-errors", type=int, default=None, help="stop after this many errors")
+    p_bench = sub.add_parser("bench", help="compare the engines on synthetic certificates")
+    p_bench.add_argument("--rows", default="100,1000,10000", help="quantities per property set, comma-separated")
+    p_bench.add_argument("--properties", type=int, default=4, help="property sets per certificate")
+    p_bench.add_argument("--engines", default=",".join(ENGINES))
+    p_bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(f"{'rows':>9} {'bytes':>13} {'engine':>10} {'validate ms':>12} {'errors':>7}")
+        for r in bench([int(n) for n in args.rows.split(",")], args.properties, args.engines.split(","),
+                       args.xsd, args.repeat):
+            print(f"{r['rows']:>9,} {r['bytes']:>13,} {r['engine']:>10} {r['validate_s'] * 1000:>12.1f} {r['errors']:>7}")
+        return 0
+
+    invalid = 0
+    for path in args.paths:
+        start = time.perf_counter()
+        with open(path, "rb") as fh:
+            report = validate(fh.read(), args.engine, args.max_errors, args.xsd)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {'valid' if report.valid else f'{len(report.errors)} error(s)'} "
+              f"({report.engine}, {elapsed * 1000:.0f} ms)")
+        for error in report.errors:
+            print("  " + str(error).replace("\n", "\n  "))
+        invalid += not report.valid
+    return 1 if invalid else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
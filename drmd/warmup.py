@@ -0,0 +1,234 @@
+"""Warm the process-wide caches before the app takes traffic.
+
+The first session after a start used to pay for parsing ``qudt.ttl``, for
+compiling ``drmd.xsd`` (including the fetch of the imported dcc/si schemas)
+and ``drmd.xsl`` on its first export, and for the first run of the script
+itself.  Launched through this module, the server process does all of that
+before Streamlit binds its port:
+
+1. the QUDT unit lists and quantity kinds (``drmd.units``),
+2. the schema field model (``drmd.schema_model.field_model``),
+3. the xmlschema validator (``drmd.schema_model.xml_schema``),
+4. the app's validation engine (``drmd.validation.validator``), which for
+   lxml also exports a local copy of the schema and its imports,
+5. the XSLT stylesheet (``drmd.preview.stylesheet``),
+6. one export of the bundled sample certificate through the real script,
+   run headless, which also fills the ``st.cache_resource`` caches.
+
+Meanwhile a small HTTP server answers ``GET /ready`` with a JSON report of
+each step (status, seconds, detail), of which caches are currently warm and
+whether the app port accepts connections.  It returns 200 only once the
+warmup has finished, every step succeeded and Streamlit is listening, and
+503 otherwise, naming the failed steps.  A step that fails (for example the
+schema when its imports are unreachable) does not keep the server from
+starting, and the app retries it on use, but the probe stays at 503.
+
+    python -m drmd.warmup --serve app.py --server.port=8501   # probe on :8502
+    python -m drmd.warmup --check                             # exit 0 when ready
+"""
+import argparse
+import functools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from drmd.model import parse_drmd
+from drmd.preview import DRMD_XSL, stylesheet
+from drmd.schema_model import DRMD_XSD, field_model, xml_schema
+from drmd.units import quantity_kinds, unit_choices
+from drmd.validation import validator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_XML = os.path.join(ROOT, "updated_sample.xml")
+DEFAULT_PROBE_PORT = int(os.environ.get("DRMD_PROBE_PORT", "8502"))
+
+# Process-wide caches reported by the probe: name -> lru_cached function
+CACHES = {
+    "qudt": quantity_kinds,
+    "unit choices": unit_choices,
+    "field model": field_model,
+    "schema": xml_schema,
+    "validator": validator,
+    "stylesheet": stylesheet,
+}
+
+
+def app_address(streamlit_args) -> tuple:
+    """(host, port) Streamlit will listen on, from ``--server.address``/``--server.port`` arguments."""
+    options = {"server.address": os.environ.get("STREAMLIT_SERVER_ADDRESS", ""),
+               "server.port": os.environ.get("STREAMLIT_SERVER_PORT", "8501")}
+    args = list(streamlit_args)
+    for i, arg in enumerate(args):
+        name, _, value = arg.lstrip("-").partition("=")
+        if name in options:
+            options[name] = value or (args[i + 1] if i + 1 < len(args) else "")
+    host = options["server.address"]
+    return (host if host not in ("", "0.0.0.0", "::") else "127.0.0.1"), int(options["server.port"])
+
+
+class Warmup:
+    def __init__(self, app: tuple | None = None):
+        self.steps = []  # dicts: name, status ("running", "ok", "failed"), seconds, detail
+        self.started = None
+        self.finished = None
+        self.app = app  # (host, port) of the app that must accept connections, or None
+        self._lock = threading.Lock()
+
+    @property
+    def failed(self) -> list:
+        with self._lock:
+            return [s["name"] for s in self.steps if s["status"] == "failed"]
+
+    def app_listening(self) -> bool | None:
+        if self.app is None:
+            return None
+        try:
+            with socket.create_connection(self.app, timeout=1):
+                return True
+        except OSError:
+            return False
+
+    @property
+    def ready(self) -> bool:
+        return self.finished is not None and not self.failed and self.app_listening() is not False
+
+    def step(self, name: str, func):
+        """Run ``func``; its return value (if any) becomes the step's detail."""
+        entry = {"name": name, "status": "running", "seconds": None, "detail": ""}
+        with self._lock:
+            self.steps.append(entry)
+        start = time.perf_counter()
+        try:
+            detail = func()
+            entry["status"], entry["detail"] = "ok", str(detail or "")
+        except Exception as e:
+            entry["status"], entry["detail"] = "failed", f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        return entry
+
+    def run(self, script: str | None = None, sample: str = SAMPLE_XML):
+        """All warmup steps; the synthetic export only with the app ``script``."""
+        self.started = datetime.now(timezone.utc)
+        self.step("qudt", lambda: f"{len(quantity_kinds())} quantity kinds, {len(unit_choices())} unit lists")
+        self.step("field model", lambda: f"{len(field_model(DRMD_XSD).specs)} fields")
+        self.step("schema", lambda: f"{len(xml_schema(DRMD_XSD).maps.types)} types")
+        self.step("validator", lambda: f"{validator().engine} compiled")
+        self.step("stylesheet", lambda: f"{type(stylesheet(DRMD_XSL)).__name__} compiled")
+        if script:
+            self.step("export", functools.partial(synthetic_export, script, sample))
+        self.finished = datetime.now(timezone.utc)
+        return self
+
+    def report(self) -> dict:
+        with self._lock:
+            steps = [dict(s) for s in self.steps]
+        failed = [s["name"] for s in steps if s["status"] == "failed"]
+        listening = self.app_listening()
+        finished = self.finished is not None
+        if not finished:
+            reason = "warmup running"
+        elif failed:
+            reason = f"failed: {', '.join(failed)}"
+        elif listening is False:
+            reason = f"app not listening on port {self.app[1]}"
+        else:
+            reason = ""
+        return {
+            "ready": finished and not failed and listening is not False,
+            "reason": reason,
+            "started": self.started.isoformat() if self.started else None,
+            "seconds": round((self.finished - self.started).total_seconds(), 3) if finished else None,
+            "failed": failed,
+            "app_listening": listening,
+            "steps": steps,
+            "caches": {name: func.cache_info().currsize > 0 for name, func in CACHES.items()},
+        }
+
+
+def synthetic_export(script: str, sample: str = SAMPLE_XML) -> str:
+    """Load ``sample`` into a headless session of ``script`` and press Generate XML."""
+    from streamlit.testing.v1 import AppTest
+
+    with open(sample, "rb") as fh:
+        state = parse_drmd(fh.read())
+    at = AppTest.from_file(os.path.abspath(script), default_timeout=600)
+    for key, value in state.items():
+        at.session_state[key] = value
+    at.run()
+    if not at.exception:
+        at.button(key="generate_xml").click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    export = at.session_state["export_result"]
+    return f"{len(export['xml']):,} bytes, {'valid' if export['valid'] else 'not valid'}"
+
+
+def serve_probe(warmup: Warmup, port: int = DEFAULT_PROBE_PORT, address: str = ""):
+    """Answer ``GET /ready`` from a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/ready"):
+                self.send_error(404)
+                return
+            report = warmup.report()
+            body = json.dumps(report, indent=1).encode("utf-8")
+            self.send_response(200 if report["ready"] else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    threading.Thread(target=server.serve_forever, name="drmd-probe", daemon=True).start()
+    return server
+
+
+def check(port: int = DEFAULT_PROBE_PORT) -> int:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as response:
+            print(response.read().decode("utf-8"))
+            return 0
+    except urllib.error.HTTPError as e:
+        print(e.read().decode("utf-8"))
+    except OSError as e:
+        print(f"probe not reachable: {e}")
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm caches, then optionally start the Streamlit app in the same process.",
+                                     epilog="Arguments not listed here are passed on to streamlit run.")
+    parser.add_argument("--serve", metavar="SCRIPT", help="app script to warm up and then serve")
+    parser.add_argument("--probe-port", type=int, default=DEFAULT_PROBE_PORT, help="port of the readiness probe")
+    parser.add_argument("--probe-address", default="", help="address of the readiness probe (default: all)")
+    parser.add_argument("--check", action="store_true", help="query a running probe; exit 0 when ready")
+    args, streamlit_args = parser.parse_known_args(argv)
+    if args.check:
+        return check(args.probe_port)
+
+    warmup = Warmup(app_address(streamlit_args) if args.serve else None)
+    if args.serve:
+        serve_probe(warmup, args.probe_port, args.probe_address)
+    warmup.run(args.serve)
+    for s in warmup.steps:
+        print(f"{s['status']:7} {s['seconds']:8.3f}s  {s['name']}" + (f": {s['detail']}" if s["detail"] else ""))
+    if not args.serve:
+        return 0 if all(s["status"] == "ok" for s in warmup.steps) else 1
+
+    from streamlit.web import cli as stcli
+    return stcli.main(["run", args.serve, *streamlit_args], prog_name="streamlit")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Several open certificates per session, kept as parsed models.
+
+The certificate being edited lives in the session state as before.  The
+other open certificates are held by a ``Workspace``: each is the dictionary of
+its session-state keys (``DOCUMENT_KEYS``: the document sections, its undo
+history, draft link, signature status and last export), taken over as is.
+``swap`` exchanges the session's certificate with one of them, so switching
+never parses XML and edits that were not exported or saved travel with the
+certificate.
+
+The workspace is an LRU bounded by ``memory_bytes`` (estimated from table
+memory and string sizes).  When it grows beyond that, the least recently
+used certificates are pickled to a private directory below
+``DRMD_WORKSPACE_DIR`` and read back, once, when switched to.  The directory
+is removed with the workspace.
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import uuid
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+from drmd.drafts import SECTIONS
+
+DEFAULT_WORKSPACE_DIR = os.environ.get("DRMD_WORKSPACE_DIR", "./.drmd_workspace")
+DEFAULT_MEMORY_BYTES = int(os.environ.get("DRMD_WORKSPACE_MEMORY_MB", "256")) * 1024 * 1024
+
+# Session-state keys that belong to one certificate
+DOCUMENT_KEYS = [key for keys in SECTIONS.values() for key in keys] + [
+    "persistent_id", "template_loaded", "workspace_label", "signature_status",
+    "history", "draft_id", "draft_hashes", "draft_dirty", "export_result",
+]
+
+
+def model_nbytes(value) -> int:
+    """Approximate memory held by a document model (tables, strings, containers)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(model_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(model_nbytes(v) for v in value)
+    if callable(getattr(value, "nbytes", None)):   # drmd.history.History
+        return value.nbytes()
+    return sys.getsizeof(value)
+
+
+def document_label(state) -> str:
+    """Name of the certificate in ``state`` for lists: file name, else first material and identifier."""
+    if state.get("workspace_label"):
+        return state["workspace_label"]
+    names = [m.get("name", "").strip() for m in state.get("materials") or [] if (m.get("name") or "").strip()]
+    parts = [names[0] if names else "", (state.get("persistent_id_value") or "").strip()]
+    return " · ".join(p for p in parts if p) or "Untitled certificate"
+
+
+@dataclass
+class Entry:
+    label: str
+    model: dict | None   # None: pickled to disk
+    nbytes: int          # estimated memory, or file size on disk
+
+
+class Workspace:
+    def __init__(self, memory_bytes: int = DEFAULT_MEMORY_BYTES, directory: str = DEFAULT_WORKSPACE_DIR):
+        self.memory_bytes = memory_bytes
+        self.entries = OrderedDict()   # id -> Entry, least recently used first
+        self.ingested = set()          # upload file ids already opened
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="session_", dir=directory)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.directory, f"{doc_id}.pkl")
+
+    def memory_nbytes(self) -> int:
+        return sum(e.nbytes for e in self.entries.values() if e.model is not None)
+
+    def disk_nbytes(self) -> int:
+        return sum(e.nbytes for e in self.entries.values() if e.model is None)
+
+    def add(self, label: str, model: dict) -> str:
+        """Keep ``model`` as the most recently used certificate; returns its id."""
+        doc_id = uuid.uuid4().hex
+        self.entries[doc_id] = Entry(label, model, model_nbytes(model))
+        self._evict()
+        return doc_id
+
+    def _evict(self):
+        """Pickle the least recently used certificates to disk until the rest fit in memory."""
+        used = self.memory_nbytes()
+        for doc_id, entry in self.entries.items():
+            if used <= self.memory_bytes:
+                break
+            if entry.model is None:
+                continue
+            with open(self._path(doc_id), "wb") as fh:
+                pickle.dump(entry.model, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            used -= entry.nbytes
+            entry.model, entry.nbytes = None, os.path.getsize(self._path(doc_id))
+
+    def take(self, doc_id: str) -> dict:
+        """Remove certificate ``doc_id`` from the workspace and return its model."""
+        entry = self.entries.pop(doc_id)
+        if entry.model is not None:
+            return entry.model
+        with open(self._path(doc_id), "rb") as fh:
+            model = pickle.load(fh)
+        os.unlink(self._path(doc_id))
+        return model
+
+    def close(self, doc_id: str):
+        """Drop certificate ``doc_id`` and its unsaved edits."""
+        if self.entries[doc_id].model is None:
+            os.unlink(self._path(doc_id))
+        del self.entries[doc_id]
+
+    def swap(self, state, doc_id: str):
+        """Make certificate ``doc_id`` the one in ``state`` and keep the current one in its place.
+
+        A current certificate that was neither loaded nor edited (a blank
+        form) is dropped instead of kept.
+        """
+        model = self.take(doc_id)
+        current = {key: state[key] for key in DOCUMENT_KEYS if key in state}
+        for key in DOCUMENT_KEYS:
+            if key in state:
+                del state[key]
+        history = current.get("history")
+        if current.get("template_loaded") or current.get("draft_id") or (history is not None and history.can_undo):
+            self.add(document_label(current), current)
+        state.update(model)
+
+    def items(self):
+        """``(id, label, on_disk, nbytes)`` per certificate, most recently used first."""
+        return [(doc_id, e.label, e.model is None, e.nbytes) for doc_id, e in reversed(self.entries.items())]
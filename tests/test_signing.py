@@ -0,0 +1,155 @@
+"""Sign/verify round trips for drmd.signing with self-generated keys."""
+import base64
+import datetime
+import hashlib
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.x509.oid import NameOID
+from lxml import etree
+
+from drmd.signing import (C14N_EXC, DIGEST_SHA256, DS_NS, ENVELOPED, RSA_SHA256, Signer,
+                          certificate_trusted, verify_document)
+
+DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+<?xml-stylesheet type="text/xsl" href="drmd.xsl"?>
+<drmd:digitalReferenceMaterialDocument xmlns:drmd="https://example.org/drmd" schemaVersion="0.2.0">
+  <drmd:administrativeData>
+    <drmd:coreData>
+      <drmd:titleOfTheDocument>referenceMaterialCertificate</drmd:titleOfTheDocument>
+      <drmd:uniqueIdentifier>1234</drmd:uniqueIdentifier>
+    </drmd:coreData>
+  </drmd:administrativeData>
+  <drmd:materials>
+    <drmd:material id="m1" isCertified="true">
+      <drmd:name>Steel</drmd:name>
+    </drmd:material>
+  </drmd:materials>
+  <drmd:statements/>
+</drmd:digitalReferenceMaterialDocument>
+"""
+
+
+def _certificate(key, name, issuer_key=None, issuer_name=None, ca=False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    issuer = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, issuer_name or name)])
+    return (x509.CertificateBuilder().subject_name(subject).issuer_name(issuer)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=30))
+            .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+            .sign(issuer_key or key, hashes.SHA256()))
+
+
+@pytest.fixture(scope="module")
+def rsa_signer():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return Signer(key, _certificate(key, "Test Signer"))
+
+
+@pytest.fixture(scope="module")
+def ec_signer():
+    key = ec.generate_private_key(ec.SECP256R1())
+    return Signer(key, _certificate(key, "Test EC Signer"))
+
+
+def _tamper(signed: bytes, edit) -> bytes:
+    root = etree.fromstring(signed)
+    edit(root)
+    return etree.tostring(root.getroottree(), xml_declaration=True, encoding="utf-8")
+
+
+def _find(root, local):
+    return root.find(f".//{{https://example.org/drmd}}{local}")
+
+
+def _standard_signature(xml: bytes, key, cert) -> bytes:
+    """An enveloped signature as xmlsec writes it: one URI="" reference over the whole document."""
+    root = etree.fromstring(xml)
+    tree = root.getroottree()
+    digest = base64.b64encode(hashlib.sha256(etree.tostring(tree, method="c14n", exclusive=True)).digest())
+    ds = lambda tag: f"{{{DS_NS}}}{tag}"
+    signature = etree.SubElement(root, ds("Signature"), nsmap={"ds": DS_NS})
+    signed_info = etree.SubElement(signature, ds("SignedInfo"))
+    etree.SubElement(signed_info, ds("CanonicalizationMethod"), Algorithm=C14N_EXC)
+    etree.SubElement(signed_info, ds("SignatureMethod"), Algorithm=RSA_SHA256)
+    ref = etree.SubElement(signed_info, ds("Reference"), URI="")
+    transforms = etree.SubElement(ref, ds("Transforms"))
+    etree.SubElement(transforms, ds("Transform"), Algorithm=ENVELOPED)
+    etree.SubElement(transforms, ds("Transform"), Algorithm=C14N_EXC)
+    etree.SubElement(ref, ds("DigestMethod"), Algorithm=DIGEST_SHA256)
+    etree.SubElement(ref, ds("DigestValue")).text = digest.decode()
+    value = etree.SubElement(signature, ds("SignatureValue"))
+    x509_data = etree.SubElement(etree.SubElement(signature, ds("KeyInfo")), ds("X509Data"))
+    etree.SubElement(x509_data, ds("X509Certificate")).text = base64.b64encode(
+        cert.public_bytes(serialization.Encoding.DER)).decode()
+    signed_c14n = etree.tostring(signed_info, method="c14n", exclusive=True)
+    value.text = base64.b64encode(key.sign(signed_c14n, padding.PKCS1v15(), hashes.SHA256())).decode()
+    return etree.tostring(tree, xml_declaration=True, encoding="utf-8")
+
+
+@pytest.mark.parametrize("signer", ["rsa_signer", "ec_signer"])
+def test_round_trip(signer, request):
+    signer = request.getfixturevalue(signer)
+    result = verify_document(signer.sign(DOCUMENT))
+    assert result.status == "valid", result.message
+    assert result.signatures == 1
+    assert "Test" in result.signer
+
+
+def test_unsigned():
+    assert verify_document(DOCUMENT).status == "unsigned"
+
+
+def test_resign_replaces_signature(rsa_signer):
+    twice = rsa_signer.sign(rsa_signer.sign(DOCUMENT))
+    assert verify_document(twice).signatures == 1
+
+
+@pytest.mark.parametrize("edit", [
+    lambda root: setattr(_find(root, "name"), "text", "Brass"),
+    lambda root: _find(root, "material").set("isCertified", "false"),
+    lambda root: root.set("schemaVersion", "0.1.0"),
+    lambda root: root.insert(0, etree.Element("{https://example.org/drmd}comment")),
+    lambda root: root.append(etree.Element("{https://example.org/drmd}comment")),
+    lambda root: root.remove(_find(root, "statements")),
+], ids=["section text", "section attribute", "root attribute", "root child before", "root child after",
+        "root child removed"])
+def test_tamper_detected(rsa_signer, edit):
+    result = verify_document(_tamper(rsa_signer.sign(DOCUMENT), edit))
+    assert result.status == "invalid", result
+
+
+def test_unreferenced_object_rejected(rsa_signer):
+    def inject(root):
+        obj = etree.SubElement(root.find(f"{{{DS_NS}}}Signature"), f"{{{DS_NS}}}Object")
+        etree.SubElement(obj, "note").text = "approved"
+    assert verify_document(_tamper(rsa_signer.sign(DOCUMENT), inject)).status == "invalid"
+
+
+def test_standard_signature_with_stylesheet_pi():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    signed = _standard_signature(DOCUMENT, key, _certificate(key, "External Signer"))
+    result = verify_document(signed)
+    assert result.status == "valid", result.message
+    # The PI outside the root element is covered by URI="".
+    moved = signed.replace(b'href="drmd.xsl"', b'href="other.xsl"')
+    assert verify_document(moved).status == "invalid"
+
+
+def test_trust(rsa_signer):
+    result = verify_document(rsa_signer.sign(DOCUMENT))
+    assert not result.trusted
+    assert certificate_trusted(rsa_signer.certificate, anchors=[rsa_signer.certificate])
+
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca = _certificate(ca_key, "Test CA", ca=True)
+    leaf_key = ec.generate_private_key(ec.SECP256R1())
+    leaf = _certificate(leaf_key, "Test Leaf", issuer_key=ca_key, issuer_name="Test CA")
+    assert certificate_trusted(leaf, anchors=[ca])
+    assert not certificate_trusted(leaf, anchors=[rsa_signer.certificate])
+    # A self-signed certificate that merely copies the CA's name does not chain.
+    fake = _certificate(leaf_key, "Test Leaf", issuer_key=leaf_key, issuer_name="Test CA")
+    assert not certificate_trusted(fake, anchors=[ca])